@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -7,21 +7,589 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import (
+    ElementClickInterceptedException, ElementNotInteractableException, NoSuchElementException,
+    StaleElementReferenceException, TimeoutException, WebDriverException
+)
 import os
 import time
 import traceback
+import threading
+import atexit
+import signal
+import socket
+import re
+import json
+import base64
+import hashlib
+import ipaddress
+import urllib.request
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from html.parser import HTMLParser
+from contextlib import contextmanager
 import uuid
+import difflib
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from PIL import Image
+from blazor_protocol import BlazorCircuit, BlazorPayloadError, BlazorProtocolError, HttpBlazorTransport, RecordingBlazorTransport, ReplayBlazorTransport
 
 app = Flask(__name__)
 CORS(app)
 
-# Dossier pour stocker les screenshots
-SCREENSHOTS_DIR = "screenshots"
+# Dossier pour stocker les screenshots (et par défaut le catalogue des lentilles)
+SCREENSHOTS_DIR = os.environ.get("SCREENSHOTS_DIR", "screenshots")
 if not os.path.exists(SCREENSHOTS_DIR):
     os.makedirs(SCREENSHOTS_DIR)
 
-def web_driver():
+# Métriques Prometheus (exposées sur /metrics)
+PHASE_SECONDS = Histogram(
+    'iol_phase_seconds', 'Duration of each calculate_iol phase', ['phase', 'eye'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+)
+CALCULATIONS_TOTAL = Counter(
+    'iol_calculations_total', 'Calculations by endpoint, outcome and error type', ['endpoint', 'outcome', 'error_type']
+)
+CALCULATIONS_IN_FLIGHT = Gauge('iol_calculations_in_flight', 'Calculations currently running')
+
+@contextmanager
+def phase(name, eye='-'):
+    """Mesure une phase du calcul dans l'histogramme iol_phase_seconds (et la trace de la requête)"""
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check(name if eye == '-' else f"{name} {eye}")
+    started = time.monotonic()
+    try:
+        with span(name, **({'eye': eye} if eye != '-' else {})):
+            yield
+    finally:
+        PHASE_SECONDS.labels(phase=name, eye=eye).observe(time.monotonic() - started)
+
+# Traces par calcul: arbre de spans (phases, fonctions, recherches d'éléments, attentes) avec allers-retours WebDriver
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", "200"))
+# Borne le nombre de spans d'une trace (les WebDriverWait peuvent interroger le DOM des centaines de fois)
+TRACE_MAX_SPANS = int(os.environ.get("TRACE_MAX_SPANS", "5000"))
+# Si défini, chaque trace est aussi écrite en JSON dans ce dossier
+TRACE_DIR = os.environ.get("TRACE_DIR")
+
+class Span:
+    """Une étape chronométrée de la trace"""
+
+    def __init__(self, name, start, attrs=None):
+        self.name = name
+        self.start = start
+        self.end = None
+        self.attrs = attrs or {}
+        self.children = []
+        self.round_trips = 0
+
+    def total_round_trips(self):
+        return self.round_trips + sum(child.total_round_trips() for child in self.children)
+
+    def duration_ms(self):
+        return round(1000 * ((self.end or time.monotonic()) - self.start), 1)
+
+    def to_dict(self, origin):
+        return {
+            'name': self.name,
+            'start_ms': round(1000 * (self.start - origin), 1),
+            'duration_ms': self.duration_ms(),
+            'round_trips': self.total_round_trips(),
+            'attrs': self.attrs,
+            'children': [child.to_dict(origin) for child in self.children]
+        }
+
+class Trace:
+    """Arbre de spans d'un calcul, construit par le thread qui l'exécute"""
+
+    def __init__(self, calc_id):
+        self.calc_id = calc_id
+        self.started_at = time.time()
+        self.root = Span('calculation', time.monotonic())
+        self._stack = [self.root]
+        self.spans = 1
+        self.dropped = 0
+
+    def push(self, name, attrs):
+        if self.spans >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return None
+        new_span = Span(name, time.monotonic(), attrs)
+        self._stack[-1].children.append(new_span)
+        self._stack.append(new_span)
+        self.spans += 1
+        return new_span
+
+    def pop(self, closed):
+        if closed is not None:
+            closed.end = time.monotonic()
+            self._stack.remove(closed)
+
+    def count_round_trip(self):
+        self._stack[-1].round_trips += 1
+
+    def finish(self):
+        self.root.end = time.monotonic()
+
+    def to_dict(self):
+        return {
+            'calculation_id': self.calc_id,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(),
+            'duration_ms': self.root.duration_ms(),
+            'round_trips': self.root.total_round_trips(),
+            'spans': self.spans,
+            'dropped_spans': self.dropped,
+            'root': self.root.to_dict(self.root.start)
+        }
+
+    def server_timing(self):
+        """Valeur du header Server-Timing: une entrée par étape de premier niveau, plus le total"""
+        entries = []
+        for child in self.root.children:
+            name = re.sub(r'[^A-Za-z0-9_-]', '_', child.name + (f"-{child.attrs['eye']}" if 'eye' in child.attrs else ''))
+            entries.append(f'{name};dur={child.duration_ms()}')
+        entries.append(f'total;dur={self.root.duration_ms()};desc="{self.root.total_round_trips()} round trips"')
+        return ', '.join(entries)
+
+_trace_local = threading.local()
+
+def current_trace():
+    return getattr(_trace_local, 'trace', None)
+
+@contextmanager
+def span(name, **attrs):
+    """Ajoute un span à la trace du thread courant (sans effet hors d'un calcul tracé)"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    opened = trace.push(name, attrs)
+    try:
+        yield
+    finally:
+        trace.pop(opened)
+
+def traced(func):
+    """Décorateur: un span au nom de la fonction"""
+    def wrapper(*args, **kwargs):
+        with span(func.__name__):
+            return func(*args, **kwargs)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+class TraceBuffer:
+    """Dernières traces terminées, indexées par calculation_id (buffer circulaire)"""
+
+    def __init__(self, size):
+        self.size = size
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        if self.size > 0:
+            with self._lock:
+                self._traces[trace.calc_id] = trace
+                while len(self._traces) > self.size:
+                    self._traces.popitem(last=False)
+        if TRACE_DIR:
+            try:
+                os.makedirs(TRACE_DIR, exist_ok=True)
+                with open(os.path.join(TRACE_DIR, f"{trace.calc_id}.json"), 'w') as f:
+                    json.dump(trace.to_dict(), f)
+            except OSError as e:
+                print(f"⚠️ Could not write trace {trace.calc_id}: {e}")
+
+    def get(self, calc_id):
+        with self._lock:
+            return self._traces.get(calc_id)
+
+trace_buffer = TraceBuffer(TRACE_BUFFER_SIZE)
+
+@contextmanager
+def tracing(calc_id):
+    """Trace le calcul exécuté dans ce bloc puis la range dans trace_buffer"""
+    trace = Trace(calc_id)
+    _trace_local.trace = trace
+    try:
+        yield trace
+    finally:
+        _trace_local.trace = None
+        trace.finish()
+        trace_buffer.add(trace)
+
+# Commandes WebDriver de recherche d'éléments (un span par recherche)
+FIND_COMMANDS = {'findElement', 'findElements', 'findChildElement', 'findChildElements'}
+
+def traced_execute(execute):
+    """Enveloppe WebDriver.execute: compte chaque aller-retour et trace les recherches d'éléments"""
+    def wrapper(driver_command, params=None):
+        trace = current_trace()
+        if trace is None:
+            return execute(driver_command, params)
+        if driver_command in FIND_COMMANDS:
+            with span('find', using=(params or {}).get('using'), value=(params or {}).get('value')):
+                trace.count_round_trip()
+                return execute(driver_command, params)
+        trace.count_round_trip()
+        return execute(driver_command, params)
+    return wrapper
+
+# Échéance globale d'un calcul, répartie sur les phases (chaque attente est plafonnée par le temps restant)
+CALCULATION_DEADLINE = float(os.environ.get("CALCULATION_DEADLINE", "120"))
+CALCULATION_DEADLINE_MAX = float(os.environ.get("CALCULATION_DEADLINE_MAX", "600"))
+
+class DeadlineExceeded(Exception):
+    """Le calcul a dépassé l'échéance de la requête"""
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def check(self, step):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g}s exceeded before '{step}'")
+
+_deadline_local = threading.local()
+
+def current_deadline():
+    return getattr(_deadline_local, 'deadline', None)
+
+def budget(cap):
+    """Délai à accorder à une attente: `cap`, réduit au temps restant avant l'échéance de la requête"""
+    deadline = current_deadline()
+    if deadline is None:
+        return cap
+    return max(0.0, min(cap, deadline.remaining()))
+
+@contextmanager
+def deadline_scope(seconds):
+    """Applique une échéance aux attentes du thread courant"""
+    previous = current_deadline()
+    _deadline_local.deadline = Deadline(seconds)
+    try:
+        yield _deadline_local.deadline
+    finally:
+        _deadline_local.deadline = previous
+
+def resolve_deadline(data, options=None):
+    """Échéance en secondes: en-tête X-Request-Deadline ou ?deadline=, puis "deadline" du corps, puis la valeur par défaut"""
+    # `is not None` et non `or`: une échéance explicite de 0 doit être refusée, pas remplacée par le défaut
+    value = next((v for v in ((options or {}).get('deadline'), data.get('deadline')) if v is not None),
+                 CALCULATION_DEADLINE)
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid deadline '{value}' (seconds expected)")
+    if seconds <= 0:
+        raise ValueError("deadline must be positive")
+    return min(seconds, CALCULATION_DEADLINE_MAX)
+
+class DeadlineWait(WebDriverWait):
+    """WebDriverWait dont chaque attente est plafonnée par le temps restant de la requête"""
+
+    def until(self, method, message=""):
+        deadline = current_deadline()
+        if deadline is None:
+            return super().until(method, message)
+        full_timeout = self._timeout
+        self._timeout = min(full_timeout, deadline.remaining())
+        try:
+            if self._timeout <= 0:
+                raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s exceeded")
+            return super().until(method, message)
+        except TimeoutException:
+            if deadline.remaining() <= 0:
+                raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s exceeded while waiting") from None
+            raise
+        finally:
+            self._timeout = full_timeout
+
+def record_calculation(endpoint, result=None, error=None):
+    """Compte un calcul terminé (succès, cache hit ou échec avec son type d'erreur)"""
+    if error is not None:
+        outcome, error_type = 'failure', type(error).__name__
+    elif result.get('success'):
+        outcome = 'cache_hit' if result.get('cached') else 'coalesced' if result.get('coalesced') else 'success'
+        error_type = ''
+    else:
+        outcome, error_type = 'failure', result.get('error_type', 'Unknown')
+    CALCULATIONS_TOTAL.labels(endpoint=endpoint, outcome=outcome, error_type=error_type).inc()
+
+# Profil "lean": chargement eager, ressources non essentielles bloquées, fonctionnalités Chrome inutiles coupées
+LEAN_BROWSER = os.environ.get("LEAN_BROWSER", "0") == "1"
+# Motifs d'URL bloqués via DevTools (Network.setBlockedURLs, '*' joker), séparés par des virgules.
+# Par défaut seulement l'analytics / la télémétrie tierce: le rendu des screenshots ne change pas.
+BLOCKED_URL_PATTERNS = [p.strip() for p in os.environ.get(
+    "BLOCKED_URL_PATTERNS",
+    "*google-analytics.com*,*googletagmanager.com*,*doubleclick.net*,*hotjar.com*,*clarity.ms*"
+).split(",") if p.strip()]
+# Optionnel: bloque aussi polices et images (icônes et typographie absentes des screenshots)
+BLOCK_MEDIA = os.environ.get("BLOCK_MEDIA", "0") == "1"
+MEDIA_URL_PATTERNS = [
+    "*fonts.googleapis.com*", "*fonts.gstatic.com*", "*.woff", "*.woff2", "*.ttf",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.ico"
+]
+if BLOCK_MEDIA:
+    BLOCKED_URL_PATTERNS += MEDIA_URL_PATTERNS
+# Cache disque persistant entre deux lancements (un sous-dossier par slot: Chrome ne partage pas son cache)
+BROWSER_CACHE_DIR = os.environ.get("BROWSER_CACHE_DIR")
+
+class CacheSlots:
+    """Attribue à chaque Chrome vivant un sous-dossier de cache qui lui est propre"""
+
+    def __init__(self):
+        self._used = set()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            slot = 0
+            while slot in self._used:
+                slot += 1
+            self._used.add(slot)
+            return slot
+
+    def release(self, slot):
+        with self._lock:
+            self._used.discard(slot)
+
+cache_slots = CacheSlots()
+
+# Supervision des processus Chrome/chromedriver: recyclage des sessions usées et nettoyage des orphelins
+MAX_JOBS_PER_DRIVER = int(os.environ.get("MAX_JOBS_PER_DRIVER", "100"))  # 0 = illimité
+MAX_DRIVER_RSS_MB = int(os.environ.get("MAX_DRIVER_RSS_MB", "1536"))  # 0 = pas de limite
+SUPERVISOR_INTERVAL = float(os.environ.get("SUPERVISOR_INTERVAL", "30"))
+DRIVER_QUIT_TIMEOUT = float(os.environ.get("DRIVER_QUIT_TIMEOUT", "20"))
+# Un chromedriver non encore enregistré peut être en plein lancement: on ne le tue qu'après ce délai
+ORPHAN_GRACE_SECONDS = float(os.environ.get("ORPHAN_GRACE_SECONDS", "120"))
+
+BROWSER_PROCESSES = Gauge('iol_browser_processes', 'Chrome and chromedriver processes spawned by the API')
+BROWSER_RSS_BYTES = Gauge('iol_browser_rss_bytes', 'Resident memory of the Chrome and chromedriver processes')
+
+def process_table():
+    """Lit /proc: pid -> (ppid, comm, état, starttime, rss en octets)"""
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    table = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'r') as f:
+                data = f.read()
+        except OSError:
+            continue  # processus terminé entre listdir et open
+        # comm est entre parenthèses et peut contenir des espaces
+        comm = data[data.index('(') + 1:data.rindex(')')]
+        fields = data[data.rindex(')') + 2:].split()
+        table[int(name)] = {
+            'ppid': int(fields[1]),
+            'comm': comm,
+            'state': fields[0],
+            'starttime': int(fields[19]),
+            'rss': int(fields[21]) * page_size
+        }
+    return table
+
+def descendants(table, root):
+    """Le processus root et toute sa descendance encore vivante"""
+    children = {}
+    for pid, info in table.items():
+        children.setdefault(info['ppid'], []).append(pid)
+    found, todo = [], [root]
+    while todo:
+        pid = todo.pop()
+        if pid in table:
+            found.append(pid)
+            todo.extend(children.get(pid, ()))
+    return found
+
+class BrowserSupervisor:
+    """Suit les chromedriver lancés (et leurs Chrome), décide du recyclage des sessions
+    et tue les processus orphelins laissés par un quit bloqué ou un crash"""
+
+    def __init__(self, max_jobs, max_rss_bytes, interval):
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_bytes
+        self.interval = interval
+        self.enabled = os.path.isdir('/proc')
+        self._tracked = {}  # pid chromedriver -> starttime
+        self._known = {}  # pid déjà vu dans un arbre suivi -> starttime
+        self._processes = 0
+        self._rss = 0
+        self._recycled = {'jobs': 0, 'rss': 0}
+        self._orphans_killed = 0
+        self._zombies_reaped = 0
+        self._quit_timeouts = 0
+        self._last_scan = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _root_pid(driver):
+        process = getattr(getattr(driver, 'service', None), 'process', None)
+        return getattr(process, 'pid', None)
+
+    def track(self, driver):
+        """Enregistre le chromedriver d'un driver qui vient d'être lancé"""
+        pid = self._root_pid(driver)
+        if not self.enabled or pid is None:
+            return
+        table = process_table()
+        if pid in table:
+            with self._lock:
+                self._tracked[pid] = table[pid]['starttime']
+                for child in descendants(table, pid):
+                    self._known[child] = table[child]['starttime']
+
+    def snapshot(self, driver):
+        """Arbre de processus d'un driver, relevé avant son quit (les Chrome perdent leur parent ensuite)"""
+        pid = self._root_pid(driver)
+        if not self.enabled or pid is None:
+            return {}
+        table = process_table()
+        return {child: table[child]['starttime'] for child in descendants(table, pid)}
+
+    def release(self, driver, snapshot):
+        """Après le quit: ne suit plus le driver et tue ce qui a survécu de son arbre"""
+        pid = self._root_pid(driver)
+        with self._lock:
+            self._tracked.pop(pid, None)
+        if snapshot:
+            killed = self._kill(snapshot, process_table())
+            if killed:
+                print(f"🔪 Killed {killed} browser processes left after quit")
+
+    def note_quit_timeout(self):
+        with self._lock:
+            self._quit_timeouts += 1
+
+    def rss_of(self, driver):
+        pid = self._root_pid(driver)
+        if not self.enabled or pid is None:
+            return 0
+        table = process_table()
+        return sum(table[child]['rss'] for child in descendants(table, pid))
+
+    def should_recycle(self, driver, jobs):
+        """Vrai si la session a fait trop de calculs ou consomme trop de mémoire"""
+        reason = None
+        if self.max_jobs and jobs >= self.max_jobs:
+            reason = 'jobs'
+        elif self.max_rss_bytes and self.rss_of(driver) > self.max_rss_bytes:
+            reason = 'rss'
+        if reason is None:
+            return False
+        with self._lock:
+            self._recycled[reason] += 1
+        print(f"♻️ Recycling browser session ({reason}, {jobs} jobs)")
+        return True
+
+    def _kill(self, pids, table):
+        """SIGKILL des pids encore vivants (starttime vérifié: un pid peut avoir été réutilisé)"""
+        killed = 0
+        for pid, starttime in pids.items():
+            info = table.get(pid)
+            if info is None or info['starttime'] != starttime or info['state'] == 'Z':
+                continue
+            try:
+                os.kill(pid, signal.SIGKILL)
+                killed += 1
+            except (ProcessLookupError, PermissionError):
+                pass
+        return killed
+
+    def scan(self):
+        """Mesure les arbres suivis, tue les orphelins et récolte nos zombies"""
+        if not self.enabled:
+            return
+        table = process_table()
+        own_pid = os.getpid()
+        with open('/proc/uptime', 'r') as f:
+            uptime = float(f.read().split()[0])
+        clock_ticks = os.sysconf('SC_CLK_TCK')
+        with self._lock:
+            live = set()
+            for pid, starttime in list(self._tracked.items()):
+                if pid in table and table[pid]['starttime'] == starttime:
+                    live.update(descendants(table, pid))
+                else:
+                    # chromedriver mort sans quit: ses Chrome deviennent orphelins
+                    del self._tracked[pid]
+            for pid in live:
+                self._known[pid] = table[pid]['starttime']
+            orphans = {
+                pid: starttime for pid, starttime in self._known.items()
+                if pid not in live and pid in table and table[pid]['starttime'] == starttime
+            }
+            # Enfants directs Chrome/chromedriver jamais enregistrés (lancement interrompu)
+            for pid, info in table.items():
+                if (info['ppid'] == own_pid and info['comm'].startswith('chrome') and pid not in live
+                        and uptime - info['starttime'] / clock_ticks > ORPHAN_GRACE_SECONDS):
+                    orphans[pid] = info['starttime']
+            self._known = {pid: self._known[pid] for pid in live}
+            self._processes = len(live)
+            self._rss = sum(table[pid]['rss'] for pid in live)
+            self._last_scan = time.time()
+        BROWSER_PROCESSES.set(self._processes)
+        BROWSER_RSS_BYTES.set(self._rss)
+
+        killed = self._kill(orphans, table)
+        reaped = 0
+        for pid, info in table.items():
+            if info['ppid'] == own_pid and (info['state'] == 'Z' or pid in orphans):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        reaped += 1
+                except ChildProcessError:
+                    pass
+        with self._lock:
+            self._orphans_killed += killed
+            self._zombies_reaped += reaped
+        if killed or reaped:
+            print(f"🧟 Supervisor killed {killed} orphan and reaped {reaped} zombie browser processes")
+
+    def start(self):
+        if self.enabled:
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"⚠️ Browser supervisor error: {e}")
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'tracked_drivers': len(self._tracked),
+                'processes': self._processes,
+                'rss_bytes': self._rss,
+                'max_jobs_per_driver': self.max_jobs,
+                'max_rss_bytes': self.max_rss_bytes,
+                'recycled': dict(self._recycled),
+                'orphans_killed': self._orphans_killed,
+                'zombies_reaped': self._zombies_reaped,
+                'quit_timeouts': self._quit_timeouts,
+                'last_scan': datetime.fromtimestamp(self._last_scan).isoformat() if self._last_scan else None
+            }
+
+browser_supervisor = BrowserSupervisor(MAX_JOBS_PER_DRIVER, MAX_DRIVER_RSS_MB * 1024 * 1024, SUPERVISOR_INTERVAL)
+atexit.register(browser_supervisor.close)
+
+def web_driver(extra_arguments=()):
     options = webdriver.ChromeOptions()
     options.add_argument('--no-sandbox')
     options.add_argument('--headless')
@@ -32,47 +600,717 @@ def web_driver():
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option('useAutomationExtension', False)
 
+    if LEAN_BROWSER:
+        # driver.get rend la main au DOMContentLoaded; les attentes explicites font le reste
+        options.page_load_strategy = 'eager'
+        options.add_argument('--disable-extensions')
+        options.add_argument('--disable-background-networking')
+        options.add_argument('--disable-sync')
+        options.add_argument('--disable-features=Translate,TranslateUI,OptimizationHints,MediaRouter')
+        options.add_argument('--disable-default-apps')
+        options.add_argument('--disable-component-update')
+        options.add_argument('--no-first-run')
+        options.add_argument('--mute-audio')
+    for argument in extra_arguments:
+        options.add_argument(argument)
+
+    cache_slot = None
+    if BROWSER_CACHE_DIR:
+        cache_slot = cache_slots.acquire()
+        cache_dir = os.path.join(BROWSER_CACHE_DIR, f"slot-{cache_slot}")
+        os.makedirs(cache_dir, exist_ok=True)
+        options.add_argument(f'--disk-cache-dir={cache_dir}')
+
     # Utiliser le ChromeDriver installé dans le container
     service = Service('/usr/local/bin/chromedriver')
-    return webdriver.Chrome(service=service, options=options)
+    try:
+        driver = webdriver.Chrome(service=service, options=options)
+    except Exception:
+        if cache_slot is not None:
+            cache_slots.release(cache_slot)
+        raise
+    driver.cache_slot = cache_slot
+    browser_supervisor.track(driver)
+    driver.execute = traced_execute(driver.execute)
+    block_urls(driver)
+    return driver
+
+def block_urls(driver):
+    """Mode lean: bloque via CDP les ressources inutiles au calcul (onglet courant du driver)"""
+    if LEAN_BROWSER and BLOCKED_URL_PATTERNS:
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        except Exception as e:
+            print(f"⚠️ Could not install URL blocking: {e}")
 
-def click_share_and_get_link(driver, wait):
-    """Clique sur le bouton Share et récupère le lien copié"""
+def quit_driver(driver):
+    """Ferme Chrome (ou le contexte de navigation en mode contexts) et libère son slot de cache disque.
+    Un quit bloqué est abandonné après DRIVER_QUIT_TIMEOUT et les processus restants sont tués."""
+    snapshot = browser_supervisor.snapshot(driver)
+    errors = []
+
+    def quit():
+        try:
+            driver.quit()
+        except Exception as e:
+            errors.append(e)
+
+    quitter = threading.Thread(target=quit, daemon=True)
+    quitter.start()
+    quitter.join(DRIVER_QUIT_TIMEOUT)
+    if quitter.is_alive():
+        browser_supervisor.note_quit_timeout()
+        print(f"⚠️ driver.quit() still blocked after {DRIVER_QUIT_TIMEOUT:g}s, killing its processes")
     try:
-        print("\n🔗 Looking for Share button...")
+        browser_supervisor.release(driver, snapshot)
+        if errors:
+            raise errors[0]
+    finally:
+        if getattr(driver, 'cache_slot', None) is not None:
+            cache_slots.release(driver.cache_slot)
+        if getattr(driver, 'browser_context_id', None) is not None:
+            driver.shared_browser.dispose_context(driver.browser_context_id, driver.browser_generation)
+
+# Mode d'exécution du pool: "processes" (un Chrome par session) ou "contexts"
+# (un seul Chrome, chaque session est un onglet dans son propre contexte de navigation isolé)
+DRIVER_MODE = os.environ.get("DRIVER_MODE", "processes")
+if DRIVER_MODE not in ('processes', 'contexts'):
+    raise ValueError(f"Unknown DRIVER_MODE: {DRIVER_MODE}")
+
+# Les onglets en arrière-plan ne doivent pas être ralentis: plusieurs calculs tournent en même temps
+SHARED_BROWSER_ARGUMENTS = [
+    '--disable-background-timer-throttling',
+    '--disable-renderer-backgrounding',
+    '--disable-backgrounding-occluded-windows'
+]
+
+class SharedBrowser:
+    """Un seul Chrome hôte; chaque session du pool y est un contexte isolé (cookies, storage, cache)
+    piloté par sa propre session WebDriver attachée au port de debug et fixée sur son onglet"""
+
+    def __init__(self):
+        self._host = None
+        self._debugger_address = None
+        # Incrémenté à chaque relance: les contextes d'un Chrome mort ne sont pas à fermer
+        self._generation = 0
+        self._contexts = set()
+        self._opened = 0
+        self._disposed = 0
+        self._lock = threading.Lock()
+
+    def _ensure_host(self):
+        """Lance (ou relance) le Chrome hôte; appelé sous self._lock"""
+        if self._host is not None:
+            try:
+                self._host.execute_cdp_cmd('Browser.getVersion', {})
+                return self._host
+            except Exception as e:
+                print(f"⚠️ Shared browser not responding, relaunching: {e}")
+                self._quit_host()
+
+        host = web_driver(extra_arguments=SHARED_BROWSER_ARGUMENTS)
+        # chromedriver lance Chrome sur un port de debug libre et l'expose dans les capabilities
+        self._debugger_address = host.capabilities['goog:chromeOptions']['debuggerAddress']
+        self._host = host
+        self._generation += 1
+        print(f"🚀 Shared browser launched ({self._debugger_address})")
+        return host
+
+    def _quit_host(self):
+        host, self._host = self._host, None
+        self._contexts.clear()
+        if host is not None:
+            try:
+                quit_driver(host)
+            except Exception as e:
+                print(f"⚠️ Error closing shared browser: {e}")
+
+    def open_context(self):
+        """Crée un contexte et son onglet, puis y attache un nouveau driver (factory du pool)"""
+        with self._lock:
+            host = self._ensure_host()
+            context_id = host.execute_cdp_cmd('Target.createBrowserContext', {})['browserContextId']
+            target_id = host.execute_cdp_cmd('Target.createTarget', {
+                'url': 'about:blank',
+                'browserContextId': context_id,
+                'width': 1920,
+                'height': 1200
+            })['targetId']
+            self._contexts.add(context_id)
+            self._opened += 1
+            generation = self._generation
+            debugger_address = self._debugger_address
+
+        try:
+            options = webdriver.ChromeOptions()
+            options.debugger_address = debugger_address
+            if LEAN_BROWSER:
+                options.page_load_strategy = 'eager'
+            driver = webdriver.Chrome(service=Service('/usr/local/bin/chromedriver'), options=options)
+        except Exception:
+            self.dispose_context(context_id, generation)
+            raise
+        browser_supervisor.track(driver)
+        driver.browser_context_id = context_id
+        driver.browser_generation = generation
+        driver.shared_browser = self
+        driver.execute = traced_execute(driver.execute)
+        try:
+            # Les handles de fenêtre chromedriver sont les identifiants de cible CDP
+            driver.switch_to.window(target_id)
+        except Exception:
+            quit_driver(driver)
+            raise
+        block_urls(driver)
+        return driver
+
+    def dispose_context(self, context_id, generation):
+        """Ferme le contexte et tous ses onglets (driver.quit ne fait que détacher la session)"""
+        with self._lock:
+            if generation != self._generation or context_id not in self._contexts:
+                return
+            self._contexts.discard(context_id)
+            self._disposed += 1
+            host = self._host
+        try:
+            host.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': context_id})
+        except Exception as e:
+            print(f"⚠️ Could not dispose browser context: {e}")
+
+    def close(self):
+        with self._lock:
+            self._quit_host()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._host is not None,
+                'debugger_address': self._debugger_address,
+                'launches': self._generation,
+                'contexts': len(self._contexts),
+                'opened': self._opened,
+                'disposed': self._disposed
+            }
+
+shared_browser = SharedBrowser()
+# Enregistré avant le pool: atexit dépile en ordre inverse, les contextes sont fermés avant leur Chrome
+atexit.register(shared_browser.close)
+
+CALCULATOR_URL = os.environ.get("CALCULATOR_URL", "https://iolcalculator.escrs.org/")
+
+# Mode "primed": la session reste sur le calculateur (conditions déjà acceptées) entre deux calculs
+PRIMED_SESSIONS = os.environ.get("PRIMED_SESSIONS", "0") == "1"
+
+# Pool de sessions Chrome pré-lancées (évite un cold start de Chrome par requête)
+DRIVER_POOL_MIN = int(os.environ.get("DRIVER_POOL_MIN", "1"))
+DRIVER_POOL_MAX = int(os.environ.get("DRIVER_POOL_MAX", "3"))
+DRIVER_POOL_CHECKOUT_TIMEOUT = float(os.environ.get("DRIVER_POOL_CHECKOUT_TIMEOUT", "120"))
+
+class DriverPoolTimeout(Exception):
+    """Aucun driver disponible dans le délai imparti"""
+
+class BrowserSession:
+    """Un driver Chrome du pool et ses métadonnées"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.time()
+        self.jobs = 0
+        # État "primed": page du calculateur ouverte et conditions acceptées
+        self.primed = False
+        self.last_share_link = None
+        self.selected_dropdowns = set()
+
+class DriverPool:
+    """Pool de drivers Chrome réutilisables, empruntés puis rendus par calculate_iol"""
+
+    def __init__(self, factory, min_size=1, max_size=3, checkout_timeout=120):
+        self._factory = factory
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.checkout_timeout = checkout_timeout
+        self._idle = deque()
+        self._in_use = 0
+        self._starting = 0
+        self._created = 0
+        self._discarded = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _total(self):
+        return len(self._idle) + self._in_use + self._starting
+
+    def start(self):
+        """Pré-lance les drivers en arrière-plan jusqu'à la taille minimale"""
+        threading.Thread(target=self._fill_to_min, daemon=True).start()
+
+    def _fill_to_min(self):
+        while True:
+            with self._cond:
+                if self._closed or self._total() >= self.min_size:
+                    return
+                self._starting += 1
+            session = self._launch()
+            with self._cond:
+                self._starting -= 1
+                if session:
+                    self._idle.append(session)
+                self._cond.notify()
+            if not session:
+                return
+
+    def _launch(self):
+        try:
+            session = BrowserSession(self._factory())
+            with self._cond:
+                self._created += 1
+            print("🚀 Browser launched for pool")
+            return session
+        except Exception as e:
+            print(f"❌ Failed to launch browser: {e}")
+            return None
+
+    def _is_healthy(self, session):
+        try:
+            session.driver.execute_script("return document.readyState")
+            return True
+        except Exception as e:
+            print(f"⚠️ Pooled browser failed health check: {e}")
+            return False
 
-        # Essayer plusieurs variantes du bouton Share
-        share_button_xpaths = [
-            "//button[.//span[normalize-space(text())='Share']]",
-            "//button[contains(text(),'Share')]",
-            "//button[@title='Share']",
-            "//button[contains(@class,'share')]//span",
-            "//*[contains(text(),'Share')]"
-        ]
-
-        share_button = None
-        for xpath in share_button_xpaths:
+    def _quit(self, session):
+        with self._cond:
+            self._discarded += 1
+        try:
+            quit_driver(session.driver)
+        except Exception as e:
+            print(f"⚠️ Error closing browser: {e}")
+
+    def acquire(self, timeout=None):
+        """Emprunte un driver sain; en lance un nouveau si le pool n'est pas plein"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            session = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    if self._idle:
+                        session = self._idle.popleft()
+                        self._in_use += 1
+                        break
+                    if self._total() < self.max_size:
+                        self._starting += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DriverPoolTimeout(f"No browser available after {timeout}s")
+                    self._cond.wait(remaining)
+
+            if session is None:
+                try:
+                    session = BrowserSession(self._factory())
+                except Exception:
+                    with self._cond:
+                        self._starting -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created += 1
+                    self._starting -= 1
+                    self._in_use += 1
+                return session
+
+            if self._is_healthy(session):
+                return session
+
+            # Driver mort: on le jette et on réessaie
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            threading.Thread(target=self._quit, args=(session,), daemon=True).start()
+
+    def release(self, session, reusable=True):
+        """Rend un driver au pool (ou le ferme s'il n'est plus réutilisable)"""
+        session.jobs += 1
+        if reusable and browser_supervisor.should_recycle(session.driver, session.jobs):
+            reusable = False
+        if reusable:
+            reusable = self._reset(session)
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable and not self._closed:
+                self._idle.append(session)
+                session = None
+            self._cond.notify()
+
+        if session is not None:
+            threading.Thread(target=self._quit, args=(session,), daemon=True).start()
+            if not self._closed:
+                self.start()
+
+    def _reset(self, session):
+        """Efface l'état du site (cookies, storage) avant de remettre le driver dans le pool"""
+        if session.primed:
+            # La page reste sur le calculateur, le formulaire sera remis à zéro au prochain calcul
+            return True
+
+        driver = session.driver
+        try:
+            driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            print(f"⚠️ Could not reset pooled browser: {e}")
+            return False
+
+    def close(self):
+        """Ferme tous les drivers inactifs (appelé à l'arrêt)"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for session in idle:
+            self._quit(session)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'starting': self._starting,
+                'total': self._total(),
+                'created': self._created,
+                'discarded': self._discarded
+            }
+
+driver_pool = DriverPool(
+    shared_browser.open_context if DRIVER_MODE == 'contexts' else web_driver,
+    min_size=DRIVER_POOL_MIN,
+    max_size=DRIVER_POOL_MAX,
+    checkout_timeout=DRIVER_POOL_CHECKOUT_TIMEOUT
+)
+atexit.register(driver_pool.close)
+
+CHROME_BROWSERS = Gauge('iol_chrome_browsers', 'Live Chrome browsers owned by the driver pool')
+CHROME_BROWSERS.set_function(
+    lambda: int(shared_browser.stats()['running']) if DRIVER_MODE == 'contexts' else driver_pool.stats()['total']
+)
+
+# Attentes "page stabilisée": on détecte la fin du re-rendu MudBlazor au lieu de dormir un temps fixe
+SETTLE_QUIET_MS = int(os.environ.get("SETTLE_QUIET_MS", "150"))
+SETTLE_MAX_TIMEOUT = float(os.environ.get("SETTLE_MAX_TIMEOUT", "5"))
+# FIXED_DELAYS=1 restaure les anciens time.sleep fixes
+FIXED_DELAYS = os.environ.get("FIXED_DELAYS", "0") == "1"
+
+# Installe (une fois par page) un MutationObserver qui mémorise l'heure de la dernière mutation du DOM
+TRACK_MUTATIONS_JS = """
+if (!window.__iolMutations) {
+    window.__iolMutations = {last: 0};
+    new MutationObserver(() => { window.__iolMutations.last = Date.now(); })
+        .observe(document.documentElement, {subtree: true, childList: true, attributes: true, characterData: true});
+}
+"""
+
+# Résout quand le DOM n'a plus bougé depuis quietMs (après une mutation postérieure à `since` si fourni)
+SETTLE_JS = TRACK_MUTATIONS_JS + """
+const quietMs = arguments[0], timeoutMs = arguments[1], since = arguments[2],
+      changeTimeoutMs = arguments[3], popoverClosed = arguments[4];
+const done = arguments[arguments.length - 1];
+const tracker = window.__iolMutations;
+const start = Date.now();
+const check = () => {
+    const now = Date.now();
+    if (now - start >= timeoutMs) return done({settled: false, elapsed: now - start});
+    // Le serveur Blazor n'a pas encore répondu: on attend au plus l'ancien délai fixe
+    if (since && tracker.last < since && now - start < changeTimeoutMs) return setTimeout(check, 20);
+    const quiet = now - tracker.last >= quietMs;
+    const closed = !popoverClosed || !document.querySelector('.mud-popover-open');
+    if (quiet && closed) return done({settled: true, elapsed: now - start});
+    setTimeout(check, 20);
+};
+setTimeout(check, 16);
+"""
+
+class WaitStats:
+    """Temps réellement attendu vs anciens délais fixes, par étape et par calcul"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps = {}
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.legacy = 0.0
+        self._local.actual = 0.0
+
+    def current(self):
+        return getattr(self._local, 'legacy', 0.0), getattr(self._local, 'actual', 0.0)
+
+    def record(self, label, legacy, actual):
+        self._local.legacy = getattr(self._local, 'legacy', 0.0) + legacy
+        self._local.actual = getattr(self._local, 'actual', 0.0) + actual
+        with self._lock:
+            step = self._steps.setdefault(label, {'calls': 0, 'legacy_seconds': 0.0, 'actual_seconds': 0.0})
+            step['calls'] += 1
+            step['legacy_seconds'] += legacy
+            step['actual_seconds'] += actual
+
+    def stats(self):
+        with self._lock:
+            steps = {label: dict(step) for label, step in self._steps.items()}
+        legacy = sum(step['legacy_seconds'] for step in steps.values())
+        actual = sum(step['actual_seconds'] for step in steps.values())
+        for step in steps.values():
+            step['legacy_seconds'] = round(step['legacy_seconds'], 3)
+            step['actual_seconds'] = round(step['actual_seconds'], 3)
+        return {
+            'fixed_delays': FIXED_DELAYS,
+            'legacy_seconds': round(legacy, 3),
+            'actual_seconds': round(actual, 3),
+            'saved_seconds': round(legacy - actual, 3),
+            'steps': steps
+        }
+
+wait_stats = WaitStats()
+
+def track_mutations(driver):
+    """Installe l'observateur de mutations sur la page courante"""
+    try:
+        driver.execute_script(TRACK_MUTATIONS_JS)
+    except Exception as e:
+        print(f"⚠️ Could not install mutation tracker: {e}")
+
+def wait_for_settled(driver, label, legacy_delay, since=None, popover_closed=False, change_timeout=None):
+    """
+    Remplace un time.sleep(legacy_delay): attend que le DOM soit stable (et le popover fermé si demandé).
+    `since` (time.time() avant l'action) impose d'attendre d'abord une mutation causée par l'action,
+    au plus change_timeout secondes (par défaut l'ancien délai fixe).
+    """
+    change_timeout = legacy_delay if change_timeout is None else change_timeout
+    start = time.monotonic()
+    with span(f"wait:{label}", legacy_delay=legacy_delay):
+        if FIXED_DELAYS:
+            with span("sleep", seconds=legacy_delay):
+                time.sleep(legacy_delay)
+        else:
             try:
-                share_button = driver.find_element(By.XPATH, xpath)
-                if share_button:
-                    print(f"✅ Found Share button with xpath: {xpath}")
-                    break
-            except:
-                continue
+                driver.execute_async_script(
+                    SETTLE_JS,
+                    SETTLE_QUIET_MS,
+                    int(budget(SETTLE_MAX_TIMEOUT) * 1000),
+                    int(since * 1000) if since else 0,
+                    int(change_timeout * 1000),
+                    popover_closed
+                )
+            except Exception as e:
+                print(f"⚠️ Settle wait '{label}' failed ({e}), sleeping {legacy_delay}s")
+                remaining = max(0, legacy_delay - (time.monotonic() - start))
+                with span("sleep", seconds=round(remaining, 3)):
+                    time.sleep(remaining)
+    wait_stats.record(label, legacy_delay, time.monotonic() - start)
+
+# Échecs consécutifs avant qu'un localisateur passe derrière les moins précis
+SELECTOR_DEMOTE_AFTER = int(os.environ.get("SELECTOR_DEMOTE_AFTER", "3"))
+# Toutes les N recherches, l'ordre de précision complet est réessayé (un localisateur écarté peut revenir)
+SELECTOR_RETRY_EVERY = int(os.environ.get("SELECTOR_RETRY_EVERY", "10"))
+
+class UiTarget:
+    """Élément de l'interface avec ses localisateurs de repli, du plus précis au plus large"""
+
+    def __init__(self, name, locators, last_resort=0):
+        self.name = name
+        self.locators = locators
+        self.hits = [0] * len(locators)
+        self.misses = [0] * len(locators)
+        self.streaks = [0] * len(locators)  # échecs consécutifs
+        # Les `last_resort` derniers localisateurs (recherches par texte) ne deviennent jamais préférés
+        self.promotable = len(locators) - last_resort
+        self.failures = 0
+        self.lookups = 0
+
+    def _healthy(self):
+        return [i for i in range(self.promotable) if self.streaks[i] < SELECTOR_DEMOTE_AFTER]
+
+    @property
+    def preferred(self):
+        healthy = self._healthy()
+        return healthy[0] if healthy else 0
+
+    def order(self):
+        """Ordre d'essai pour une nouvelle recherche (appelé une fois par find / wait_for, sous le verrou du registre)"""
+        # Par ordre de précision; ceux qui échouent à répétition passent après, les derniers recours restent à la fin
+        self.lookups += 1
+        if SELECTOR_RETRY_EVERY and self.lookups % SELECTOR_RETRY_EVERY == 0:
+            return list(range(len(self.locators)))
+        healthy = self._healthy()
+        demoted = [i for i in range(self.promotable) if i not in healthy]
+        return healthy + demoted + list(range(self.promotable, len(self.locators)))
+
+class SelectorRegistry:
+    """
+    Cibles UI nommées avec localisateurs de repli. find_elements ne lève pas d'exception: un changement
+    de l'interface coûte une recherche de plus au lieu d'une cascade d'exceptions et de timeouts.
+    """
+
+    def __init__(self):
+        self._targets = {}
+        self._lock = threading.Lock()
 
-        if not share_button:
-            print("⚠️ Share button not found. Available buttons:")
+    def register(self, name, *locators, last_resort=0):
+        self._targets[name] = UiTarget(name, list(locators), last_resort)
+
+    def _order(self, target):
+        with self._lock:
+            return target.order()
+
+    def _attempt(self, scope, target, order, params, clickable):
+        """Essaie les localisateurs dans `order`; retourne (élément, index, index essayés avant) ou None"""
+        tried = []
+        for index in order:
+            by, template = target.locators[index]
             try:
-                buttons = driver.find_elements(By.XPATH, "//button")
-                for i, btn in enumerate(buttons[:10]):  # Afficher les 10 premiers boutons
-                    try:
-                        btn_text = btn.text.strip()
-                        if btn_text:
-                            print(f"  Button {i+1}: '{btn_text}'")
-                    except:
-                        pass
-            except:
-                pass
+                elements = scope.find_elements(by, template.format(**params))
+                if clickable:
+                    elements = [el for el in elements if el.is_displayed() and el.is_enabled()]
+            except StaleElementReferenceException:
+                elements = []
+            if elements:
+                return elements[0], index, tried
+            tried.append(index)
+        return None
+
+    def _record(self, target, found):
+        with self._lock:
+            if found is None:
+                target.failures += 1
+                for index in range(len(target.locators)):
+                    target.misses[index] += 1
+                    target.streaks[index] += 1
+                return
+            _, index, tried = found
+            preferred = target.preferred
+            target.hits[index] += 1
+            target.streaks[index] = 0
+            for missed in tried:
+                target.misses[missed] += 1
+                target.streaks[missed] += 1
+            if target.preferred != preferred:
+                print(f"🧭 UI target '{target.name}' now tried first with locator #{target.preferred + 1}")
+
+    def find(self, scope, name, clickable=False, **params):
+        """Recherche immédiate dans `scope` (driver ou élément); NoSuchElementException si introuvable"""
+        target = self._targets[name]
+        found = self._attempt(scope, target, self._order(target), params, clickable)
+        self._record(target, found)
+        if found is None:
+            raise NoSuchElementException(f"UI target '{name}' not found ({len(target.locators)} locators tried)")
+        return found[0]
+
+    def wait_for(self, wait, name, scope=None, clickable=False, **params):
+        """Comme find, en réessayant jusqu'au timeout du WebDriverWait (TimeoutException ensuite)"""
+        target = self._targets[name]
+        # Un seul ordre pour toute l'attente: chaque poll du WebDriverWait n'est pas une nouvelle recherche
+        order = self._order(target)
+
+        def attempt(driver):
+            return self._attempt(scope or driver, target, order, params, clickable)
+
+        try:
+            found = wait.until(attempt)
+        except Exception:
+            self._record(target, None)
+            raise
+        self._record(target, found)
+        return found[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    'preferred': target.preferred + 1,
+                    'promotable': target.promotable,
+                    'failures': target.failures,
+                    'locators': [
+                        {'by': by, 'value': template, 'hits': target.hits[i], 'misses': target.misses[i]}
+                        for i, (by, template) in enumerate(target.locators)
+                    ]
+                }
+                for name, target in self._targets.items()
+            }
+
+    def summary(self):
+        with self._lock:
+            return {
+                'targets': len(self._targets),
+                'fallback_hits': sum(sum(t.hits[1:]) for t in self._targets.values()),
+                'failures': sum(t.failures for t in self._targets.values())
+            }
+
+ui = SelectorRegistry()
+ui.register("agree_button",
+            (By.XPATH, "//button[.//span[text()='I Agree']]"),
+            (By.XPATH, "//button[normalize-space(.)='I Agree']"))
+ui.register("option_checkbox",
+            (By.XPATH, "(//input[@type='checkbox' and contains(@class, 'mud-checkbox-input')])[{index}]"),
+            (By.XPATH, "(//*[contains(@class, 'mud-checkbox')]//input[@type='checkbox'])[{index}]"))
+ui.register("gender_select",
+            (By.XPATH, "//div[contains(@class, 'mud-select')]"),
+            (By.XPATH, "//div[contains(@class, 'mud-input-control') and .//label[normalize-space(text())='Gender']]"))
+ui.register("open_popover",
+            (By.XPATH, "//div[contains(@class, 'mud-popover-open')]"),
+            (By.CSS_SELECTOR, ".mud-popover.mud-popover-open, .mud-popover-provider .mud-list"))
+ui.register("popover_option",
+            (By.XPATH, ".//div[contains(@class,'mud-list-item')][.//p[normalize-space(text())='{value}']]"),
+            (By.XPATH, ".//*[contains(@class,'mud-list-item')][normalize-space(.)='{value}']"))
+ui.register("section_dropdown",
+            (By.XPATH, ".//div[contains(@class, 'mud-select') and .//label[normalize-space(text())='{label}']]"),
+            (By.XPATH, ".//div[contains(@class, 'mud-input-control') and .//label[normalize-space(.)='{label}']]"))
+ui.register("switch_input",
+            (By.XPATH, ".//label[.//p[contains(@class, 'mud-switch') and normalize-space(text())='{label}']]//input[@type='checkbox' and contains(@class, 'mud-switch-input')]"),
+            (By.XPATH, ".//label[.//*[normalize-space(text())='{label}']]//input[@type='checkbox']"))
+ui.register("eye_section",
+            (By.XPATH, "//h5[contains(text(),'{header}')]/ancestor::div[contains(@class,'mud-paper')]"),
+            (By.XPATH, "//*[contains(@class,'mud-typography-h5') or self::h6][contains(normalize-space(.),'{header}')]/ancestor::div[contains(@class,'mud-paper')]"))
+ui.register("field_label",
+            (By.XPATH, "//label[normalize-space(text())='{label}']"),
+            (By.XPATH, "//label[normalize-space(.)='{label}']"))
+ui.register("calculate_button",
+            (By.XPATH, "//button[.//span[contains(text(),'Calculate')]]"),
+            (By.XPATH, "//button[contains(normalize-space(.),'Calculate')]"))
+ui.register("print_button",
+            (By.XPATH, "//button[.//span[normalize-space(text())='Print']]"),
+            (By.XPATH, "//button[normalize-space(.)='Print']"))
+ui.register("share_button",
+            (By.XPATH, "//button[.//span[normalize-space(text())='Share']]"),
+            (By.XPATH, "//button[contains(text(),'Share')]"),
+            (By.XPATH, "//button[@title='Share']"),
+            (By.XPATH, "//button[contains(@class,'share')]//span"),
+            (By.XPATH, "//*[contains(text(),'Share')]"),
+            last_resort=2)
+
+@traced
+def click_share_and_get_link(driver, wait):
+    """Clique sur le bouton Share et récupère le lien copié"""
+    try:
+        print("\n🔗 Looking for Share button...")
+
+        try:
+            share_button = ui.find(driver, "share_button")
+            print("✅ Found Share button")
+        except NoSuchElementException:
+            # Un seul aller-retour pour lister les boutons visibles
+            labels = driver.execute_script(
+                "return [...document.querySelectorAll('button')].map(b => b.innerText.trim()).filter(Boolean).slice(0, 10);"
+            )
+            print(f"⚠️ Share button not found. Available buttons: {labels}")
             return None
 
         # Extraire le lien depuis l'attribut onclick du bouton Share
@@ -82,15 +1320,12 @@ def click_share_and_get_link(driver, wait):
 
             if onclick_attr:
                 # Extraire l'URL entre les quotes dans copyToClipboard('URL')
-                import re
                 match = re.search(r"copyToClipboard\s*\(\s*['\"]([^'\"]+)['\"]", onclick_attr)
                 if match:
                     share_link = match.group(1)
                     print(f"🔗 Extracted share link from onclick: {share_link}")
 
-                    # Cliquer quand même sur le bouton pour copier dans le clipboard
-                    driver.execute_script("arguments[0].scrollIntoView(true);", share_button)
-                    time.sleep(0.3)
+                    # Cliquer quand même sur le bouton pour copier dans le clipboard (un click JS n'a pas besoin de scroll)
                     driver.execute_script("arguments[0].click();", share_button)
                     print("✅ Share button clicked (link copied to clipboard)")
 
@@ -105,8 +1340,9 @@ def click_share_and_get_link(driver, wait):
 
         # Fallback: cliquer et essayer d'autres méthodes
         try:
+            clicked_at = time.time()
             driver.execute_script("arguments[0].click();", share_button)
-            time.sleep(2)
+            wait_for_settled(driver, "share_click", 2, since=clicked_at)
             print("✅ Share button clicked")
 
             current_url = driver.current_url
@@ -127,7 +1363,7 @@ def take_fullpage_screenshot(driver, path):
     try:
         # Scroll tout en haut de la page
         driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(0.5)
+        wait_for_settled(driver, "screenshot_scroll", 0.5)
 
         # Redimensionner pour une vue optimale des résultats (largeur maximale, hauteur généreuse)
         # Hauteur de 2400px est suffisante pour voir tous les résultats IOL sans scroll
@@ -138,11 +1374,11 @@ def take_fullpage_screenshot(driver, path):
 
         # Redimensionner la fenêtre
         driver.set_window_size(optimal_width, optimal_height)
-        time.sleep(1)  # Attendre que la page se réajuste
+        wait_for_settled(driver, "screenshot_resize", 1)  # Attendre que la page se réajuste
 
         # S'assurer qu'on est bien en haut
         driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(0.3)
+        wait_for_settled(driver, "screenshot_rescroll", 0.3)
 
         # Prendre le screenshot
         driver.save_screenshot(path)
@@ -160,49 +1396,709 @@ def take_fullpage_screenshot(driver, path):
         except:
             pass
 
+# Capture via le protocole DevTools: clip sur la zone des résultats, sans redimensionner la fenêtre
+SCREENSHOT_FORMAT = os.environ.get("SCREENSHOT_FORMAT", "png")
+SCREENSHOT_QUALITY = int(os.environ.get("SCREENSHOT_QUALITY", "80"))
+SCREENSHOT_MAX_HEIGHT = int(os.environ.get("SCREENSHOT_MAX_HEIGHT", "2400"))
+SCREENSHOT_MIMETYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp'
+}
+SCREENSHOT_EXTENSIONS = {
+    'png': 'png',
+    'jpeg': 'jpg',
+    'webp': 'webp'
+}
+
+# Marge (px) autour de la zone des résultats dans le screenshot
+SCREENSHOT_MARGIN = int(os.environ.get("SCREENSHOT_MARGIN", "16"))
+
+# Zone des résultats: union des sections OD/OS, des tableaux de résultats et des boutons Print/Share, plus une
+# marge. Le clip est en coordonnées document; les régions OD/OS sont rendues relatives au clip (pixels de l'image).
+RESULTS_REGION_JS = """
+const maxHeight = arguments[0];
+const margin = arguments[1];
+const doc = document.documentElement;
+const abs = (el) => {
+    const r = el.getBoundingClientRect();
+    return {x: r.left + window.scrollX, y: r.top + window.scrollY, width: r.width, height: r.height};
+};
+const sectionOf = (title) => {
+    const h5 = [...document.querySelectorAll('h5')].find(h => h.textContent.includes(title));
+    const paper = h5 && h5.closest('.mud-paper');
+    return paper ? abs(paper) : null;
+};
+const sections = {od: sectionOf('OD Right'), os: sectionOf('OS Left')};
+const parts = [sections.od, sections.os];
+document.querySelectorAll('.mud-table, table').forEach(el => parts.push(abs(el)));
+[...document.querySelectorAll('button')]
+    .filter(b => ['Print', 'Share'].includes(b.textContent.trim()))
+    .forEach(b => parts.push(abs(b)));
+const boxes = parts.filter(p => p && p.width > 0 && p.height > 0);
+const pageWidth = Math.max(doc.scrollWidth, window.innerWidth);
+const pageHeight = Math.max(doc.scrollHeight, window.innerHeight);
+let clip = {x: 0, y: 0, width: pageWidth, height: Math.min(pageHeight, maxHeight)};
+if (boxes.length) {
+    const left = Math.max(0, Math.min(...boxes.map(b => b.x)) - margin);
+    const top = Math.max(0, Math.min(...boxes.map(b => b.y)) - margin);
+    const right = Math.min(pageWidth, Math.max(...boxes.map(b => b.x + b.width)) + margin);
+    const bottom = Math.min(pageHeight, Math.max(...boxes.map(b => b.y + b.height)) + margin);
+    clip = {x: left, y: top, width: right - left, height: Math.min(bottom - top, maxHeight)};
+}
+const regions = {};
+for (const [name, box] of Object.entries(sections)) {
+    if (box) {
+        regions[name] = {x: box.x - clip.x, y: box.y - clip.y, width: box.width, height: box.height};
+    }
+}
+return {clip: clip, regions: regions};
+"""
+
+def normalize_screenshot_format(fmt):
+    fmt = (fmt or SCREENSHOT_FORMAT).lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in SCREENSHOT_MIMETYPES:
+        raise ValueError(f"Unsupported screenshot format '{fmt}' (png, jpeg or webp)")
+    return fmt
+
+def capture_results_screenshot(driver, fmt='png', quality=80):
+    """Capture en mémoire (Page.captureScreenshot) de la zone des résultats; retourne (bytes, régions OD/OS dans l'image)"""
+    info = driver.execute_script(RESULTS_REGION_JS, SCREENSHOT_MAX_HEIGHT, SCREENSHOT_MARGIN)
+    clip = dict(info['clip'], scale=1)
+    params = {
+        'format': fmt,
+        'clip': clip,
+        'captureBeyondViewport': True,
+        'fromSurface': True
+    }
+    if fmt != 'png':
+        params['quality'] = max(1, min(100, int(quality)))
+    data = driver.execute_cdp_cmd('Page.captureScreenshot', params)['data']
+    print(f"✅ Screenshot captured via DevTools ({fmt}, {int(clip['width'])}x{int(clip['height'])})")
+    return base64.b64decode(data), {k: v for k, v in info['regions'].items() if v}
+
+def capture_result(driver, screenshot_path, options, result):
+    """Capture le screenshot dans `result` (bytes + mimetype) et l'écrit sur disque si persist"""
+    fmt = options.get('format', 'png')
+    try:
+        image, regions = capture_results_screenshot(driver, fmt, options.get('quality', SCREENSHOT_QUALITY))
+    except Exception as e:
+        # Ancien chemin (redimensionnement + PNG sur disque) si DevTools n'est pas disponible
+        print(f"⚠️ DevTools capture failed ({e}), falling back to full page PNG")
+        fmt = 'png'
+        screenshot_path = os.path.splitext(screenshot_path)[0] + '.png'
+        if not take_fullpage_screenshot(driver, screenshot_path):
+            return False
+        with open(screenshot_path, 'rb') as f:
+            image = f.read()
+        regions = {}
+        if not options.get('persist', True):
+            os.remove(screenshot_path)
+
+    result['screenshot'] = image
+    result['screenshot_format'] = fmt
+    result['screenshot_mimetype'] = SCREENSHOT_MIMETYPES[fmt]
+    result['screenshot_regions'] = regions
+    if options.get('persist', True):
+        result['screenshot_path'] = screenshot_path
+        if not os.path.exists(screenshot_path):
+            with open(screenshot_path, 'wb') as f:
+                f.write(image)
+            print(f"💾 Screenshot saved: {screenshot_path} ({len(image)} bytes)")
+    return True
+
+# Rétention du dossier screenshots: âge max, quota en octets et en nombre de fichiers, index calc_id -> fichier
+SCREENSHOT_MAX_AGE = int(os.environ.get("SCREENSHOT_MAX_AGE", str(7 * 24 * 3600)))
+SCREENSHOT_MAX_BYTES = int(os.environ.get("SCREENSHOT_MAX_BYTES", str(2 * 1024 ** 3)))
+SCREENSHOT_MAX_FILES = int(os.environ.get("SCREENSHOT_MAX_FILES", "10000"))
+SCREENSHOT_SWEEP_INTERVAL = int(os.environ.get("SCREENSHOT_SWEEP_INTERVAL", "300"))
+SCREENSHOT_INDEX_FILE = "index.json"
+# Variantes servies par /screenshot (?w= miniature, ?region=od|os découpe), générées une fois à côté de l'original
+SCREENSHOT_MAX_VARIANTS = int(os.environ.get("SCREENSHOT_MAX_VARIANTS", "8"))
+SCREENSHOT_VARIANT_MAX_WIDTH = int(os.environ.get("SCREENSHOT_VARIANT_MAX_WIDTH", "4096"))
+# Un calc_id désigne toujours la même image: le client peut la garder un an
+SCREENSHOT_CACHE_MAX_AGE = int(os.environ.get("SCREENSHOT_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+SCREENSHOT_REGIONS = ('od', 'os')
+
+def file_etag(path):
+    """ETag fort: empreinte SHA-256 du contenu"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+def render_variant(source, target, fmt, width=None, box=None):
+    """Découpe (box en pixels de l'image, capturée à l'échelle 1) puis réduit à `width`"""
+    with Image.open(source) as image:
+        if box:
+            left, top = max(0, int(box['x'])), max(0, int(box['y']))
+            right = min(image.width, int(box['x'] + box['width']))
+            bottom = min(image.height, int(box['y'] + box['height']))
+            if right <= left or bottom <= top:
+                raise LookupError("Region is outside of the screenshot")
+            image = image.crop((left, top, right, bottom))
+        if width and width < image.width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        params = {}
+        if fmt != 'png':
+            params['quality'] = SCREENSHOT_QUALITY
+            if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+        image.save(target, format=fmt.upper(), **params)
+
+class ScreenshotStore:
+    """Index des screenshots sur disque avec quotas et nettoyage en arrière-plan"""
+
+    def __init__(self, directory, max_age, max_bytes, max_files, sweep_interval):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()  # calc_id -> métadonnées, du plus ancien au plus récent
+        self._bytes = 0
+        self._removed = 0
+        self._last_sweep = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._load()
+
+    def _index_path(self):
+        return os.path.join(self.directory, SCREENSHOT_INDEX_FILE)
+
+    def _load(self):
+        entries = None
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Screenshot index unreadable ({e}), rebuilding")
+
+        if entries is None:
+            entries = self._scan()
+            self._dirty = True
+        for calc_id, entry in sorted(entries.items(), key=lambda item: item[1]['created_at']):
+            self._entries[calc_id] = entry
+            self._bytes += self._entry_bytes(entry)
+        print(f"🗂️ Screenshot index: {len(self._entries)} files, {self._bytes} bytes")
+
+    def _scan(self):
+        """Reconstruit l'index depuis le contenu du dossier"""
+        formats = {ext: fmt for fmt, ext in SCREENSHOT_EXTENSIONS.items()}
+        entries = {}
+        for name in os.listdir(self.directory):
+            calc_id, _, ext = name.partition('.')
+            if ext not in formats:
+                if ext.rpartition('.')[2] in formats:
+                    # Variante d'un index perdu: elle sera régénérée à la demande
+                    os.remove(os.path.join(self.directory, name))
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries[calc_id] = {
+                'file': name,
+                'format': formats[ext],
+                'size': stat.st_size,
+                'created_at': stat.st_mtime,
+                'regions': {},
+                'variants': {}
+            }
+        return entries
+
+    @staticmethod
+    def _entry_bytes(entry):
+        """Taille de l'original et de ses variantes"""
+        return entry['size'] + sum(variant['size'] for variant in entry.get('variants', {}).values())
+
+    def flush(self):
+        """Écrit l'index sur disque (écriture atomique)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = json.dumps(self._entries)
+            self._dirty = False
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(snapshot)
+        os.replace(tmp_path, self._index_path())
+
+    def path_for(self, entry):
+        return os.path.join(self.directory, entry['file'])
+
+    def register(self, calc_id, path, fmt, regions=None):
+        """Ajoute un screenshot fraîchement écrit à l'index"""
+        entry = {
+            'file': os.path.basename(path),
+            'format': fmt,
+            'size': os.path.getsize(path),
+            'created_at': time.time(),
+            'regions': regions or {},
+            'etag': file_etag(path),
+            'variants': {}
+        }
+        with self._lock:
+            previous = self._entries.pop(calc_id, None)
+            if previous:
+                self._bytes -= self._entry_bytes(previous)
+                self._delete_variants(previous)
+            self._entries[calc_id] = entry
+            self._bytes += entry['size']
+            self._dirty = True
+            self._enforce_quota()
+
+    def lookup(self, calc_id):
+        """Métadonnées d'un screenshot indexé, ou None"""
+        with self._lock:
+            entry = self._entries.get(calc_id)
+            return dict(entry) if entry else None
+
+    def contains(self, calc_id):
+        with self._lock:
+            return calc_id in self._entries
+
+    def original(self, calc_id):
+        """Comme lookup, avec l'ETag calculé au besoin (entrées d'un index antérieur aux ETags)"""
+        with self._lock:
+            entry = self._entries.get(calc_id)
+            if entry is None:
+                return None
+            if 'etag' in entry:
+                return dict(entry)
+            path = self.path_for(entry)
+        etag = file_etag(path)
+        with self._lock:
+            entry = self._entries.get(calc_id)
+            if entry is None:
+                return None
+            entry['etag'] = etag
+            self._dirty = True
+            return dict(entry)
+
+    def variant(self, calc_id, width=None, region=None):
+        """
+        Variante d'un screenshot (miniature de largeur `width`, découpe de l'oeil `region`), générée au
+        premier appel puis gardée sur disque et dans l'index; None si le screenshot n'existe pas.
+        LookupError si la région demandée n'a pas été relevée à la capture.
+        """
+        key = '-'.join(part for part in (region, f"w{width}" if width else None) if part)
+        with self._lock:
+            entry = self._entries.get(calc_id)
+            if entry is None:
+                return None
+            variant = entry.get('variants', {}).get(key)
+            if variant and os.path.exists(self.path_for(variant)):
+                return dict(variant, format=entry['format'])
+            fmt = entry['format']
+            source = self.path_for(entry)
+            box = entry['regions'].get(region) if region else None
+        if region and not box:
+            raise LookupError(f"Region '{region}' not available for this screenshot")
+        if not box:
+            with Image.open(source) as image:
+                if width >= image.width:
+                    # Pas plus large que l'original: inutile de le dupliquer
+                    return self.original(calc_id)
+
+        name = f"{calc_id}.{key}.{SCREENSHOT_EXTENSIONS[fmt]}"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            render_variant(source, tmp_path, fmt, width, box)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        variant = {'file': name, 'size': os.path.getsize(path), 'etag': file_etag(path)}
+        print(f"🖼️ Screenshot variant generated: {name} ({variant['size']} bytes)")
+
+        with self._lock:
+            entry = self._entries.get(calc_id)
+            if entry is None:
+                # Screenshot supprimé pendant la génération
+                os.remove(path)
+                return None
+            variants = entry.setdefault('variants', {})
+            previous = variants.pop(key, None)
+            if previous:
+                self._bytes -= previous['size']
+            variants[key] = variant
+            self._bytes += variant['size']
+            while len(variants) > SCREENSHOT_MAX_VARIANTS:
+                oldest = variants.pop(next(iter(variants)))
+                self._bytes -= oldest['size']
+                self._delete_file(oldest)
+            self._dirty = True
+            self._enforce_quota()
+        return dict(variant, format=fmt)
+
+    def _delete_file(self, entry):
+        try:
+            os.remove(self.path_for(entry))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Could not delete screenshot {entry['file']}: {e}")
+
+    def _delete_variants(self, entry):
+        for variant in entry.get('variants', {}).values():
+            self._delete_file(variant)
+
+    def _remove(self, calc_id):
+        entry = self._entries.pop(calc_id)
+        self._bytes -= self._entry_bytes(entry)
+        self._removed += 1
+        self._dirty = True
+        self._delete_file(entry)
+        self._delete_variants(entry)
+
+    def _enforce_quota(self):
+        # Les plus anciens partent d'abord
+        while self._entries and (len(self._entries) > self.max_files or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def sweep(self):
+        """Supprime les screenshots expirés, applique les quotas et oublie les fichiers disparus"""
+        limit = time.time() - self.max_age
+        with self._lock:
+            before = self._removed
+            for calc_id in list(self._entries):
+                entry = self._entries[calc_id]
+                if entry['created_at'] < limit:
+                    self._remove(calc_id)
+                elif not os.path.exists(self.path_for(entry)):
+                    self._bytes -= self._entry_bytes(entry)
+                    del self._entries[calc_id]
+                    self._delete_variants(entry)
+                    self._dirty = True
+            self._enforce_quota()
+            removed = self._removed - before
+            self._last_sweep = time.time()
+        if removed:
+            print(f"🧹 Screenshot sweep removed {removed} files")
+        self.flush()
+
+    def start(self):
+        """Lance le nettoyeur périodique (et l'écriture différée de l'index)"""
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        next_sweep = 0
+        while not self._stop.wait(5):
+            try:
+                if time.time() >= next_sweep:
+                    self.sweep()
+                    next_sweep = time.time() + self.sweep_interval
+                else:
+                    self.flush()
+            except Exception as e:
+                print(f"⚠️ Screenshot sweeper error: {e}")
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._entries),
+                'bytes': self._bytes,
+                'max_files': self.max_files,
+                'max_bytes': self.max_bytes,
+                'max_age_seconds': self.max_age,
+                'removed': self._removed,
+                'last_sweep': datetime.fromtimestamp(self._last_sweep).isoformat() if self._last_sweep else None
+            }
+
+screenshot_store = ScreenshotStore(
+    SCREENSHOTS_DIR,
+    max_age=SCREENSHOT_MAX_AGE,
+    max_bytes=SCREENSHOT_MAX_BYTES,
+    max_files=SCREENSHOT_MAX_FILES,
+    sweep_interval=SCREENSHOT_SWEEP_INTERVAL
+)
+atexit.register(screenshot_store.close)
+
+# Extraction structurée des résultats (par oeil et par formule) depuis le HTML de la page
+KNOWN_FORMULAS = [
+    "Barrett", "Cooke K6", "EVO", "Hill-RBF", "Hoffer QST", "Kane", "Pearl-DGS",
+    "Castrop", "Olsen", "Panacea", "VRF-G", "SRK/T", "Haigis", "Holladay", "Hoffer Q"
+]
+
+# Copie du DOM où les valeurs courantes des inputs sont écrites en attributs (sinon absentes du HTML)
+SNAPSHOT_HTML_JS = """
+const clone = document.documentElement.cloneNode(true);
+const live = document.querySelectorAll('input, textarea');
+const copies = clone.querySelectorAll('input, textarea');
+live.forEach((el, i) => {
+    const copy = copies[i];
+    if (!copy) return;
+    if (el.type === 'checkbox' || el.type === 'radio') {
+        if (el.checked) copy.setAttribute('checked', ''); else copy.removeAttribute('checked');
+    } else {
+        copy.setAttribute('value', el.value);
+    }
+});
+clone.querySelectorAll('script, style, svg').forEach(el => el.remove());
+return '<!DOCTYPE html>' + clone.outerHTML;
+"""
+
+class _HtmlNode:
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = dict(attrs)
+        self.parent = parent
+        self.children = []
+
+    def text(self):
+        parts = []
+        def walk(node):
+            for child in node.children:
+                if isinstance(child, str):
+                    parts.append(child)
+                else:
+                    walk(child)
+        walk(self)
+        return " ".join(" ".join(parts).split())
+
+    def iter(self):
+        yield self
+        for child in self.children:
+            if not isinstance(child, str):
+                yield from child.iter()
+
+    def classes(self):
+        return (self.attrs.get('class') or '').split()
+
+class _HtmlTreeBuilder(HTMLParser):
+    """Mini arbre DOM construit avec html.parser (pas de dépendance externe)"""
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _HtmlNode('#document', [], None)
+        self._current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = _HtmlNode(tag, attrs, self._current)
+        self._current.children.append(node)
+        if tag not in self.VOID_TAGS:
+            self._current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self._current.children.append(_HtmlNode(tag, attrs, self._current))
+
+    def handle_endtag(self, tag):
+        node = self._current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self._current = node.parent
+
+    def handle_data(self, data):
+        if data.strip():
+            self._current.children.append(data)
+
+def _eye_from_heading(text):
+    if re.search(r'\bOD\b|\bRight\b', text):
+        return "OD"
+    if re.search(r'\bOS\b|\bLeft\b', text):
+        return "OS"
+    return None
+
+def _is_heading(node):
+    return node.tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6') or any(
+        c.startswith('mud-typography-h') for c in node.classes())
+
+def _parse_number(text):
+    """'+21.5 D' -> 21.5, '-0,12' -> -0.12; le texte est gardé s'il n'est pas numérique"""
+    if not text or not text.strip():
+        return None
+    match = re.fullmatch(r'\s*([+\-−]?\d+(?:[.,]\d+)?)\s*(?:D|°|mm)?\s*', text)
+    if not match:
+        return text.strip()
+    return float(match.group(1).replace(',', '.').replace('−', '-'))
+
+def _field_key(header):
+    lowered = header.lower()
+    if 'cyl' in lowered:
+        return 'cylinder'
+    if 'axis' in lowered:
+        return 'axis'
+    if 'toric' in lowered or 'model' in lowered:
+        return 'toric_model'
+    if 'ref' in lowered or 'pred' in lowered or lowered in ('se', 'rx'):
+        return 'predicted_refraction'
+    if 'iol' in lowered or 'power' in lowered:
+        return 'iol_power'
+    return re.sub(r'[^a-z0-9]+', '_', lowered).strip('_') or 'value'
+
+def _match_formula(text):
+    lowered = (text or '').lower()
+    for name in KNOWN_FORMULAS:
+        if lowered.startswith(name.lower()):
+            return name
+    return None
+
+TORIC_KEYS = ('cylinder', 'axis', 'toric_model')
+
+def _parse_table(table):
+    """En-têtes + lignes de cellules (data-label MudTable si présent)"""
+    headers = []
+    rows = []
+    for tr in (n for n in table.iter() if n.tag == 'tr'):
+        cells = [c for c in tr.children if not isinstance(c, str) and c.tag in ('th', 'td')]
+        if not cells:
+            continue
+        if all(c.tag == 'th' for c in cells) and not headers:
+            headers = [c.text() for c in cells]
+            continue
+        if not headers and all(c.attrs.get('data-label') for c in cells):
+            headers = [c.attrs['data-label'] for c in cells]
+        rows.append([c.text() for c in cells])
+    return headers, rows
+
+def _add_formula_values(formulas, name, values):
+    values = {k: v for k, v in values.items() if v is not None}
+    entry = formulas.setdefault(name, {})
+    toric = {k: values.pop(k) for k in TORIC_KEYS if k in values}
+    entry.update(values)
+    if toric:
+        entry.setdefault('toric', {}).update(toric)
+
+def _formulas_from_table(headers, rows):
+    """Deux dispositions: une ligne par formule, ou une colonne par formule (lignes = puissances IOL)"""
+    formulas = {}
+    formula_col = next((i for i, h in enumerate(headers) if 'formula' in h.lower()), None)
+    if formula_col is None and rows and all(_match_formula(r[0]) for r in rows if r):
+        formula_col = 0
+
+    if formula_col is not None:
+        for row in rows:
+            if formula_col >= len(row):
+                continue
+            name = row[formula_col]
+            if not name:
+                continue
+            values = {}
+            for i, cell in enumerate(row):
+                if i != formula_col and i < len(headers):
+                    values[_field_key(headers[i])] = _parse_number(cell)
+            _add_formula_values(formulas, name, values)
+        return formulas
+
+    formula_cols = {i: h for i, h in enumerate(headers) if _match_formula(h)}
+    if formula_cols:
+        for row in rows:
+            if not row:
+                continue
+            power = _parse_number(row[0])
+            for i, name in formula_cols.items():
+                if i < len(row) and i != 0:
+                    refraction = _parse_number(row[i])
+                    if refraction is not None:
+                        formulas.setdefault(name, {}).setdefault('options', []).append({
+                            'iol_power': power,
+                            'predicted_refraction': refraction
+                        })
+    return formulas
+
+def parse_results_html(html, data=None):
+    """
+    Transforme le HTML de la page de résultats en JSON par oeil (OD/OS): formules, puissances IOL,
+    réfraction prédite, valeurs toriques et lentille choisie. Fonctionne sur une copie sauvegardée de la page.
+    """
+    data = data or {}
+    builder = _HtmlTreeBuilder()
+    builder.feed(html)
+    builder.close()
+
+    eyes = {}
+    labels = {}
+    current_eye = None
+    for node in builder.root.iter():
+        if _is_heading(node):
+            current_eye = _eye_from_heading(node.text()) or current_eye
+        elif node.tag == 'label' and node.attrs.get('for'):
+            labels[node.attrs['for']] = (current_eye, node.text())
+        elif node.tag == 'table' and current_eye:
+            headers, rows = _parse_table(node)
+            if not rows:
+                continue
+            eye = eyes.setdefault(current_eye, {'formulas': {}, 'tables': []})
+            eye['tables'].append({'headers': headers, 'rows': rows})
+            for name, values in _formulas_from_table(headers, rows).items():
+                options = values.pop('options', None)
+                _add_formula_values(eye['formulas'], name, values)
+                if options:
+                    eye['formulas'][name].setdefault('options', []).extend(options)
+
+    # Lentille affichée dans les selects Manufacturer / Select IOL (repli sur le payload)
+    displayed = {}
+    for node in builder.root.iter():
+        if node.tag == 'input' and node.attrs.get('id') in labels:
+            eye_name, label = labels[node.attrs['id']]
+            if label in ("Manufacturer", "Select IOL") and node.attrs.get('value'):
+                displayed[(eye_name, label)] = node.attrs['value']
+
+    for eye_name, key in (("OD", "right_eye"), ("OS", "left_eye")):
+        requested = data.get(key) or {}
+        if not requested and eye_name not in eyes:
+            continue
+        eye = eyes.setdefault(eye_name, {'formulas': {}, 'tables': []})
+        eye['lens'] = {
+            'manufacturer': displayed.get((eye_name, "Manufacturer"), requested.get("Manufacturer")),
+            'model': displayed.get((eye_name, "Select IOL"), requested.get("Select IOL"))
+        }
+        eye['toric'] = bool((requested.get("switches") or {}).get("Toric"))
+
+    return eyes
+
+@traced
+def extract_results(driver, data):
+    """Résultats structurés de la page courante"""
+    html = driver.execute_script(SNAPSHOT_HTML_JS)
+    return parse_results_html(html, data)
+
+@traced
 def select_gender(driver, wait, gender_value="Female"):
     try:
-        dropdown_container = wait.until(EC.presence_of_element_located((
-            By.XPATH, "//div[contains(@class, 'mud-select')]"
-        )))
+        dropdown_container = ui.wait_for(wait, "gender_select")
         ActionChains(driver).move_to_element(dropdown_container).click().perform()
 
-        dropdown_popup = wait.until(EC.presence_of_element_located((
-            By.XPATH, "//div[contains(@class, 'mud-popover-open')]"
-        )))
-        time.sleep(0.5)
+        dropdown_popup = ui.wait_for(wait, "open_popover")
+        wait_for_settled(driver, "gender_popover", 0.5)
 
-        gender_option = dropdown_popup.find_element(
-            By.XPATH, f".//div[contains(@class,'mud-list-item')][.//p[normalize-space(text())='{gender_value}']]"
-        )
+        gender_option = ui.find(dropdown_popup, "popover_option", value=gender_value)
         gender_option.click()
         print(f"✅ Gender selected: {gender_value}")
     except Exception as e:
         print(f"❌ Failed to select gender: {e}")
         raise
 
+@traced
 def select_dropdown_value(section, driver, wait, dropdown_label, value):
     try:
-        dropdown = section.find_element(
-            By.XPATH, f".//div[contains(@class, 'mud-select') and .//label[normalize-space(text())='{dropdown_label}']]"
-        )
+        dropdown = ui.find(section, "section_dropdown", label=dropdown_label)
         ActionChains(driver).move_to_element(dropdown).click().perform()
 
-        popup = wait.until(EC.presence_of_element_located((
-            By.XPATH, "//div[contains(@class, 'mud-popover-open')]"
-        )))
-        time.sleep(0.5)
+        popup = ui.wait_for(wait, "open_popover")
+        wait_for_settled(driver, "dropdown_popover", 0.5)
 
-        option = popup.find_element(
-            By.XPATH, f".//div[contains(@class,'mud-list-item')][.//p[normalize-space(text())='{value}']]"
-        )
+        option = ui.find(popup, "popover_option", value=value)
+        clicked_at = time.time()
         option.click()
-        time.sleep(1)
+        wait_for_settled(driver, "dropdown_option", 1, since=clicked_at, popover_closed=True)
         print(f"✅ {dropdown_label} = {value}")
     except Exception as e:
         print(f"❌ Error selecting {dropdown_label} = {value}: {e}")
         raise
 
+@traced
 def set_switch(section, driver, switch_label, desired_state):
     """
     Active ou désactive un switch dans une section donnée (OD ou OS)
@@ -210,19 +2106,17 @@ def set_switch(section, driver, switch_label, desired_state):
     """
     try:
         # Trouver l'input switch par son label
-        switch_input = section.find_element(
-            By.XPATH, f".//label[.//p[contains(@class, 'mud-switch') and normalize-space(text())='{switch_label}']]//input[@type='checkbox' and contains(@class, 'mud-switch-input')]"
-        )
+        switch_input = ui.find(section, "switch_input", label=switch_label)
 
         # Vérifier l'état actuel du switch
         is_checked = switch_input.is_selected()
 
         # Si l'état actuel est différent de l'état désiré, cliquer
         if is_checked != desired_state:
-            driver.execute_script("arguments[0].scrollIntoView(true);", switch_input)
-            time.sleep(0.3)
+            # Un click JS n'a pas besoin de scrollIntoView (ancien délai de 0.3 s supprimé)
+            clicked_at = time.time()
             driver.execute_script("arguments[0].click();", switch_input)
-            time.sleep(0.5)
+            wait_for_settled(driver, "switch_click", 0.8, since=clicked_at)
             print(f"✅ Switch '{switch_label}' set to: {desired_state}")
         else:
             print(f"ℹ️  Switch '{switch_label}' already at: {desired_state}")
@@ -231,12 +2125,14 @@ def set_switch(section, driver, switch_label, desired_state):
         print(f"⚠️ Warning: Could not set switch '{switch_label}' to {desired_state}: {e}")
         # Ne pas raise l'erreur, continuer
 
+@traced
 def configure_switches(section, driver, switches_config, eye_name):
     """Configure tous les switches d'une section (OD ou OS)"""
     if not switches_config:
         return
 
     print(f"\n🔘 Configuring switches for {eye_name}...")
+    started_at = time.time()
 
     # Les 4 switches disponibles
     available_switches = ["Toric", "Keratoconus", "Argos (SoS) AL", "Post LASIK/PRK"]
@@ -247,10 +2143,746 @@ def configure_switches(section, driver, switches_config, eye_name):
             set_switch(section, driver, switch_name, desired_state)
 
     # Attendre que la page se stabilise après les switches
-    time.sleep(1)
+    wait_for_settled(driver, "switches_done", 1, since=started_at)
+
+# Remplissage des champs d'un oeil en un seul appel de script (BULK_FILL=0 pour le chemin clavier)
+BULK_FILL = os.environ.get("BULK_FILL", "1") == "1"
+
+# Résout label -> input dans la section et pose les valeurs avec les événements attendus par Blazor
+BULK_FILL_JS = """
+const section = arguments[0], fields = arguments[1];
+const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+const filled = {};
+section.querySelectorAll('input').forEach(el => {
+    const type = (el.type || 'text').toLowerCase();
+    if (type === 'checkbox' || type === 'radio' || !el.id) return;
+    const label = section.querySelector('label[for="' + CSS.escape(el.id) + '"]');
+    if (!label) return;
+    const text = label.innerText.trim();
+    if (!(text in fields) || text in filled) return;
+    el.focus();
+    // Valeur posée en une fois: le "-" de Target Refraction n'est plus avalé comme au clavier
+    setter.call(el, fields[text]);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+    el.blur();
+    filled[text] = el.id;
+});
+return filled;
+"""
+
+# Relit les valeurs après le re-rendu Blazor (label -> valeur affichée)
+READ_VALUES_JS = """
+const ids = arguments[0], values = {};
+for (const [label, id] of Object.entries(ids)) {
+    const el = document.getElementById(id);
+    values[label] = el ? el.value : null;
+}
+return values;
+"""
+
+EYE_SECTIONS = {
+    "OD": ("OD Right", "Right Eye"),
+    "OS": ("OS Left", "Left Eye")
+}
+
+def same_field_value(expected, actual):
+    """Compare la valeur demandée à celle affichée (23.5 == 23.50, virgule décimale tolérée)"""
+    if actual is None:
+        return False
+    if expected.strip() == actual.strip():
+        return True
+    try:
+        return float(expected.replace(',', '.')) == float(actual.replace(',', '.'))
+    except ValueError:
+        return False
+
+def type_into_input(el, label, value):
+    """Chemin clavier: click, CTRL-A, BACKSPACE puis saisie"""
+    el.click()
+    el.send_keys(Keys.CONTROL, "a")
+    el.send_keys(Keys.BACKSPACE)
+    if label == "Target Refraction" and value.startswith("-"):
+        el.send_keys("-")
+        el.send_keys(value[1:])
+    else:
+        el.send_keys(value)
+
+def fill_section_inputs_by_keys(section, input_fields, only=None):
+    """Remplit les inputs d'une section un par un (plusieurs allers-retours WebDriver par champ)"""
+    filled_count = 0
+    for el in section.find_elements(By.XPATH, ".//input"):
+        try:
+            input_id = el.get_attribute("id")
+            input_type = el.get_attribute("type")
+
+            # Skip checkboxes/radios
+            if input_type in ["checkbox", "radio"]:
+                continue
+
+            label_el = section.find_elements(By.XPATH, f".//label[@for='{input_id}']")
+            if label_el:
+                label = label_el[0].text.strip()
+                if label in input_fields and (only is None or label in only):
+                    value = str(input_fields[label])
+                    type_into_input(el, label, value)
+                    filled_count += 1
+                    print(f"✅ {label}: {value}")
+        except Exception as e:
+            print(f"⚠️ Error filling field: {e}")
+            continue
+    return filled_count
+
+def fill_section_inputs_bulk(section, driver, input_fields, eye_name):
+    """
+    Remplit tous les champs d'une section en un seul execute_script, puis vérifie après le re-rendu
+    que les valeurs ont été prises par le serveur; les champs rejetés repassent par le clavier.
+    """
+    values = {label: str(value) for label, value in input_fields.items()}
+    started_at = time.time()
+    filled = driver.execute_script(BULK_FILL_JS, section, values)
+    wait_for_settled(driver, "bulk_fill", 0, since=started_at if filled else None, change_timeout=1)
+
+    displayed = driver.execute_script(READ_VALUES_JS, filled) if filled else {}
+    rejected = [label for label in filled if not same_field_value(values[label], displayed.get(label))]
+    for label in filled:
+        if label not in rejected:
+            print(f"✅ {label}: {values[label]}")
+
+    if rejected:
+        print(f"⚠️ {eye_name}: values not kept for {rejected}, retyping them")
+        fill_section_inputs_by_keys(section, input_fields, only=set(rejected))
+    return len(filled)
+
+def configure_eye(driver, wait, session, eye, eye_name):
+    """Configure une section OD/OS: switches, champs puis Manufacturer / Select IOL"""
+    header, eye_label = EYE_SECTIONS[eye_name]
+    print(f"\n👁️ Configuring {eye_name} ({eye_label})...")
+    section = ui.find(driver, "eye_section", header=header)
+
+    manufacturer = eye.get("Manufacturer", None)
+    select_iol = eye.get("Select IOL", None)
+    switches = eye.get("switches", None)
+
+    input_fields = {k: v for k, v in eye.items() if k not in ("Manufacturer", "Select IOL", "switches")}
+
+    # Configure switches FIRST (before filling fields)
+    if switches:
+        with phase("switches", eye_name):
+            configure_switches(section, driver, switches, eye_name)
+
+    # Fill input fields
+    print(f"📝 Filling {len(input_fields)} fields for {eye_name}...")
+    filled_count = 0
+    with phase("fill", eye_name):
+        if input_fields:
+            if BULK_FILL:
+                try:
+                    filled_count = fill_section_inputs_bulk(section, driver, input_fields, eye_name)
+                except Exception as e:
+                    print(f"⚠️ Bulk fill failed ({e}), falling back to keystrokes")
+                    filled_count = fill_section_inputs_by_keys(section, input_fields)
+            else:
+                filled_count = fill_section_inputs_by_keys(section, input_fields)
+
+    print(f"📊 Filled {filled_count}/{len(input_fields)} fields for {eye_name}")
+
+    with phase("dropdowns", eye_name):
+        if manufacturer:
+            select_dropdown_value(section, driver, wait, "Manufacturer", manufacturer)
+            session.selected_dropdowns.add((eye_name, "Manufacturer"))
+        if select_iol:
+            select_dropdown_value(section, driver, wait, "Select IOL", select_iol)
+            session.selected_dropdowns.add((eye_name, "Select IOL"))
+
+def open_calculator(driver, wait):
+    """Charge le calculateur, accepte les conditions et décoche la 4e checkbox"""
+    print("🔍 Navigating to site...")
+    with phase("navigation"):
+        driver.set_page_load_timeout(max(1, budget(300)))
+        driver.get(CALCULATOR_URL)
+        track_mutations(driver)
+
+    # Accept conditions
+    print("✅ Accepting conditions...")
+    with phase("consent"):
+        agree_button = ui.wait_for(wait, "agree_button", clickable=True)
+        clicked_at = time.time()
+        agree_button.click()
+        wait_for_settled(driver, "agree", 1, since=clicked_at)
+
+    # Uncheck 4th checkbox if checked
+    try:
+        fourth_checkbox = ui.wait_for(wait, "option_checkbox", index=4)
+        is_checked = fourth_checkbox.get_attribute("aria-checked")
+        if is_checked != "false":
+            fourth_checkbox.click()
+            print("✅ 4th checkbox unchecked")
+    except Exception as e:
+        print(f"⚠️ Checkbox handling: {e}")
+
+# Remet les switches OD/OS à off (le rendu Blazor peut ajouter/retirer des champs)
+RESET_SWITCHES_JS = """
+let count = 0;
+document.querySelectorAll('input.mud-switch-input').forEach(el => {
+    if (el.checked) { el.click(); count++; }
+});
+return count;
+"""
+
+# Vide les champs texte (top fields et sections OD/OS) en déclenchant les événements Blazor
+RESET_INPUTS_JS = """
+const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+let count = 0;
+document.querySelectorAll('input').forEach(el => {
+    const type = (el.type || 'text').toLowerCase();
+    if (['checkbox', 'radio', 'hidden'].includes(type) || el.readOnly || el.disabled) return;
+    if (el.value !== '') {
+        setter.call(el, '');
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+        count++;
+    }
+});
+return count;
+"""
+
+# Compte ce qui n'a pas été remis à zéro
+CHECK_RESET_JS = """
+let dirty = 0;
+document.querySelectorAll('input').forEach(el => {
+    const type = (el.type || 'text').toLowerCase();
+    if (el.classList.contains('mud-switch-input')) { if (el.checked) dirty++; return; }
+    if (['checkbox', 'radio', 'hidden'].includes(type) || el.readOnly || el.disabled) return;
+    if (el.value !== '') dirty++;
+});
+return dirty;
+"""
+
+@traced
+def reset_calculator_form(driver):
+    """Remet à zéro le formulaire d'une session primed (top fields, OD/OS, switches)"""
+    try:
+        track_mutations(driver)
+        started_at = time.time()
+        switches = driver.execute_script(RESET_SWITCHES_JS)
+        if switches:
+            wait_for_settled(driver, "reset_switches", 0.5, since=started_at)
+        started_at = time.time()
+        cleared = driver.execute_script(RESET_INPUTS_JS)
+        wait_for_settled(driver, "reset_inputs", 0.5, since=started_at if cleared else None)
+        dirty = driver.execute_script(CHECK_RESET_JS)
+        if dirty:
+            print(f"⚠️ Form reset incomplete: {dirty} field(s) still set")
+            return False
+        driver.execute_script("window.scrollTo(0, 0);")
+        print(f"♻️ Form reset ({cleared} fields, {switches} switches)")
+        return True
+    except Exception as e:
+        print(f"⚠️ Form reset failed: {e}")
+        return False
+
+def requested_dropdowns(data):
+    """Dropdowns (oeil, label) demandés par un payload"""
+    selected = set()
+    for eye_key, eye_name in (("right_eye", "OD"), ("left_eye", "OS")):
+        eye = data.get(eye_key) or {}
+        for label in ("Manufacturer", "Select IOL"):
+            if eye.get(label):
+                selected.add((eye_name, label))
+    return selected
+
+def prepare_session(session, data, wait):
+    """Réutilise la page primed si possible, sinon recharge complètement le calculateur"""
+    driver = session.driver
+    if session.primed:
+        # Un dropdown choisi précédemment ne peut pas être vidé: on recharge s'il n'est pas re-sélectionné
+        if not session.selected_dropdowns <= requested_dropdowns(data):
+            print("♻️ Previous lens selection cannot be cleared, reloading calculator...")
+            session.primed = False
+        else:
+            with phase("form_reset"):
+                reset_ok = reset_calculator_form(driver)
+            if not reset_ok:
+                print("♻️ Reloading calculator...")
+                session.primed = False
+
+    if not session.primed:
+        session.last_share_link = None
+        session.selected_dropdowns = set()
+        open_calculator(driver, wait)
+        session.primed = PRIMED_SESSIONS
+    else:
+        print("⚡ Reusing primed calculator page")
+
+def get_share_onclick(driver, mark_stale=False):
+    """Lit l'attribut onclick du bouton Share (None si absent, 'stale' si le bouton marqué n'a pas été re-rendu)"""
+    return driver.execute_script("""
+        const btn = [...document.querySelectorAll('button')].find(b => b.textContent.trim() === 'Share');
+        if (!btn) return null;
+        if (arguments[0]) btn.__iolStale = true;
+        else if (btn.__iolStale) return 'stale';
+        return btn.getAttribute('onclick');
+    """, mark_stale)
+
+# Champs patient (clé JSON -> label affiché)
+TOP_FIELD_LABELS = {
+    "surgeon": "Surgeon",
+    "patient_initials": "Patient Initials",
+    "id": "Id",
+    "age": "Age"
+}
+
+# Catalogue des lentilles (Manufacturer -> Select IOL), des champs et des switches par oeil, extrait du
+# calculateur et gardé sur disque: les payloads sont validés avant de lancer un navigateur
+CATALOG_FILE = os.environ.get("CATALOG_FILE", os.path.join(SCREENSHOTS_DIR, "lens_catalog.json"))
+CATALOG_REFRESH_INTERVAL = float(os.environ.get("CATALOG_REFRESH_INTERVAL", "86400"))
+CATALOG_RETRY_INTERVAL = float(os.environ.get("CATALOG_RETRY_INTERVAL", "900"))
+# Une lentille inconnue déclenche un rafraîchissement anticipé si le catalogue a au moins cet âge
+CATALOG_MIN_AGE = float(os.environ.get("CATALOG_MIN_AGE", "3600"))
+CATALOG_VALIDATION = os.environ.get("CATALOG_VALIDATION", "1") == "1"
+
+DROPDOWN_LABELS = ("Manufacturer", "Select IOL")
+
+LIST_OPTIONS_JS = """
+return [...arguments[0].querySelectorAll('.mud-list-item')].map(el => el.innerText.trim()).filter(Boolean);
+"""
+
+# Labels des champs et des switches d'une section OD/OS
+SECTION_LABELS_JS = """
+const section = arguments[0];
+const switches = [...section.querySelectorAll('input.mud-switch-input')]
+    .map(el => el.closest('label')).filter(Boolean).map(el => el.innerText.trim());
+const labels = [...section.querySelectorAll('label')].map(el => el.innerText.trim())
+    .filter(text => text && !switches.includes(text));
+return {switches: switches, labels: labels};
+"""
+
+class InvalidPayload(ValueError):
+    """Payload refusé par le catalogue; errors détaille chaque valeur inconnue avec des suggestions"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(error['message'] for error in errors))
+        self.errors = errors
+
+def list_dropdown_options(section, driver, wait, dropdown_label):
+    """Lit les options d'un dropdown de la section puis choisit la première (ce qui referme le popover)"""
+    dropdown = ui.find(section, "section_dropdown", label=dropdown_label)
+    ActionChains(driver).move_to_element(dropdown).click().perform()
+    popup = ui.wait_for(wait, "open_popover")
+    wait_for_settled(driver, "dropdown_popover", 0.5)
+    options = driver.execute_script(LIST_OPTIONS_JS, popup)
+    if options:
+        clicked_at = time.time()
+        ui.find(popup, "popover_option", value=options[0]).click()
+        wait_for_settled(driver, "dropdown_option", 1, since=clicked_at, popover_closed=True)
+    return options
+
+def scrape_catalog(driver, wait):
+    """Parcourt le calculateur: champs et switches de chaque oeil, puis les modèles de chaque fabricant"""
+    open_calculator(driver, wait)
+    catalog = {'manufacturers': {}, 'fields': {}, 'switches': {}}
+    for eye_name, (header, _) in EYE_SECTIONS.items():
+        section = ui.find(driver, "eye_section", header=header)
+        found = driver.execute_script(SECTION_LABELS_JS, section)
+        labels = set(found['labels'])
+        for switch_name in found['switches']:
+            # Certains champs n'apparaissent qu'avec un switch actif (ex. Toric)
+            set_switch(section, driver, switch_name, True)
+            labels.update(driver.execute_script(SECTION_LABELS_JS, section)['labels'])
+            set_switch(section, driver, switch_name, False)
+        catalog['fields'][eye_name] = sorted(labels - set(DROPDOWN_LABELS))
+        catalog['switches'][eye_name] = found['switches']
+
+    section = ui.find(driver, "eye_section", header=EYE_SECTIONS["OD"][0])
+    manufacturers = list_dropdown_options(section, driver, wait, "Manufacturer")
+    for index, manufacturer in enumerate(manufacturers):
+        if index:
+            select_dropdown_value(section, driver, wait, "Manufacturer", manufacturer)
+        catalog['manufacturers'][manufacturer] = list_dropdown_options(section, driver, wait, "Select IOL")
+    print(f"📚 Catalog scraped: {len(manufacturers)} manufacturers, "
+          f"{sum(len(models) for models in catalog['manufacturers'].values())} lenses")
+    return catalog
+
+class LensCatalog:
+    """Catalogue extrait du calculateur, rafraîchi en arrière-plan et persisté sur disque"""
+
+    def __init__(self, path, refresh_interval, retry_interval, enabled=True):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.enabled = enabled
+        self._catalog = None
+        self._refreshing = False
+        self._refreshes = 0
+        self._rejected = 0
+        self._last_error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                catalog = json.load(f)
+            if not catalog.get('manufacturers'):
+                raise ValueError("no manufacturers")
+            self._catalog = catalog
+            print(f"📚 Lens catalog loaded: {len(catalog['manufacturers'])} manufacturers "
+                  f"(scraped {datetime.fromtimestamp(catalog['scraped_at']).isoformat()})")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Lens catalog unreadable ({e}), it will be scraped again")
+
+    def _save(self, catalog):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self):
+        with self._lock:
+            return self._catalog
+
+    def age(self):
+        catalog = self.get()
+        return time.time() - catalog['scraped_at'] if catalog else None
+
+    def refresh(self):
+        """Extrait le catalogue avec un driver du pool et remplace la version courante"""
+        with self._lock:
+            self._refreshing = True
+        try:
+            # Passe par l'admission comme un calcul: le scraping ne prend pas un navigateur promis à une requête
+            admission.acquire(block=True, timeout=CALCULATION_DEADLINE_MAX)
+            try:
+                session = driver_pool.acquire()
+                try:
+                    catalog = scrape_catalog(session.driver, DeadlineWait(session.driver, 60))
+                finally:
+                    # Dropdowns choisis et switches manipulés: la page ne peut pas servir de session primed
+                    driver_pool.release(session, reusable=False)
+            finally:
+                # Durée non comptée: le scraping fausserait l'estimation du Retry-After des calculs
+                admission.release()
+            if not catalog['manufacturers']:
+                raise RuntimeError("No manufacturer found on the calculator page")
+            catalog['scraped_at'] = time.time()
+            self._save(catalog)
+            with self._lock:
+                self._catalog = catalog
+                self._refreshes += 1
+                self._last_error = None
+        except Exception as e:
+            with self._lock:
+                self._last_error = str(e)
+            raise
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def request_refresh(self):
+        """Rafraîchissement anticipé (lentille inconnue), au plus une fois par CATALOG_MIN_AGE"""
+        age = self.age()
+        if age is None or age >= CATALOG_MIN_AGE:
+            self._wake.set()
+
+    def start(self):
+        if self.enabled:
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        age = self.age()
+        delay = 0 if age is None else max(0, self.refresh_interval - age)
+        while True:
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.refresh()
+                delay = self.refresh_interval
+            except Exception as e:
+                print(f"⚠️ Lens catalog refresh failed: {e}")
+                delay = self.retry_interval
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+
+    @staticmethod
+    def _error(path, kind, value, candidates, hint=None):
+        suggestions = difflib.get_close_matches(str(value), candidates, n=3, cutoff=0.5)
+        message = f"Unknown {kind} '{value}' in {path.split('.')[0]}"
+        if hint:
+            message += f" ({hint})"
+        elif suggestions:
+            message += f", did you mean {' or '.join(repr(s) for s in suggestions)}?"
+        return {'field': path, 'value': value, 'message': message, 'suggestions': suggestions}
+
+    def validate(self, data):
+        """Vérifie lentilles, labels des champs et switches d'un payload (InvalidPayload); rien tant que le catalogue manque"""
+        catalog = self.get() if self.enabled else None
+        if catalog is None:
+            return
+        errors = []
+        unknown_lens = False
+        all_models = {}
+        for manufacturer, models in catalog['manufacturers'].items():
+            for model in models:
+                all_models.setdefault(model, []).append(manufacturer)
+
+        for eye_key, eye_name in (("right_eye", "OD"), ("left_eye", "OS")):
+            eye = data.get(eye_key)
+            if not isinstance(eye, dict):
+                continue
+            fields = catalog['fields'].get(eye_name) or []
+            for label in eye:
+                if fields and label not in DROPDOWN_LABELS and label != 'switches' and label not in fields:
+                    errors.append(self._error(f"{eye_key}.{label}", "field", label, fields))
+            switches = catalog['switches'].get(eye_name) or []
+            if switches and isinstance(eye.get('switches'), dict):
+                for name in eye['switches']:
+                    if name not in switches:
+                        errors.append(self._error(f"{eye_key}.switches.{name}", "switch", name, switches))
+
+            manufacturer = eye.get("Manufacturer")
+            models = None
+            if manufacturer:
+                models = catalog['manufacturers'].get(manufacturer)
+                if models is None:
+                    unknown_lens = True
+                    errors.append(self._error(f"{eye_key}.Manufacturer", "Manufacturer", manufacturer,
+                                              list(catalog['manufacturers'])))
+            model = eye.get("Select IOL")
+            if model and model not in (models if models is not None else all_models):
+                unknown_lens = True
+                hint = None
+                if models is not None and model in all_models:
+                    hint = f"offered by {', '.join(all_models[model])}, not {manufacturer}"
+                errors.append(self._error(f"{eye_key}.Select IOL", "IOL", model,
+                                          models if models is not None else list(all_models), hint))
+
+        if errors:
+            with self._lock:
+                self._rejected += 1
+            if unknown_lens:
+                self.request_refresh()
+            raise InvalidPayload(errors)
+
+    def as_dict(self):
+        catalog = self.get()
+        if catalog is None:
+            return None
+        return dict(catalog, scraped_at=datetime.fromtimestamp(catalog['scraped_at']).isoformat())
+
+    def stats(self):
+        with self._lock:
+            catalog = self._catalog
+            return {
+                'enabled': self.enabled,
+                'loaded': catalog is not None,
+                'scraped_at': datetime.fromtimestamp(catalog['scraped_at']).isoformat() if catalog else None,
+                'manufacturers': len(catalog['manufacturers']) if catalog else 0,
+                'lenses': sum(len(models) for models in catalog['manufacturers'].values()) if catalog else 0,
+                'refreshing': self._refreshing,
+                'refreshes': self._refreshes,
+                'rejected_payloads': self._rejected,
+                'last_error': self._last_error
+            }
+
+lens_catalog = LensCatalog(CATALOG_FILE, CATALOG_REFRESH_INTERVAL, CATALOG_RETRY_INTERVAL, enabled=CATALOG_VALIDATION)
+atexit.register(lens_catalog.close)
+
+# Moteur sans navigateur: dialogue direct avec le hub Blazor Server (SignalR + blazorpack sur WebSocket,
+# protocole dans blazor_protocol.py)
+CALC_ENGINE = os.environ.get("CALC_ENGINE", "selenium")
+CALC_ENGINES = ("selenium", "blazor")
+# Repli automatique sur Selenium si le moteur Blazor échoue
+BLAZOR_FALLBACK = os.environ.get("BLAZOR_FALLBACK", "1") == "1"
+BLAZOR_TIMEOUT = float(os.environ.get("BLAZOR_TIMEOUT", "60"))
+BLAZOR_QUIET_MS = int(os.environ.get("BLAZOR_QUIET_MS", "150"))
+# Enregistre chaque session (HTTP + trames WebSocket) en JSONL pour la rejouer hors ligne
+BLAZOR_RECORD_DIR = os.environ.get("BLAZOR_RECORD_DIR")
+# Rejoue un enregistrement au lieu de contacter le vrai site
+BLAZOR_REPLAY_FILE = os.environ.get("BLAZOR_REPLAY_FILE")
+
+def blazor_transport():
+    """Transport selon la configuration (rejeu, enregistrement ou réseau)"""
+    if BLAZOR_REPLAY_FILE:
+        return ReplayBlazorTransport(BLAZOR_REPLAY_FILE)
+    transport = HttpBlazorTransport()
+    if BLAZOR_RECORD_DIR:
+        os.makedirs(BLAZOR_RECORD_DIR, exist_ok=True)
+        path = os.path.join(BLAZOR_RECORD_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl")
+        return RecordingBlazorTransport(transport, path)
+    return transport
+
+def _blazor_button(dom, text):
+    buttons = dom.find_all(lambda n: n.name == 'button' and n.text_content() == text)
+    if not buttons:
+        buttons = dom.find_all(lambda n: n.name == 'button' and text in n.text_content())
+    return buttons[0] if buttons else None
+
+def _blazor_section(dom, header):
+    for h5 in dom.find_all(lambda n: n.name == 'h5' and header in n.text_content()):
+        node = h5.parent
+        while node is not None and not (node.kind == 'element' and node.has_class('mud-paper')):
+            node = node.parent
+        if node is not None:
+            return node
+    raise BlazorProtocolError(f"Section '{header}' not found")
+
+def _blazor_inputs_by_label(dom, scope):
+    """label -> input (même logique que le remplissage Selenium: label[for=id])"""
+    nodes = list(scope.iter())
+    by_id = {n.attrs.get('id'): n for n in nodes if n.kind == 'element' and n.name == 'input'}
+    inputs = {}
+    for label in (n for n in nodes if n.kind == 'element' and n.name == 'label' and n.attrs.get('for')):
+        target = by_id.get(label.attrs['for'])
+        if target is not None:
+            inputs.setdefault(label.text_content(), target)
+    return inputs
+
+def _blazor_select(circuit, scope, label, value):
+    """Ouvre un MudSelect et clique l'option `value` dans le popover"""
+    selects = [n for n in scope.iter() if n.kind == 'element' and n.has_class('mud-select')
+               and (label is None or any(l.name == 'label' and l.text_content() == label
+                                         for l in n.iter() if l.kind == 'element'))]
+    if not selects:
+        raise BlazorPayloadError(f"Dropdown '{label or 'Gender'}' not found")
+    clickable = [n for n in selects[0].iter() if n.kind == 'element'
+                 and any(e in n.handlers for e in ('click', 'mousedown'))]
+    if not clickable:
+        raise BlazorProtocolError(f"Dropdown '{label or 'Gender'}' is not clickable")
+    circuit.click(clickable[0])
+    circuit.settle(lambda dom: dom.find_all(lambda n: n.has_class('mud-popover-open')), timeout=10)
+    for popover in circuit.dom.find_all(lambda n: n.has_class('mud-popover-open')):
+        for item in (n for n in popover.iter() if n.kind == 'element' and n.has_class('mud-list-item')):
+            if any(p.name == 'p' and p.text_content() == value for p in item.iter() if p.kind == 'element'):
+                circuit.click(item)
+                print(f"✅ {label or 'Gender'} = {value}")
+                return
+    raise BlazorPayloadError(f"Option '{value}' not found in '{label}'")
+
+def resolve_engine(data, options=None):
+    """Moteur retenu: ?engine=, puis "engine" dans le corps, puis CALC_ENGINE"""
+    engine = (options or {}).get('engine') or data.get('engine') or CALC_ENGINE
+    engine = str(engine).lower()
+    if engine not in CALC_ENGINES:
+        raise ValueError(f"Unsupported engine '{engine}' (expected one of: {', '.join(CALC_ENGINES)})")
+    return engine
+
+def calculate_iol_blazor(data):
+    """Même contrat que calculate_iol, sans navigateur (pas de screenshot)"""
+    result = {
+        'success': False,
+        'message': '',
+        'screenshot_saved': False,
+        'screenshot_skipped': True,
+        'share_link': None,
+        'engine': 'blazor'
+    }
+    circuit = None
+    try:
+        print("🔌 Connecting to Blazor hub...")
+        circuit = BlazorCircuit(blazor_transport(), timeout=BLAZOR_TIMEOUT, deadline=current_deadline(),
+                                quiet_ms=BLAZOR_QUIET_MS)
+        circuit.start(CALCULATOR_URL)
+
+        agree = _blazor_button(circuit.dom, "I Agree")
+        if agree is not None:
+            circuit.click(agree)
+
+        # 4e checkbox décochée comme dans le parcours Selenium
+        checkboxes = circuit.dom.find_all(lambda n: n.name == 'input' and n.has_class('mud-checkbox-input'))
+        if len(checkboxes) >= 4 and checkboxes[3].attrs.get('aria-checked') != 'false' and 'change' in checkboxes[3].handlers:
+            circuit.dispatch(checkboxes[3], 'change', {'value': False, 'type': 'change'})
+            circuit.settle()
+
+        _blazor_select(circuit, circuit.dom.root, None, data.get("gender", "Female"))
+
+        top_fields = data.get("top_fields", {})
+        inputs = _blazor_inputs_by_label(circuit.dom, circuit.dom.root)
+        for key, label in TOP_FIELD_LABELS.items():
+            if key in top_fields and label in inputs:
+                circuit.set_value(inputs[label], str(top_fields[key]))
+                print(f"✅ {label}: {top_fields[key]}")
+
+        for eye_key, eye_name in (("right_eye", "OD"), ("left_eye", "OS")):
+            eye = data.get(eye_key) or {}
+            if not eye:
+                continue
+            header = EYE_SECTIONS[eye_name][0]
+            print(f"\n👁️ Configuring {eye_name} over the Blazor hub...")
+            for switch_name, desired in (eye.get("switches") or {}).items():
+                section = _blazor_section(circuit.dom, header)
+                for label in (n for n in section.iter() if n.kind == 'element' and n.name == 'label'):
+                    if any(p.name == 'p' and p.text_content() == switch_name for p in label.iter() if p.kind == 'element'):
+                        switch = next((n for n in label.iter() if n.kind == 'element' and n.has_class('mud-switch-input')), None)
+                        if switch is not None and ('checked' in switch.attrs) != bool(desired):
+                            circuit.dispatch(switch, 'change', {'value': bool(desired), 'type': 'change'})
+                            circuit.settle()
+                        break
+            section = _blazor_section(circuit.dom, header)
+            inputs = _blazor_inputs_by_label(circuit.dom, section)
+            for label, value in eye.items():
+                if label in ("Manufacturer", "Select IOL", "switches"):
+                    continue
+                if label not in inputs:
+                    print(f"⚠️ {eye_name}: field '{label}' not found")
+                    continue
+                circuit.set_value(inputs[label], str(value))
+                print(f"✅ {label}: {value}")
+            for label in ("Manufacturer", "Select IOL"):
+                if eye.get(label):
+                    _blazor_select(circuit, _blazor_section(circuit.dom, header), label, eye[label])
+
+        print("\n🔄 Calculating...")
+        calculate_button = _blazor_button(circuit.dom, "Calculate")
+        if calculate_button is None:
+            raise BlazorProtocolError("Calculate button not found")
+        circuit.click(calculate_button)
+        circuit.settle(lambda dom: _blazor_button(dom, "Print") is not None)
+        print("✅ Results loaded")
+
+        share = _blazor_button(circuit.dom, "Share")
+        onclick = share.attrs.get('onclick') if share is not None else None
+        match = re.search(r"copyToClipboard\s*\(\s*['\"]([^'\"]+)['\"]", onclick or '')
+        if match:
+            result['share_link'] = match.group(1)
+            print(f"🔗 Extracted share link: {result['share_link']}")
+
+        result['results'] = parse_results_html(circuit.dom.to_html(), data)
+        result['success'] = True
+        result['message'] = 'Calculation completed successfully'
+        print("\n✅ Process completed successfully (Blazor engine)!")
+    except Exception as e:
+        print(f"\n❌ Blazor engine error: {e}")
+        result['message'] = str(e)
+        result['error_type'] = type(e).__name__
+        result['upstream_error'] = is_upstream_error(e)
+    finally:
+        if circuit:
+            circuit.close()
+    return result
+
+def calculate_iol(data, screenshot_path="result_screenshot.png", screenshot_options=None):
+    session = None
+    screenshot_options = screenshot_options or {'format': 'png', 'persist': True}
+
+    if resolve_engine(data, screenshot_options) == 'blazor':
+        with phase("blazor_engine"):
+            result = calculate_iol_blazor(data)
+        if result['success'] or not BLAZOR_FALLBACK:
+            return result
+        print(f"↩️ Blazor engine failed ({result['message']}), falling back to Selenium")
 
-def calculate_iol(data, screenshot_path="result_screenshot.png"):
-    driver = None
     result = {
         'success': False,
         'message': '',
@@ -264,212 +2896,112 @@ def calculate_iol(data, screenshot_path="result_screenshot.png"):
         left_eye = data.get("left_eye", {})
         gender = data.get("gender", "Female")
 
-        print("🚀 Starting browser...")
-        driver = web_driver()
-        wait = WebDriverWait(driver, 60)
-
-        print("🔍 Navigating to site...")
-        driver.get("https://iolcalculator.escrs.org/")
+        wait_stats.begin()
+        print("🚀 Borrowing browser from pool...")
+        with phase("driver_start"):
+            session = driver_pool.acquire(timeout=budget(driver_pool.checkout_timeout))
+        driver = session.driver
+        wait = DeadlineWait(driver, 60)
 
-        # Accept conditions
-        print("✅ Accepting conditions...")
-        wait.until(EC.element_to_be_clickable((By.XPATH, "//button[.//span[text()='I Agree']]"))).click()
-        time.sleep(1)
-
-        # Uncheck 4th checkbox if checked
-        try:
-            fourth_checkbox = wait.until(EC.presence_of_element_located((
-                By.XPATH, "(//input[@type='checkbox' and contains(@class, 'mud-checkbox-input')])[4]"
-            )))
-            is_checked = fourth_checkbox.get_attribute("aria-checked")
-            if is_checked != "false":
-                fourth_checkbox.click()
-                print("✅ 4th checkbox unchecked")
-        except Exception as e:
-            print(f"⚠️ Checkbox handling: {e}")
+        prepare_session(session, data, wait)
+        previous_share = get_share_onclick(driver, mark_stale=True) if session.last_share_link else None
 
         # Select gender
-        select_gender(driver, wait, gender_value=gender)
+        with phase("gender"):
+            select_gender(driver, wait, gender_value=gender)
 
         # Fill top fields
         print("\n📝 Filling patient information...")
-        field_mapping = {
-            "surgeon": "Surgeon",
-            "patient_initials": "Patient Initials",
-            "id": "Id",
-            "age": "Age"
-        }
-
-        for key, label in field_mapping.items():
-            if key in top_fields:
-                try:
-                    label_el = wait.until(EC.presence_of_element_located(
-                        (By.XPATH, f"//label[normalize-space(text())='{label}']")
-                    ))
-                    input_id = label_el.get_attribute("for")
-                    input_el = wait.until(EC.presence_of_element_located((By.ID, input_id)))
-                    input_el.clear()
-                    input_el.send_keys(str(top_fields[key]))
-                    print(f"✅ {label}: {top_fields[key]}")
-                except Exception as e:
-                    print(f"❌ Failed to fill {label}: {e}")
+        with phase("top_fields"):
+            for key, label in TOP_FIELD_LABELS.items():
+                if key in top_fields:
+                    try:
+                        label_el = ui.wait_for(wait, "field_label", label=label)
+                        input_id = label_el.get_attribute("for")
+                        input_el = wait.until(EC.presence_of_element_located((By.ID, input_id)))
+                        input_el.clear()
+                        input_el.send_keys(str(top_fields[key]))
+                        print(f"✅ {label}: {top_fields[key]}")
+                    except Exception as e:
+                        print(f"❌ Failed to fill {label}: {e}")
 
         # Process RIGHT EYE
         if right_eye:
-            print("\n👁️ Configuring OD (Right Eye)...")
-            od_section = driver.find_element(By.XPATH, "//h5[contains(text(),'OD Right')]/ancestor::div[contains(@class,'mud-paper')]")
-
-            manufacturer = right_eye.get("Manufacturer", None)
-            select_iol = right_eye.get("Select IOL", None)
-            switches = right_eye.get("switches", None)
-
-            input_fields = right_eye.copy()
-            if "Manufacturer" in input_fields:
-                del input_fields["Manufacturer"]
-            if "Select IOL" in input_fields:
-                del input_fields["Select IOL"]
-            if "switches" in input_fields:
-                del input_fields["switches"]
-
-            # Configure switches FIRST (before filling fields)
-            if switches:
-                configure_switches(od_section, driver, switches, "OD")
-
-            # Fill input fields
-            print(f"📝 Filling {len(input_fields)} fields for OD...")
-            filled_count = 0
-            for el in od_section.find_elements(By.XPATH, ".//input"):
-                try:
-                    input_id = el.get_attribute("id")
-                    input_type = el.get_attribute("type")
-
-                    # Skip checkboxes/radios
-                    if input_type in ["checkbox", "radio"]:
-                        continue
-
-                    label_el = od_section.find_elements(By.XPATH, f".//label[@for='{input_id}']")
-                    if label_el:
-                        label = label_el[0].text.strip()
-                        if label in input_fields:
-                            value = str(input_fields[label])
-                            el.click()
-                            el.send_keys(Keys.CONTROL, "a")
-                            el.send_keys(Keys.BACKSPACE)
-                            if label == "Target Refraction" and value.startswith("-"):
-                                el.send_keys("-")
-                                el.send_keys(value[1:])
-                            else:
-                                el.send_keys(value)
-                            filled_count += 1
-                            print(f"✅ {label}: {value}")
-                except Exception as e:
-                    print(f"⚠️ Error filling field: {e}")
-                    continue
-
-            print(f"📊 Filled {filled_count}/{len(input_fields)} fields for OD")
-
-            if manufacturer:
-                select_dropdown_value(od_section, driver, wait, "Manufacturer", manufacturer)
-            if select_iol:
-                select_dropdown_value(od_section, driver, wait, "Select IOL", select_iol)
+            configure_eye(driver, wait, session, right_eye, "OD")
 
         # Process LEFT EYE
         if left_eye:
-            print("\n👁️ Configuring OS (Left Eye)...")
-            os_section = driver.find_element(By.XPATH, "//h5[contains(text(),'OS Left')]/ancestor::div[contains(@class,'mud-paper')]")
-
-            manufacturer = left_eye.get("Manufacturer", None)
-            select_iol = left_eye.get("Select IOL", None)
-            switches = left_eye.get("switches", None)
-
-            input_fields = left_eye.copy()
-            if "Manufacturer" in input_fields:
-                del input_fields["Manufacturer"]
-            if "Select IOL" in input_fields:
-                del input_fields["Select IOL"]
-            if "switches" in input_fields:
-                del input_fields["switches"]
-
-            # Configure switches FIRST (before filling fields)
-            if switches:
-                configure_switches(os_section, driver, switches, "OS")
-
-            # Fill input fields
-            print(f"📝 Filling {len(input_fields)} fields for OS...")
-            filled_count = 0
-            for el in os_section.find_elements(By.XPATH, ".//input"):
-                try:
-                    input_id = el.get_attribute("id")
-                    input_type = el.get_attribute("type")
-
-                    # Skip checkboxes/radios
-                    if input_type in ["checkbox", "radio"]:
-                        continue
-
-                    label_el = os_section.find_elements(By.XPATH, f".//label[@for='{input_id}']")
-                    if label_el:
-                        label = label_el[0].text.strip()
-                        if label in input_fields:
-                            value = str(input_fields[label])
-                            el.click()
-                            el.send_keys(Keys.CONTROL, "a")
-                            el.send_keys(Keys.BACKSPACE)
-                            if label == "Target Refraction" and value.startswith("-"):
-                                el.send_keys("-")
-                                el.send_keys(value[1:])
-                            else:
-                                el.send_keys(value)
-                            filled_count += 1
-                            print(f"✅ {label}: {value}")
-                except Exception as e:
-                    print(f"⚠️ Error filling field: {e}")
-                    continue
-
-            print(f"📊 Filled {filled_count}/{len(input_fields)} fields for OS")
-
-            if manufacturer:
-                select_dropdown_value(os_section, driver, wait, "Manufacturer", manufacturer)
-            if select_iol:
-                select_dropdown_value(os_section, driver, wait, "Select IOL", select_iol)
+            configure_eye(driver, wait, session, left_eye, "OS")
 
         # CALCULATE
         print("\n🔄 Calculating...")
-        calc_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[.//span[contains(text(),'Calculate')]]")))
-        driver.execute_script("arguments[0].click();", calc_button)
-        print("✅ Calculate button clicked")
+        with phase("calculate"):
+            calc_button = ui.wait_for(wait, "calculate_button", clickable=True)
+            driver.execute_script("arguments[0].click();", calc_button)
+            print("✅ Calculate button clicked")
 
-        # Wait for results
-        try:
-            wait.until(EC.element_to_be_clickable((By.XPATH, "//button[.//span[normalize-space(text())='Print']]")))
-            print("✅ Results loaded")
-        except:
-            print("⚠️ Print button not found, but continuing...")
+            # Wait for results
+            try:
+                ui.wait_for(wait, "print_button", clickable=True)
+                print("✅ Results loaded")
+            except:
+                print("⚠️ Print button not found, but continuing...")
+
+            # Page primed: les résultats du calcul précédent sont encore affichés jusqu'au nouveau rendu
+            if previous_share:
+                try:
+                    DeadlineWait(driver, 10).until(
+                        lambda d: get_share_onclick(d) not in ("stale", previous_share)
+                    )
+                except Exception:
+                    print("⚠️ Share button was not re-rendered after Calculate, continuing...")
 
-        time.sleep(2)
+            wait_for_settled(driver, "results", 2)
 
         # Click Share and get the link
-        share_link = click_share_and_get_link(driver, wait)
+        with phase("share_link"):
+            share_link = click_share_and_get_link(driver, wait)
         if share_link:
             result['share_link'] = share_link
+            session.last_share_link = share_link
 
-        # Take final screenshot
-        print("\n📸 Capturing result...")
-        screenshot_saved = take_fullpage_screenshot(driver, screenshot_path)
+        # Structured results
+        try:
+            with phase("extract_results"):
+                result['results'] = extract_results(driver, data)
+            print(f"📊 Extracted results for {', '.join(result['results']) or 'no eye'}")
+        except Exception as e:
+            print(f"⚠️ Could not extract structured results: {e}")
+            result['results'] = None
+
+        # Take final screenshot (skipped in json-only mode)
+        if screenshot_options.get('capture', True):
+            print("\n📸 Capturing result...")
+            with phase("screenshot"):
+                screenshot_saved = capture_result(driver, screenshot_path, screenshot_options, result)
+        else:
+            print("\n⏭️ JSON-only mode, no screenshot")
+            screenshot_saved = False
+            result['screenshot_skipped'] = True
 
         result['success'] = True
         result['message'] = 'Calculation completed successfully'
         result['screenshot_saved'] = screenshot_saved
 
+        legacy_wait, actual_wait = wait_stats.current()
+        print(f"⏱️ Waited {actual_wait:.1f}s instead of {legacy_wait:.1f}s of fixed delays")
         print("\n✅ Process completed successfully!")
 
     except Exception as e:
         print(f"\n❌ Error: {e}")
         result['success'] = False
         result['message'] = str(e)
+        result['error_type'] = type(e).__name__
+        result['upstream_error'] = is_upstream_error(e)
     finally:
-        if driver:
-            print("\n📚 Closing browser...")
-            driver.quit()
+        if session:
+            print("\n📚 Returning browser to pool...")
+            driver_pool.release(session, reusable=result['success'])
 
     return result
 
@@ -479,10 +3011,622 @@ def calculate_iol(data, screenshot_path="result_screenshot.png"):
 def health_check():
     """Endpoint de santé pour vérifier que l'API fonctionne"""
     return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
+        'status': 'healthy' if circuit_breaker.stats()['state'] == 'closed' else 'degraded',
+        'timestamp': datetime.now().isoformat(),
+        'driver_pool': dict(driver_pool.stats(), mode=DRIVER_MODE),
+        'shared_browser': shared_browser.stats() if DRIVER_MODE == 'contexts' else None,
+        'browser_processes': browser_supervisor.stats(),
+        'jobs': job_manager.stats(),
+        'result_cache': result_cache.stats(),
+        'waits': wait_stats.stats(),
+        'screenshots': screenshot_store.stats(),
+        'admission': admission.stats(),
+        'single_flight': single_flight.stats(),
+        'selectors': ui.summary(),
+        'circuit_breaker': circuit_breaker.stats(),
+        'engine': {'default': CALC_ENGINE, 'blazor_fallback': BLAZOR_FALLBACK},
+        'catalog': lens_catalog.stats()
     })
 
+@app.route('/catalog', methods=['GET'])
+def catalog_listing():
+    """Catalogue extrait du calculateur: fabricants et modèles, champs et switches par oeil"""
+    catalog = lens_catalog.as_dict()
+    if catalog is None:
+        return jsonify({'error': 'Lens catalog not available yet', 'status': lens_catalog.stats()}), 503
+    manufacturer = request.args.get('manufacturer')
+    if manufacturer:
+        if manufacturer not in catalog['manufacturers']:
+            return jsonify({'error': f"Unknown manufacturer '{manufacturer}'",
+                            'suggestions': difflib.get_close_matches(manufacturer, list(catalog['manufacturers']), n=3, cutoff=0.5)}), 404
+        catalog['manufacturers'] = {manufacturer: catalog['manufacturers'][manufacturer]}
+    return jsonify(catalog)
+
+@app.route('/selectors', methods=['GET'])
+def selector_stats():
+    """Statistiques des cibles UI: localisateur préféré, succès/échecs par localisateur"""
+    return jsonify(ui.stats())
+
+@app.route('/trace/<calc_id>', methods=['GET'])
+def get_trace(calc_id):
+    """Arbre de spans d'un calcul récent (durées, allers-retours WebDriver, recherches et attentes)"""
+    trace = trace_buffer.get(calc_id)
+    if trace is None:
+        return jsonify({'error': 'Trace not found (unknown id or evicted from the buffer)'}), 404
+    return jsonify(trace.to_dict())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métriques Prometheus (durées par phase, calculs par endpoint, en cours, navigateurs vivants)"""
+    return Response(generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+# Cache des résultats adressé par le contenu du payload (TTL + éviction LRU)
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "500"))
+# Images non persistées (/calculate) gardées en mémoire pour les hits suivants, dans cette limite
+RESULT_CACHE_MAX_IMAGE_BYTES = int(os.environ.get("RESULT_CACHE_MAX_IMAGE_BYTES", str(256 * 1024 ** 2)))
+
+def canonical_payload(data):
+    """Forme canonique des champs qui influencent le calcul (ordre des clés et types normalisés)"""
+    def normalize(value):
+        if isinstance(value, dict):
+            return {str(k).strip(): normalize(v) for k, v in value.items()}
+        if isinstance(value, bool) or value is None:
+            return value
+        # Toutes les valeurs sont tapées via str() dans le formulaire: 70 et "70" sont équivalents
+        return str(value).strip()
+
+    return {
+        'top_fields': normalize(data.get("top_fields") or {}),
+        'gender': normalize(data.get("gender") or "Female"),
+        'right_eye': normalize(data.get("right_eye") or {}),
+        'left_eye': normalize(data.get("left_eye") or {})
+    }
+
+def payload_key(data):
+    """Empreinte SHA-256 du payload canonique"""
+    canonical = json.dumps(canonical_payload(data), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ResultCache:
+    """
+    Résultats de calcul réussis indexés par empreinte du payload. L'image est sur disque (screenshot
+    persisté), en mémoire (capture non persistée de /calculate) ou absente (output=json, moteur Blazor).
+    """
+
+    def __init__(self, ttl, max_entries, max_image_bytes):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_image_bytes = max_image_bytes
+        self._entries = OrderedDict()
+        self._image_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._image_bytes -= len(entry['image'] or b'')
+
+    def _usable(self, entry, fmt, image, persisted):
+        """L'entrée répond-elle à la requête: image au bon format si demandée, sur disque si elle doit être servie par URL"""
+        if entry['on_disk'] and not screenshot_store.contains(entry['calc_id']):
+            return False
+        if persisted and not entry['on_disk']:
+            return False
+        if image and (entry['result'].get('screenshot_format') != fmt
+                      or not (entry['on_disk'] or entry['image'])):
+            return False
+        return True
+
+    def get(self, key, fmt='png', image=True, persisted=False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry['stored_at'] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None or not self._usable(entry, fmt, image, persisted):
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            result = dict(entry['result'])
+            if entry['image'] and not entry['on_disk']:
+                result['screenshot'] = entry['image']
+            return dict(entry, result=result)
+
+    def put(self, key, calc_id, screenshot_path, result, on_disk):
+        if self.max_entries <= 0:
+            return
+        image = None
+        if not on_disk and result.get('screenshot') and len(result['screenshot']) <= self.max_image_bytes:
+            image = result['screenshot']
+        with self._lock:
+            previous = self._entries.get(key)
+            # Un résultat sans image ne remplace pas une entrée encore valide qui en a une
+            if (previous and not (on_disk or image) and (previous['on_disk'] or previous['image'])
+                    and time.time() - previous['stored_at'] <= self.ttl):
+                return
+            if previous:
+                self._drop(key)
+            self._entries[key] = {
+                'calc_id': calc_id,
+                'screenshot_path': screenshot_path,
+                'result': {k: v for k, v in result.items() if k != 'screenshot'},
+                'image': image,
+                'on_disk': on_disk,
+                'stored_at': time.time()
+            }
+            self._image_bytes += len(image or b'')
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._image_bytes > self.max_image_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'image_bytes': self._image_bytes,
+                'max_image_bytes': self.max_image_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses
+            }
+
+result_cache = ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_IMAGE_BYTES)
+
+# Admission: nombre de calculs simultanés (donc de Chrome actifs) et file d'attente bornée
+MAX_CONCURRENT_CALCULATIONS = int(os.environ.get("MAX_CONCURRENT_CALCULATIONS", str(DRIVER_POOL_MAX)))
+ADMISSION_QUEUE_MAX = int(os.environ.get("ADMISSION_QUEUE_MAX", "10"))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "60"))
+
+class AdmissionRejected(Exception):
+    """Serveur saturé: la requête doit être retentée plus tard"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Limite les calculs simultanés; au-delà, file d'attente bornée puis refus immédiat"""
+
+    def __init__(self, max_concurrent, max_queue, queue_timeout):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._queued = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._waits = deque(maxlen=200)
+        # Durée moyenne d'un calcul (moyenne glissante) pour estimer Retry-After
+        self._avg_duration = 30.0
+        self._cond = threading.Condition()
+
+    def retry_after(self):
+        with self._cond:
+            return self._retry_after()
+
+    def _retry_after(self):
+        rounds = (self._queued + self._in_flight) / self.max_concurrent
+        return max(1, int(round(self._avg_duration * max(rounds, 1))))
+
+    def acquire(self, block=False, timeout=None):
+        """
+        Réserve un créneau de calcul. block=False (requêtes synchrones): refus si la file est pleine
+        ou si l'attente dépasse queue_timeout. block=True (jobs, batch): attend son tour sans limite.
+        `timeout` (échéance de la requête) borne l'attente dans les deux cas.
+        """
+        started = time.monotonic()
+        with self._cond:
+            if self._in_flight >= self.max_concurrent:
+                if not block and self._queued >= self.max_queue:
+                    self._rejected += 1
+                    raise AdmissionRejected(
+                        f"{self._in_flight} calculations running and {self._queued} queued", self._retry_after()
+                    )
+                self._queued += 1
+                try:
+                    limit = None if block else self.queue_timeout
+                    if timeout is not None:
+                        limit = timeout if limit is None else min(limit, timeout)
+                    deadline = None if limit is None else started + limit
+                    while self._in_flight >= self.max_concurrent:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self._rejected += 1
+                            raise AdmissionRejected(
+                                f"No calculation slot after {limit:.0f}s", self._retry_after()
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._queued -= 1
+            self._in_flight += 1
+            self._admitted += 1
+            waited = time.monotonic() - started
+            self._waits.append(waited)
+            return waited
+
+    def release(self, duration=None):
+        with self._cond:
+            self._in_flight -= 1
+            if duration is not None:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'queue_depth': self._queued,
+                'admitted': self._admitted,
+                'rejected': self._rejected,
+                'wait_avg_ms': round(1000 * sum(waits) / len(waits)) if waits else 0,
+                'wait_max_ms': round(1000 * waits[-1]) if waits else 0,
+                'avg_calculation_s': round(self._avg_duration, 1),
+                'retry_after_s': self._retry_after()
+            }
+
+admission = AdmissionController(MAX_CONCURRENT_CALCULATIONS, ADMISSION_QUEUE_MAX, ADMISSION_QUEUE_TIMEOUT)
+
+def saturated_response(error):
+    """429 + Retry-After quand le serveur refuse un calcul"""
+    response = jsonify({'error': 'Server busy', 'message': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+def cache_mode_from_request():
+    """'use', 'refresh' (Cache-Control: no-cache / ?fresh=1) ou 'bypass' (no-store)"""
+    cache_control = request.headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control:
+        return 'bypass'
+    if 'no-cache' in cache_control or request.args.get('fresh') in ('1', 'true'):
+        return 'refresh'
+    return 'use'
+
+def screenshot_options_from_request(persist_default):
+    """Options de capture depuis la query string (?format=png|jpeg|webp&quality=80&persist=1&output=json)"""
+    persist = request.args.get('persist')
+    engine = request.args.get('engine')
+    return {
+        'format': normalize_screenshot_format(request.args.get('format')),
+        'quality': request.args.get('quality', SCREENSHOT_QUALITY, type=int),
+        'persist': persist_default if persist is None else persist in ('1', 'true'),
+        # output=json: résultats structurés seulement, pas de screenshot
+        'capture': request.args.get('output') != 'json',
+        # ?engine=selenium|blazor (sinon "engine" du corps, puis CALC_ENGINE)
+        'engine': resolve_engine({}, {'engine': engine}) if engine else None,
+        # Échéance en secondes (X-Request-Deadline ou ?deadline=, sinon "deadline" du corps)
+        'deadline': next((v for v in (request.headers.get('X-Request-Deadline'), request.args.get('deadline'))
+                          if v is not None), None)
+    }
+
+# Disjoncteur: après une série d'échecs côté site ESCRS, les nouveaux calculs sont refusés immédiatement
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get("CIRCUIT_HALF_OPEN_PROBES", "1"))
+# Erreurs qui signalent un site lent ou indisponible (pas une erreur du payload)
+# (ConnectionError couvre ConnectionRefusedError, ConnectionResetError...; socket.timeout == TimeoutError)
+UPSTREAM_ERRORS = (TimeoutException, WebDriverException, DeadlineExceeded, BlazorProtocolError,
+                   ConnectionError, socket.timeout, socket.gaierror, URLError)
+# Sous-classes de WebDriverException levées quand un élément demandé par le payload est introuvable
+# (Manufacturer / IOL mal orthographiés): pas un signe de panne du site
+ELEMENT_LOOKUP_ERRORS = (NoSuchElementException, StaleElementReferenceException,
+                         ElementClickInterceptedException, ElementNotInteractableException)
+
+def is_upstream_error(error):
+    """True si l'erreur met en cause le site du calculateur (et doit compter pour le disjoncteur)"""
+    return isinstance(error, UPSTREAM_ERRORS) and not isinstance(error, ELEMENT_LOOKUP_ERRORS)
+
+class CircuitOpen(Exception):
+    """Disjoncteur ouvert: le site du calculateur est considéré indisponible"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """closed -> open après `failure_threshold` échecs consécutifs; half-open laisse passer des sondes"""
+
+    def __init__(self, failure_threshold, open_seconds, half_open_probes):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = None
+        self._probes = 0
+        self._trips = 0
+        self._rejected = 0
+        self._last_error = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        if self._state == 'open' and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = 'half_open'
+            self._probes = 0
+            print("🟡 Circuit half-open: probing the calculator site")
+
+    def _retry_after(self):
+        if self._state != 'open':
+            return max(1, int(self.open_seconds / 2))
+        return max(1, int(self.open_seconds - (time.monotonic() - self._opened_at)))
+
+    def allow(self):
+        """Retourne True si l'appel est une sonde; lève CircuitOpen si le calcul doit être refusé"""
+        with self._lock:
+            self._refresh()
+            if self._state == 'closed':
+                return False
+            if self._state == 'half_open' and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self._rejected += 1
+            raise CircuitOpen(
+                f"Calculator site unavailable ({self._last_error or 'repeated failures'}), circuit {self._state}",
+                self._retry_after()
+            )
+
+    def record(self, probe, success, error_type=None, upstream=False):
+        """Enregistre l'issue d'un calcul; seules les erreurs amont (upstream) comptent comme échec"""
+        upstream_failure = not success and upstream
+        with self._lock:
+            if probe:
+                self._probes = max(0, self._probes - 1)
+            if upstream_failure:
+                self._failures += 1
+                self._last_error = error_type
+                if probe or self._failures >= self.failure_threshold:
+                    if self._state != 'open':
+                        self._trips += 1
+                        print(f"🔴 Circuit open after {self._failures} upstream failure(s) ({error_type})")
+                    self._state = 'open'
+                    self._opened_at = time.monotonic()
+            elif success:
+                if self._state != 'closed':
+                    print("🟢 Circuit closed: calculator site recovered")
+                self._state = 'closed'
+                self._failures = 0
+                self._last_error = None
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'open_seconds': self.open_seconds,
+                'retry_after_s': self._retry_after() if self._state == 'open' else None,
+                'last_error': self._last_error,
+                'trips': self._trips,
+                'rejected': self._rejected
+            }
+
+circuit_breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_OPEN_SECONDS, CIRCUIT_HALF_OPEN_PROBES)
+
+def unavailable_response(error):
+    """503 + Retry-After quand le disjoncteur est ouvert"""
+    response = jsonify({'error': 'Calculator unavailable', 'message': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def failure_status(result):
+    """Code HTTP d'un calcul en échec: 504 si l'échéance est dépassée, sinon 500"""
+    return 504 if result.get('error_type') == 'DeadlineExceeded' else 500
+
+# Single-flight: les requêtes identiques simultanées partagent une seule exécution de calculate_iol
+SINGLEFLIGHT_MAX_WAIT = float(os.environ.get("SINGLEFLIGHT_MAX_WAIT", "300"))
+
+class SingleFlightTimeout(Exception):
+    """Le calcul partagé n'a pas fini dans le délai accordé aux requêtes en attente"""
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.followers = 0
+
+class SingleFlight:
+    """Regroupe les appels concurrents de même clé: le premier calcule, les suivants attendent son résultat"""
+
+    def __init__(self, max_wait):
+        self.max_wait = max_wait
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._coalesced = 0
+        self._timeouts = 0
+        self._retried = 0
+
+    def do(self, key, fn, max_wait=None, shareable=None):
+        """
+        Retourne (valeur, partagée). Seule une valeur acceptée par `shareable` est partagée: si le premier
+        appel a levé une exception (admission refusée, échéance dépassée...) ou rendu une valeur non
+        partageable, chaque requête en attente relance `fn` avec sa propre admission et sa propre échéance.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.followers += 1
+                self._coalesced += 1
+
+        if leader:
+            try:
+                flight.value = fn()
+                return flight.value, False
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        print(f"🔗 Joining in-flight calculation for payload {key[0][:12]}")
+        if not flight.done.wait(max_wait):
+            with self._lock:
+                self._timeouts += 1
+            raise SingleFlightTimeout(f"Identical calculation still running after {max_wait:.0f}s")
+        if flight.error is not None or (shareable is not None and not shareable(flight.value)):
+            with self._lock:
+                self._retried += 1
+            reason = type(flight.error).__name__ if flight.error is not None else 'unsuccessful'
+            print(f"🔁 Shared calculation failed ({reason}), running it again for this request")
+            return fn(), False
+        return flight.value, True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'waiting_followers': sum(f.followers for f in self._flights.values()),
+                'coalesced': self._coalesced,
+                'follower_timeouts': self._timeouts,
+                'follower_retries': self._retried,
+                'max_wait_seconds': self.max_wait
+            }
+
+single_flight = SingleFlight(SINGLEFLIGHT_MAX_WAIT)
+
+def cache_status(result):
+    """Valeur du header X-Cache"""
+    if result.get('cached'):
+        return 'HIT'
+    return 'COALESCED' if result.get('coalesced') else 'MISS'
+
+def run_calculation(data, cache_mode='use', screenshot_options=None, block=False):
+    """
+    Exécute un calcul complet (ou le sert depuis le cache); retourne (calc_id, screenshot_path, result).
+    Un calcul identique déjà en cours est partagé (single-flight); sinon il passe par le disjoncteur et
+    le contrôle d'admission (voir AdmissionController.acquire). Tout le calcul respecte l'échéance de la requête.
+    """
+    screenshot_options = screenshot_options or {'format': normalize_screenshot_format(None), 'persist': True}
+    with deadline_scope(resolve_deadline(data, screenshot_options)):
+        return run_calculation_within_deadline(data, cache_mode, screenshot_options, block)
+
+def run_calculation_within_deadline(data, cache_mode, screenshot_options, block):
+    fmt = screenshot_options['format']
+    key = payload_key(data)
+    if cache_mode == 'use':
+        # Le moteur Blazor ne produit pas d'image: son résultat suffit à une requête Blazor
+        image = screenshot_options.get('capture', True) and resolve_engine(data, screenshot_options) != 'blazor'
+        entry = result_cache.get(key, fmt, image=image, persisted=image and bool(screenshot_options.get('persist')))
+        if entry:
+            print(f"⚡ Cache hit for payload {key[:12]}: {entry['calc_id']}")
+            return entry['calc_id'], entry['screenshot_path'], dict(entry['result'], cached=True)
+
+    # no-cache / no-store demandent un vrai calcul: pas de partage avec un calcul identique déjà en cours
+    if cache_mode != 'use':
+        return execute_calculation(data, key, cache_mode, screenshot_options, block)
+
+    # Seules les requêtes qui attendent la même sortie (format, image, fichier persisté, moteur) sont regroupées
+    flight_key = (
+        key, fmt, screenshot_options.get('capture', True), bool(screenshot_options.get('persist')),
+        resolve_engine(data, screenshot_options)
+    )
+    (calc_id, screenshot_path, result), shared = single_flight.do(
+        flight_key, lambda: execute_calculation(data, key, cache_mode, screenshot_options, block),
+        max_wait=budget(single_flight.max_wait),
+        # Un échec du premier appel peut tenir à son admission (block) ou à son échéance: on ne partage que le succès
+        shareable=lambda value: value[2]['success']
+    )
+    if shared:
+        result = dict(result, coalesced=True)
+    return calc_id, screenshot_path, result
+
+def execute_calculation(data, key, cache_mode, screenshot_options, block):
+    """Lance réellement calculate_iol (admission, trace, enregistrement du screenshot et mise en cache)"""
+    fmt = screenshot_options['format']
+
+    # Générer un nom unique pour le screenshot
+    calc_id = str(uuid.uuid4())
+    screenshot_filename = f"{calc_id}.{SCREENSHOT_EXTENSIONS[fmt]}"
+    screenshot_path = os.path.join(SCREENSHOTS_DIR, screenshot_filename)
+
+    print(f"\n{'='*60}")
+    print(f"📋 New calculation request: {calc_id}")
+    print(f"📊 Data: {data}")
+    print(f"{'='*60}\n")
+
+    # Exécuter le calcul
+    probe = circuit_breaker.allow()
+    result = None
+    try:
+        with tracing(calc_id):
+            with span("admission"):
+                waited = admission.acquire(block, timeout=budget(CALCULATION_DEADLINE_MAX))
+            if waited >= 1:
+                print(f"⏳ Waited {waited:.1f}s for a calculation slot")
+            started = time.monotonic()
+            try:
+                with CALCULATIONS_IN_FLIGHT.track_inprogress():
+                    result = calculate_iol(data, screenshot_path, screenshot_options)
+            finally:
+                admission.release(time.monotonic() - started)
+    finally:
+        # Une requête refusée par l'admission, ou dont le client a raccourci l'échéance, ne dit rien de l'état du site
+        error_type = result.get('error_type') if result else None
+        upstream = bool(result and result.get('upstream_error'))
+        if error_type == 'DeadlineExceeded' and current_deadline().seconds < CALCULATION_DEADLINE:
+            upstream = False
+        circuit_breaker.record(probe, bool(result and result['success']), error_type, upstream)
+    result['cached'] = False
+    screenshot_path = result.get('screenshot_path', screenshot_path)
+    if result['success']:
+        on_disk = os.path.exists(screenshot_path)
+        if on_disk:
+            screenshot_store.register(calc_id, screenshot_path, result.get('screenshot_format', 'png'), result.get('screenshot_regions'))
+        if cache_mode != 'bypass':
+            result_cache.put(key, calc_id, screenshot_path, result, on_disk)
+    return calc_id, screenshot_path, result
+
+def calculation_payload(calc_id, screenshot_path, result):
+    """Corps JSON d'un résultat de calcul (partagé par /calculate-json et /jobs)"""
+    has_screenshot = os.path.exists(screenshot_path)
+    if result['success'] and (has_screenshot or result.get('screenshot_skipped')):
+        return {
+            'success': True,
+            'calculation_id': calc_id,
+            'screenshot_url': f'/screenshot/{calc_id}' if has_screenshot else None,
+            'share_link': result.get('share_link', None),
+            'results': result.get('results'),
+            'engine': result.get('engine', 'selenium'),
+            'message': result.get('message', 'Calculation completed'),
+            'cached': result.get('cached', False),
+            'coalesced': result.get('coalesced', False),
+            'timestamp': datetime.now().isoformat()
+        }
+    return {
+        'success': False,
+        'error': 'Calculation failed',
+        'message': result.get('message', 'Unknown error'),
+        'calculation_id': calc_id,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def bad_request_response(e):
+    """400 d'une requête invalide; le détail et les suggestions du catalogue s'il s'agit d'un payload refusé"""
+    body = {'error': str(e)}
+    if isinstance(e, InvalidPayload):
+        body['details'] = e.errors
+    return jsonify(body), 400
+
+def add_server_timing(response, calc_id, result):
+    """Header Server-Timing de la trace du calcul (absent pour un résultat servi par le cache)"""
+    trace = None if result.get('cached') else trace_buffer.get(calc_id)
+    if trace is not None:
+        response.headers['Server-Timing'] = trace.server_timing()
+        response.headers['X-Trace-Url'] = f'/trace/{calc_id}'
+
 @app.route('/calculate', methods=['POST'])
 def calculate():
     """Endpoint principal pour lancer un calcul IOL et récupérer le screenshot avec le share_link dans les headers"""
@@ -491,32 +3635,54 @@ def calculate():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
 
-        # Générer un nom unique pour le screenshot
-        calc_id = str(uuid.uuid4())
-        screenshot_filename = f"{calc_id}.png"
-        screenshot_path = os.path.join(SCREENSHOTS_DIR, screenshot_filename)
-
-        print(f"\n{'='*60}")
-        print(f"📋 New calculation request: {calc_id}")
-        print(f"📊 Data: {data}")
-        print(f"{'='*60}\n")
-
-        # Exécuter le calcul
-        result = calculate_iol(data, screenshot_path)
-
-        if result['success'] and os.path.exists(screenshot_path):
-            # Retourner le screenshot avec le share_link dans les headers HTTP
-            response = send_file(
-                screenshot_path,
-                mimetype='image/png',
-                as_attachment=True,
-                download_name=f'iol_calculation_{calc_id}.png'
-            )
+        try:
+            # L'image part directement dans la réponse; ?persist=1 la garde aussi sur disque
+            screenshot_options = screenshot_options_from_request(persist_default=False)
+            screenshot_options['capture'] = True
+            # Le moteur Blazor ne produit pas d'image
+            if (screenshot_options['engine'] or data.get('engine')) and resolve_engine(data, screenshot_options) == 'blazor':
+                return jsonify({'error': "The blazor engine does not produce screenshots, use /calculate-json"}), 400
+            screenshot_options['engine'] = 'selenium'
+            resolve_deadline(data, screenshot_options)
+            lens_catalog.validate(data)
+        except ValueError as e:
+            return bad_request_response(e)
+
+        try:
+            calc_id, screenshot_path, result = run_calculation(data, cache_mode_from_request(), screenshot_options)
+        except AdmissionRejected as e:
+            record_calculation('calculate', error=e)
+            return saturated_response(e)
+        except SingleFlightTimeout as e:
+            record_calculation('calculate', error=e)
+            return jsonify({'error': 'Calculation timed out', 'message': str(e)}), 504
+        except CircuitOpen as e:
+            record_calculation('calculate', error=e)
+            return unavailable_response(e)
+        record_calculation('calculate', result)
+
+        if result['success'] and (result.get('screenshot') or os.path.exists(screenshot_path)):
+            fmt = result.get('screenshot_format', 'png')
+            download_name = f'iol_calculation_{calc_id}.{SCREENSHOT_EXTENSIONS[fmt]}'
+            if result.get('screenshot'):
+                # Retourner les octets capturés sans relire le fichier
+                response = Response(result['screenshot'], mimetype=SCREENSHOT_MIMETYPES[fmt])
+                response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+            else:
+                # Résultat servi depuis le cache: l'image est sur disque
+                response = send_file(
+                    screenshot_path,
+                    mimetype=SCREENSHOT_MIMETYPES[fmt],
+                    as_attachment=True,
+                    download_name=download_name
+                )
 
             # Ajouter le share_link dans les headers de la réponse
             if result.get('share_link'):
                 response.headers['X-Share-Link'] = result.get('share_link')
             response.headers['X-Calculation-Id'] = calc_id
+            response.headers['X-Cache'] = cache_status(result)
+            add_server_timing(response, calc_id, result)
 
             return response
         else:
@@ -524,9 +3690,10 @@ def calculate():
                 'error': 'Calculation failed',
                 'message': result.get('message', 'Unknown error'),
                 'calculation_id': calc_id
-            }), 500
+            }), failure_status(result)
 
     except Exception as e:
+        record_calculation('calculate', error=e)
         return jsonify({
             'error': str(e),
             'traceback': traceback.format_exc()
@@ -540,38 +3707,36 @@ def calculate_json():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
 
-        # Générer un nom unique pour le screenshot
-        calc_id = str(uuid.uuid4())
-        screenshot_filename = f"{calc_id}.png"
-        screenshot_path = os.path.join(SCREENSHOTS_DIR, screenshot_filename)
-
-        print(f"\n{'='*60}")
-        print(f"📋 New calculation request: {calc_id}")
-        print(f"📊 Data: {data}")
-        print(f"{'='*60}\n")
-
-        # Exécuter le calcul
-        result = calculate_iol(data, screenshot_path)
+        try:
+            screenshot_options = screenshot_options_from_request(persist_default=True)
+            resolve_engine(data, screenshot_options)
+            resolve_deadline(data, screenshot_options)
+            lens_catalog.validate(data)
+        except ValueError as e:
+            return bad_request_response(e)
+        # screenshot_url doit rester servable: toujours persisté
+        screenshot_options['persist'] = True
 
-        if result['success'] and os.path.exists(screenshot_path):
-            return jsonify({
-                'success': True,
-                'calculation_id': calc_id,
-                'screenshot_url': f'/screenshot/{calc_id}',
-                'share_link': result.get('share_link', None),
-                'message': result.get('message', 'Calculation completed'),
-                'timestamp': datetime.now().isoformat()
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Calculation failed',
-                'message': result.get('message', 'Unknown error'),
-                'calculation_id': calc_id,
-                'timestamp': datetime.now().isoformat()
-            }), 500
+        try:
+            calc_id, screenshot_path, result = run_calculation(data, cache_mode_from_request(), screenshot_options)
+        except AdmissionRejected as e:
+            record_calculation('calculate_json', error=e)
+            return saturated_response(e)
+        except SingleFlightTimeout as e:
+            record_calculation('calculate_json', error=e)
+            return jsonify({'error': 'Calculation timed out', 'message': str(e)}), 504
+        except CircuitOpen as e:
+            record_calculation('calculate_json', error=e)
+            return unavailable_response(e)
+        record_calculation('calculate_json', result)
+        payload = calculation_payload(calc_id, screenshot_path, result)
+        response = jsonify(payload)
+        response.headers['X-Cache'] = cache_status(result)
+        add_server_timing(response, calc_id, result)
+        return response, 200 if payload['success'] else failure_status(result)
 
     except Exception as e:
+        record_calculation('calculate_json', error=e)
         return jsonify({
             'success': False,
             'error': str(e),
@@ -579,19 +3744,346 @@ def calculate_json():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+# Batch: plusieurs calculs en parallèle, résultats streamés en NDJSON au fil de l'eau
+BATCH_PARALLELISM = int(os.environ.get("BATCH_PARALLELISM", str(DRIVER_POOL_MAX)))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "200"))
+
+def run_batch_item(index, data, cache_mode='use', screenshot_options=None):
+    """Calcule un élément du batch; une erreur n'interrompt pas les autres"""
+    try:
+        if not isinstance(data, dict) or not data:
+            raise ValueError('Each batch item must be a non-empty object')
+        lens_catalog.validate(data)
+        calc_id, screenshot_path, result = run_calculation(data, cache_mode, screenshot_options, block=True)
+        record_calculation('calculate_batch', result)
+        payload = calculation_payload(calc_id, screenshot_path, result)
+    except Exception as e:
+        record_calculation('calculate_batch', error=e)
+        payload = {
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }
+        if isinstance(e, InvalidPayload):
+            payload['details'] = e.errors
+    return {'index': index, **payload}
+
+@app.route('/calculate-batch', methods=['POST'])
+def calculate_batch():
+    """Lance une liste de calculs en parallèle et streame chaque résultat (NDJSON) dès qu'il est prêt"""
+    data = request.json
+    parallelism = request.args.get('parallelism', type=int)
+    if isinstance(data, dict):
+        parallelism = data.get('parallelism', parallelism)
+        data = data.get('items')
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'Expected a non-empty list of calculations (or {"items": [...]})'}), 400
+    if len(data) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Batch too large: {len(data)} items (max {BATCH_MAX_ITEMS})'}), 400
+
+    # Le parallélisme demandé est plafonné par la configuration du serveur
+    try:
+        parallelism = int(parallelism or BATCH_PARALLELISM)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'parallelism must be an integer'}), 400
+    parallelism = max(1, min(parallelism, BATCH_PARALLELISM, len(data)))
+
+    cache_mode = cache_mode_from_request()
+    try:
+        screenshot_options = dict(screenshot_options_from_request(persist_default=True), persist=True)
+        resolve_deadline({}, screenshot_options)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    print(f"\n📦 Batch of {len(data)} calculations (parallelism {parallelism})")
+
+    def generate():
+        executor = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="iol-batch")
+        succeeded = 0
+        try:
+            futures = [executor.submit(run_batch_item, i, item, cache_mode, screenshot_options) for i, item in enumerate(data)]
+            for future in as_completed(futures):
+                item_result = future.result()
+                if item_result['success']:
+                    succeeded += 1
+                yield json.dumps(item_result) + "\n"
+            yield json.dumps({
+                'done': True,
+                'total': len(data),
+                'succeeded': succeeded,
+                'failed': len(data) - succeeded
+            }) + "\n"
+        finally:
+            # Client déconnecté: on annule ce qui n'a pas encore démarré
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+# Jobs asynchrones: POST /jobs rend la main immédiatement, un pool de workers exécute calculate_iol
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", str(DRIVER_POOL_MAX)))
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", "50"))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", "3600"))
+JOB_LONG_POLL_MAX = float(os.environ.get("JOB_LONG_POLL_MAX", "60"))
+JOB_CALLBACK_TIMEOUT = float(os.environ.get("JOB_CALLBACK_TIMEOUT", "10"))
+# Hôtes autorisés pour callback_url, séparés par des virgules (".example.com" couvre les sous-domaines).
+# Vide: webhooks désactivés. Les adresses loopback, link-local (metadata cloud) et réservées sont toujours refusées.
+JOB_CALLBACK_ALLOWED_HOSTS = [h.strip().lower() for h in os.environ.get("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",")
+                              if h.strip()]
+
+def check_callback_url(url):
+    """ValueError si le webhook n'est pas autorisé (hôte hors liste, ou résolu vers une adresse interne)"""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    if not JOB_CALLBACK_ALLOWED_HOSTS:
+        raise ValueError("Job callbacks are disabled (JOB_CALLBACK_ALLOWED_HOSTS is empty)")
+    host = parts.hostname.lower()
+    if not any(host == allowed or (allowed.startswith('.') and host.endswith(allowed))
+               for allowed in JOB_CALLBACK_ALLOWED_HOSTS):
+        raise ValueError(f"callback_url host '{host}' is not allowed")
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, ValueError) as e:
+        raise ValueError(f"callback_url host '{host}' cannot be resolved: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if ip.is_loopback or ip.is_link_local or ip.is_multicast or ip.is_reserved or ip.is_unspecified:
+            raise ValueError(f"callback_url host '{host}' resolves to a forbidden address ({ip})")
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Un webhook ne suit pas les redirections (elles contourneraient la liste d'hôtes)"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+callback_opener = urllib.request.build_opener(_NoRedirect)
+
+class JobQueueFull(Exception):
+    """Trop de jobs en attente"""
+
+class Job:
+    """Un calcul soumis via /jobs"""
+
+    def __init__(self, data, callback_url=None, cache_mode='use', screenshot_options=None):
+        self.job_id = str(uuid.uuid4())
+        self.data = data
+        self.callback_url = callback_url
+        self.cache_mode = cache_mode
+        self.screenshot_options = screenshot_options
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        def iso(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'created_at': iso(self.created_at),
+            'started_at': iso(self.started_at),
+            'finished_at': iso(self.finished_at),
+            'result': self.result
+        }
+
+class JobManager:
+    """File bornée de jobs exécutés par un pool de workers"""
+
+    def __init__(self, workers, max_pending, ttl):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="iol-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _purge(self):
+        # Oublier les jobs terminés depuis plus de ttl secondes
+        limit = time.time() - self.ttl
+        for job_id in [j.job_id for j in self._jobs.values() if j.finished_at and j.finished_at < limit]:
+            del self._jobs[job_id]
+
+    def _pending(self):
+        return sum(1 for j in self._jobs.values() if j.status in ('queued', 'running'))
+
+    def submit(self, data, callback_url=None, cache_mode='use', screenshot_options=None):
+        with self._lock:
+            self._purge()
+            if self._pending() >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} jobs already pending")
+            job = Job(data, callback_url, cache_mode, screenshot_options)
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id, wait=0):
+        """Retourne le job; attend jusqu'à `wait` secondes s'il n'est pas terminé (long-polling)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job and wait > 0:
+            job.done.wait(min(wait, JOB_LONG_POLL_MAX))
+        return job
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            calc_id, screenshot_path, result = run_calculation(job.data, job.cache_mode, job.screenshot_options, block=True)
+            record_calculation('jobs', result)
+            job.result = calculation_payload(calc_id, screenshot_path, result)
+        except Exception as e:
+            record_calculation('jobs', error=e)
+            traceback.print_exc()
+            job.result = {
+                'success': False,
+                'error': str(e),
+                'timestamp': datetime.now().isoformat()
+            }
+        job.status = 'succeeded' if job.result['success'] else 'failed'
+        job.finished_at = time.time()
+        job.done.set()
+        print(f"📬 Job {job.job_id} {job.status}")
+
+        if job.callback_url:
+            self._notify(job)
+
+    def _notify(self, job):
+        """POST du job terminé vers le webhook du client"""
+        try:
+            # Revérifié à l'envoi: l'enregistrement DNS a pu changer depuis la soumission
+            check_callback_url(job.callback_url)
+            body = json.dumps(job.to_dict()).encode('utf-8')
+            req = urllib.request.Request(
+                job.callback_url,
+                data=body,
+                headers={'Content-Type': 'application/json'},
+                method='POST'
+            )
+            with callback_opener.open(req, timeout=JOB_CALLBACK_TIMEOUT) as resp:
+                print(f"📨 Callback for job {job.job_id}: HTTP {resp.status}")
+        except Exception as e:
+            print(f"⚠️ Callback for job {job.job_id} failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'queued': statuses.count('queued'),
+            'running': statuses.count('running'),
+            'tracked': len(statuses)
+        }
+
+job_manager = JobManager(JOB_WORKERS, JOB_QUEUE_MAX, JOB_TTL_SECONDS)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Soumet un calcul asynchrone et retourne immédiatement son job_id"""
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    data = dict(data)
+    callback_url = data.pop('callback_url', None) or request.headers.get('X-Callback-Url')
+
+    try:
+        if callback_url:
+            check_callback_url(callback_url)
+        screenshot_options = dict(screenshot_options_from_request(persist_default=True), persist=True)
+        resolve_engine(data, screenshot_options)
+        resolve_deadline(data, screenshot_options)
+        lens_catalog.validate(data)
+    except ValueError as e:
+        return bad_request_response(e)
+
+    try:
+        job = job_manager.submit(data, callback_url, cache_mode_from_request(), screenshot_options)
+    except JobQueueFull as e:
+        response = jsonify({'error': 'Job queue full', 'message': str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+
+    response = jsonify({
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': f'/jobs/{job.job_id}'
+    })
+    response.headers['Location'] = f'/jobs/{job.job_id}'
+    return response, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Statut et résultat d'un job (?wait=<secondes> pour du long-polling)"""
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+
+    job = job_manager.get(job_id, wait=wait)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/screenshot/<calc_id>', methods=['GET'])
 def get_screenshot(calc_id):
-    """Récupérer un screenshot par son ID"""
-    screenshot_path = os.path.join(SCREENSHOTS_DIR, f"{calc_id}.png")
+    """
+    Récupérer un screenshot par son ID, ou une variante (?w= largeur en pixels, ?region=od|os).
+    ETag fort, If-None-Match / If-Modified-Since (304) et Range sont gérés par send_file.
+    """
+    region = request.args.get('region')
+    if region is not None:
+        region = region.lower()
+        if region not in SCREENSHOT_REGIONS:
+            return jsonify({'error': f"Invalid region '{region}' (od or os)"}), 400
+    width = request.args.get('w')
+    if width is not None:
+        try:
+            width = int(width)
+        except ValueError:
+            return jsonify({'error': 'w must be an integer number of pixels'}), 400
+        if not 16 <= width <= SCREENSHOT_VARIANT_MAX_WIDTH:
+            return jsonify({'error': f'w must be between 16 and {SCREENSHOT_VARIANT_MAX_WIDTH}'}), 400
 
-    if not os.path.exists(screenshot_path):
+    try:
+        if region or width:
+            entry = screenshot_store.variant(calc_id, width=width, region=region)
+        else:
+            entry = screenshot_store.original(calc_id)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except FileNotFoundError:
+        entry = None
+
+    if not entry:
         return jsonify({'error': 'Screenshot not found'}), 404
 
-    return send_file(
-        screenshot_path,
-        mimetype='image/png',
-        as_attachment=False
-    )
+    try:
+        response = send_file(
+            screenshot_store.path_for(entry),
+            mimetype=SCREENSHOT_MIMETYPES[entry['format']],
+            as_attachment=False,
+            conditional=True,
+            etag=entry['etag'],
+            max_age=SCREENSHOT_CACHE_MAX_AGE
+        )
+    except FileNotFoundError:
+        # Supprimé par le nettoyeur entre la recherche et l'envoi
+        return jsonify({'error': 'Screenshot not found'}), 404
+    response.cache_control.immutable = True
+    return response
+
+def start_background_services():
+    """Démarre le pool Chrome et le nettoyage des screenshots (serveur de dev ou worker gunicorn)"""
+    driver_pool.start()
+    browser_supervisor.start()
+    screenshot_store.start()
+    lens_catalog.start()
 
 if __name__ == '__main__':
+    # Développement uniquement: en production le conteneur lance gunicorn (gunicorn.conf.py)
+    start_background_services()
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,301 @@
+"""
+Site de substitution du calculateur ESCRS pour les benchmarks hors ligne.
+
+Reproduit la structure DOM dont app.py dépend (bouton "I Agree", checkboxes, popovers mud-select,
+switches mud-switch, sections mud-paper "OD Right" / "OS Left", boutons Calculate / Print / Share avec
+copyToClipboard dans onclick) avec des latences artificielles qui imitent les allers-retours Blazor Server.
+
+    python bench/fixture_site.py --port 8765 --event-ms 40 --calculate-ms 800
+    CALCULATOR_URL=http://localhost:8765/ python app.py
+
+Les latences peuvent aussi être passées dans l'URL du calculateur (?event_ms=100&calculate_ms=2000).
+"""
+from flask import Flask, Response, request
+import argparse
+import json
+import os
+import time
+
+# Latences par défaut (ms), surchargées par les options de la ligne de commande ou la query string
+LATENCIES = {
+    # Réponse HTTP de la page
+    'page_ms': int(os.environ.get("FIXTURE_PAGE_MS", "150")),
+    # Chargement du script (blazor.server.js)
+    'asset_ms': int(os.environ.get("FIXTURE_ASSET_MS", "100")),
+    # Démarrage du circuit avant l'affichage des conditions
+    'boot_ms': int(os.environ.get("FIXTURE_BOOT_MS", "300")),
+    # Aller-retour serveur d'un événement (click, change, input)
+    'event_ms': int(os.environ.get("FIXTURE_EVENT_MS", "40")),
+    # Calcul des formules après Calculate
+    'calculate_ms': int(os.environ.get("FIXTURE_CALCULATE_MS", "800"))
+}
+
+LENSES = {
+    "Alcon": ["SN60WF", "SA60AT", "AcrySof IQ Vivity"],
+    "Johnson & Johnson": ["Tecnis ZCB00", "Tecnis Eyhance ICB00"],
+    "Zeiss": ["CT Asphina 409M", "AT Lisa tri 839MP"]
+}
+FORMULAS = ["Barrett Universal II", "Cooke K6", "EVO 2.0", "Hill-RBF 3.0", "Hoffer QST", "Kane", "Pearl-DGS"]
+EYE_FIELDS = ["AL", "ACD", "LT", "CCT", "WTW", "K1", "K2", "Target Refraction"]
+TORIC_FIELDS = ["K1 Axis", "K2 Axis", "SIA", "Incision"]
+
+app = Flask(__name__)
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>ESCRS IOL Calculator (benchmark fixture)</title>
+<style>
+body { font-family: sans-serif; margin: 0; padding: 16px; }
+.mud-paper { border: 1px solid #ccc; border-radius: 4px; padding: 12px; margin: 12px 0; }
+.mud-input-control { display: inline-block; margin: 4px 12px 4px 0; }
+.mud-input-control label { display: block; font-size: 12px; }
+.mud-select { display: inline-block; min-width: 180px; cursor: pointer; }
+.mud-popover { position: absolute; background: #fff; border: 1px solid #999; z-index: 10; }
+.mud-list-item { padding: 4px 12px; cursor: pointer; }
+.mud-switch { display: inline-flex; align-items: center; margin-right: 16px; }
+table { border-collapse: collapse; margin-top: 8px; }
+td, th { border: 1px solid #ddd; padding: 4px 8px; }
+</style>
+</head>
+<body>
+<div id="app"></div>
+<script>window.FIXTURE = __CONFIG__;</script>
+<script src="__ASSET__"></script>
+</body>
+</html>
+"""
+
+# Le "rendu" est fait côté client; chaque interaction attend event_ms avant de modifier le DOM, comme un
+# aller-retour SignalR suivi d'un RenderBatch
+SCRIPT = r"""
+(function () {
+const cfg = window.FIXTURE;
+const app = document.getElementById('app');
+let uid = 0;
+const nextId = (prefix) => prefix + '-' + (++uid);
+const later = (ms, fn) => setTimeout(fn, ms);
+const roundTrip = (fn) => later(cfg.event_ms, fn);
+const el = (tag, attrs, children) => {
+    const node = document.createElement(tag);
+    Object.entries(attrs || {}).forEach(([k, v]) => node.setAttribute(k, v));
+    (children || []).forEach(c => node.appendChild(typeof c === 'string' ? document.createTextNode(c) : c));
+    return node;
+};
+const button = (text, onclick) => {
+    const b = el('button', {type: 'button', class: 'mud-button-root mud-button mud-button-filled'},
+                 [el('span', {class: 'mud-button-label'}, [text])]);
+    if (onclick) b.addEventListener('click', onclick);
+    return b;
+};
+
+window.copyToClipboard = function (text) {
+    try { navigator.clipboard.writeText(text).catch(() => {}); } catch (e) {}
+};
+
+function textField(label, parent) {
+    const id = nextId('input');
+    const input = el('input', {id: id, type: 'text', class: 'mud-input-slot mud-input-root'});
+    input.addEventListener('change', () => roundTrip(() => { input.setAttribute('data-server-value', input.value); }));
+    parent.appendChild(el('div', {class: 'mud-input-control'}, [
+        el('label', {for: id, class: 'mud-input-label'}, [label]), input
+    ]));
+    return input;
+}
+
+function closePopovers() {
+    document.querySelectorAll('.mud-popover').forEach(p => p.remove());
+}
+
+function selectField(label, optionsFn, parent, onSelected) {
+    const id = nextId('select');
+    const input = el('input', {id: id, type: 'text', readonly: '', class: 'mud-select-input'});
+    const select = el('div', {class: 'mud-select mud-input-control'}, [
+        el('div', {class: 'mud-input-control-input-container'}, [
+            el('label', {for: id, class: 'mud-input-label'}, [label]), input
+        ])
+    ]);
+    select.addEventListener('click', () => roundTrip(() => {
+        closePopovers();
+        const list = el('div', {class: 'mud-list'});
+        optionsFn().forEach(option => {
+            const item = el('div', {class: 'mud-list-item mud-list-item-clickable'}, [
+                el('p', {class: 'mud-typography mud-typography-body1'}, [option])
+            ]);
+            item.addEventListener('click', (event) => {
+                event.stopPropagation();
+                roundTrip(() => {
+                    input.value = option;
+                    closePopovers();
+                    if (onSelected) onSelected(option);
+                });
+            });
+            list.appendChild(item);
+        });
+        const rect = select.getBoundingClientRect();
+        const popover = el('div', {class: 'mud-popover mud-popover-open'}, [list]);
+        popover.style.left = (rect.left + window.scrollX) + 'px';
+        popover.style.top = (rect.bottom + window.scrollY) + 'px';
+        document.body.appendChild(popover);
+    }));
+    parent.appendChild(select);
+    return input;
+}
+
+function eyeSection(title) {
+    const paper = el('div', {class: 'mud-paper mud-elevation-1'});
+    paper.appendChild(el('h5', {class: 'mud-typography mud-typography-h5'}, [title]));
+    const switches = el('div', {class: 'switches'});
+    const fields = el('div', {class: 'fields'});
+    const toricFields = el('div', {class: 'toric-fields'});
+    const lens = el('div', {class: 'lens'});
+    const results = el('div', {class: 'results'});
+    paper.append(switches, fields, toricFields, lens, results);
+
+    cfg.switches.forEach(name => {
+        const input = el('input', {type: 'checkbox', class: 'mud-switch-input'});
+        input.addEventListener('change', () => roundTrip(() => {
+            // Toric ajoute/retire des champs, comme le vrai formulaire
+            if (name === 'Toric') {
+                toricFields.innerHTML = '';
+                if (input.checked) cfg.toric_fields.forEach(f => textField(f, toricFields));
+            }
+        }));
+        switches.appendChild(el('label', {class: 'mud-switch'}, [
+            input, el('span', {class: 'mud-switch-span'}),
+            el('p', {class: 'mud-switch-label mud-typography'}, [name])
+        ]));
+    });
+    cfg.eye_fields.forEach(f => textField(f, fields));
+    let model = null;
+    selectField('Manufacturer', () => Object.keys(cfg.lenses), lens, () => { if (model) model.value = ''; });
+    model = selectField('Select IOL', () => {
+        const manufacturer = lens.querySelector('input').value;
+        return cfg.lenses[manufacturer] || [];
+    }, lens);
+    return {paper: paper, fields: fields, results: results};
+}
+
+function valueOf(scope, label) {
+    const labelEl = [...scope.querySelectorAll('label')].find(l => l.textContent.trim() === label);
+    const input = labelEl && document.getElementById(labelEl.getAttribute('for'));
+    return input ? parseFloat((input.value || '').replace(',', '.')) : NaN;
+}
+
+function renderResults(section) {
+    section.results.innerHTML = '';
+    const al = valueOf(section.paper, 'AL');
+    if (isNaN(al)) return false;
+    const k = (valueOf(section.paper, 'K1') + valueOf(section.paper, 'K2')) / 2 || 43.5;
+    const target = valueOf(section.paper, 'Target Refraction') || 0;
+    const thead = el('thead', {}, [el('tr', {}, ['Formula', 'IOL Power', 'Predicted Refraction'].map(h => el('th', {}, [h])))]);
+    const tbody = el('tbody');
+    cfg.formulas.forEach((formula, i) => {
+        // Valeurs déterministes (seul le format compte pour le benchmark)
+        const power = Math.round((118.4 - 2.5 * al - 0.9 * k - 1.5 * target + 0.1 * i) * 2) / 2;
+        const refraction = (target + 0.02 * (i - 3)).toFixed(2);
+        tbody.appendChild(el('tr', {}, [
+            el('td', {'data-label': 'Formula'}, [formula]),
+            el('td', {'data-label': 'IOL Power'}, [(power >= 0 ? '+' : '') + power.toFixed(2) + ' D']),
+            el('td', {'data-label': 'Predicted Refraction'}, [refraction])
+        ]));
+    });
+    section.results.appendChild(el('table', {class: 'mud-table-root'}, [thead, tbody]));
+    return true;
+}
+
+function renderForm() {
+    app.innerHTML = '';
+    const options = el('div', {class: 'mud-paper options'});
+    ['Show all formulas', 'Use optimized constants', 'Show SE', 'Show prediction interval'].forEach((name, i) => {
+        const checked = i === 3 ? 'true' : 'false';
+        const input = el('input', {type: 'checkbox', class: 'mud-checkbox-input', 'aria-checked': checked});
+        input.checked = checked === 'true';
+        input.addEventListener('change', () => roundTrip(() => input.setAttribute('aria-checked', String(input.checked))));
+        options.appendChild(el('label', {class: 'mud-checkbox'}, [input, el('span', {}, [name])]));
+    });
+    app.appendChild(options);
+
+    const patient = el('div', {class: 'mud-paper patient'});
+    selectField('Gender', () => ['Female', 'Male'], patient);
+    ['Surgeon', 'Patient Initials', 'Id', 'Age'].forEach(f => textField(f, patient));
+    app.appendChild(patient);
+
+    const od = eyeSection('OD Right');
+    const os = eyeSection('OS Left');
+    app.append(od.paper, os.paper);
+
+    const actions = el('div', {class: 'actions'});
+    actions.appendChild(button('Calculate', () => later(cfg.calculate_ms, () => {
+        const rendered = [renderResults(od), renderResults(os)];
+        actions.querySelectorAll('.result-action').forEach(b => b.remove());
+        if (!rendered.some(Boolean)) return;
+        const print = button('Print');
+        const share = button('Share');
+        const token = Math.random().toString(36).slice(2, 10);
+        share.setAttribute('onclick', "copyToClipboard('" + location.origin + "/share/" + token + "')");
+        print.classList.add('result-action');
+        share.classList.add('result-action');
+        actions.append(print, share);
+    })));
+    app.appendChild(actions);
+}
+
+later(cfg.boot_ms, () => {
+    const dialog = el('div', {class: 'mud-dialog'}, [
+        el('p', {}, ['This calculator is a benchmark fixture.']),
+        button('I Agree', () => roundTrip(() => { dialog.remove(); renderForm(); }))
+    ]);
+    app.appendChild(dialog);
+});
+})();
+"""
+
+
+def latencies():
+    """Latences par défaut, surchargées par la query string de la page"""
+    values = dict(LATENCIES)
+    for key in values:
+        if key in request.args:
+            values[key] = request.args.get(key, type=int)
+    return values
+
+
+@app.route('/')
+def page():
+    values = latencies()
+    time.sleep(values['page_ms'] / 1000)
+    config = dict(values, lenses=LENSES, formulas=FORMULAS, eye_fields=EYE_FIELDS, toric_fields=TORIC_FIELDS,
+                  switches=["Toric", "Keratoconus", "Argos (SoS) AL", "Post LASIK/PRK"])
+    asset = f"/_framework/blazor.server.js?asset_ms={values['asset_ms']}"
+    html = PAGE.replace('__CONFIG__', json.dumps(config)).replace('__ASSET__', asset)
+    return Response(html, mimetype='text/html')
+
+
+@app.route('/_framework/blazor.server.js')
+def script():
+    time.sleep(latencies()['asset_ms'] / 1000)
+    return Response(SCRIPT, mimetype='application/javascript')
+
+
+@app.route('/share/<token>')
+def share(token):
+    return Response(f"Shared calculation {token}", mimetype='text/plain')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in of the ESCRS IOL calculator for benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    for key, value in LATENCIES.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=value, dest=key)
+    args = parser.parse_args()
+    for key in LATENCIES:
+        LATENCIES[key] = getattr(args, key)
+    print(f"🧪 Fixture calculator on http://{args.host}:{args.port}/ (latencies: {LATENCIES})")
+    app.run(host=args.host, port=args.port, threaded=True, debug=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark de l'API: latences p50/p95/p99 et débit (requêtes/s) de /calculate et /calculate-json
+à plusieurs niveaux de concurrence.
+
+    python bench/fixture_site.py --port 8765 &
+    CALCULATOR_URL=http://localhost:8765/ python app.py &
+    python bench/run_benchmark.py --concurrency 1,2,4 --requests 20 --output bench_results.json
+    python bench/run_benchmark.py --compare bench_results.json   # compare au run précédent
+
+Par défaut chaque requête envoie Cache-Control: no-store pour mesurer de vrais calculs (--use-cache sinon).
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Payload compatible avec le site de substitution (bench/fixture_site.py)
+DEFAULT_PAYLOAD = {
+    "gender": "Female",
+    "top_fields": {"surgeon": "Bench", "patient_initials": "BM", "id": "1", "age": "70"},
+    "right_eye": {
+        "AL": "23.5", "ACD": "3.1", "LT": "4.5", "K1": "43.25", "K2": "44.0", "Target Refraction": "-0.25",
+        "Manufacturer": "Alcon", "Select IOL": "SN60WF"
+    },
+    "left_eye": {
+        "AL": "23.8", "ACD": "3.2", "LT": "4.4", "K1": "43.5", "K2": "44.25", "Target Refraction": "0",
+        "switches": {"Toric": True},
+        "Manufacturer": "Zeiss", "Select IOL": "CT Asphina 409M"
+    }
+}
+
+
+def percentile(sorted_values, pct):
+    """Percentile par interpolation linéaire (liste déjà triée)"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def send(base_url, endpoint, payload, use_cache, timeout):
+    """Une requête; retourne (succès, statut HTTP, durée en secondes)"""
+    headers = {'Content-Type': 'application/json'}
+    if not use_cache:
+        headers['Cache-Control'] = 'no-store'
+    query = '?output=json' if endpoint == 'calculate-json-only' else ''
+    path = 'calculate-json' if endpoint == 'calculate-json-only' else endpoint
+    req = urllib.request.Request(f"{base_url}/{path}{query}", data=json.dumps(payload).encode('utf-8'),
+                                 headers=headers, method='POST')
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return 200 <= resp.status < 300, resp.status, time.perf_counter() - started
+    except urllib.error.HTTPError as e:
+        e.read()
+        return False, e.code, time.perf_counter() - started
+    except Exception:
+        return False, 0, time.perf_counter() - started
+
+
+def run_level(base_url, endpoint, concurrency, requests_count, payload, use_cache, timeout):
+    """Envoie requests_count requêtes avec `concurrency` clients en parallèle"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(
+            lambda _: send(base_url, endpoint, payload, use_cache, timeout), range(requests_count)
+        ))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(duration for ok, _, duration in outcomes if ok)
+    statuses = {}
+    for _, status, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ms = lambda value: round(1000 * value, 1) if value is not None else None
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': requests_count,
+        'succeeded': len(latencies),
+        'failed': requests_count - len(latencies),
+        'statuses': statuses,
+        'elapsed_s': round(elapsed, 2),
+        'rps': round(len(latencies) / elapsed, 3) if elapsed else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None
+    }
+
+
+def print_table(rows, previous=None):
+    previous = {(r['endpoint'], r['concurrency']): r for r in (previous or [])}
+    print(f"\n{'endpoint':<22}{'conc':>5}{'ok':>6}{'fail':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in rows:
+        line = (f"{row['endpoint']:<22}{row['concurrency']:>5}{row['succeeded']:>6}{row['failed']:>6}"
+                f"{row['rps'] or 0:>9.2f}{row['p50_ms'] or 0:>10.0f}{row['p95_ms'] or 0:>10.0f}{row['p99_ms'] or 0:>10.0f}")
+        before = previous.get((row['endpoint'], row['concurrency']))
+        if before and before.get('p50_ms') and row['p50_ms']:
+            delta = 100 * (row['p50_ms'] - before['p50_ms']) / before['p50_ms']
+            line += f"   p50 {delta:+.1f}% vs previous"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and throughput benchmark of the IOL calculator API")
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--endpoints', default='calculate,calculate-json',
+                        help="Comma-separated: calculate, calculate-json, calculate-json-only (?output=json)")
+    parser.add_argument('--concurrency', default='1,2,4', help="Comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=10, help="Requests per endpoint and concurrency level")
+    parser.add_argument('--payload', help="JSON file with the calculation payload (default: fixture payload)")
+    parser.add_argument('--use-cache', action='store_true', help="Let the API serve cached results")
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed requests before measuring")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    payload = DEFAULT_PAYLOAD
+    if args.payload:
+        with open(args.payload, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)['results']
+
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+
+    for _ in range(args.warmup):
+        ok, status, duration = send(args.base_url, endpoints[0], payload, args.use_cache, args.timeout)
+        print(f"🔥 Warmup: HTTP {status} in {duration:.1f}s")
+
+    rows = []
+    for endpoint in endpoints:
+        for concurrency in levels:
+            print(f"⏱️ {endpoint} x{concurrency} ({args.requests} requests)...")
+            rows.append(run_level(args.base_url, endpoint, concurrency, args.requests, payload,
+                                  args.use_cache, args.timeout))
+
+    print_table(rows, previous)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'base_url': args.base_url,
+                'use_cache': args.use_cache,
+                'results': rows
+            }, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    return 0 if all(r['failed'] == 0 for r in rows) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
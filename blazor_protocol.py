@@ -0,0 +1,835 @@
+"""
+Protocole Blazor Server sans navigateur: SignalR + MessagePack (blazorpack) sur WebSocket,
+décodage des RenderBatch vers un DOM logique, transports réel / enregistrement / rejeu.
+"""
+import base64
+import html as html_lib
+import http.cookiejar
+import json
+import os
+import re
+import socket
+import ssl
+import struct
+import time
+import urllib.request
+from collections import deque
+from urllib.parse import urljoin, urlsplit
+
+class BlazorProtocolError(Exception):
+    """Réponse inattendue du hub Blazor"""
+
+class BlazorPayloadError(Exception):
+    """Le payload ne correspond pas à la page (liste ou option inconnue): le hub n'y est pour rien"""
+
+def msgpack_pack(value):
+    """Encodeur MessagePack minimal (types utilisés par le protocole SignalR)"""
+    if value is None:
+        return b'\xc0'
+    if value is True:
+        return b'\xc3'
+    if value is False:
+        return b'\xc2'
+    if isinstance(value, int):
+        if 0 <= value < 0x80:
+            return bytes([value])
+        if -32 <= value < 0:
+            return struct.pack('b', value)
+        if value >= 0:
+            for fmt, code in (('>B', 0xcc), ('>H', 0xcd), ('>I', 0xce), ('>Q', 0xcf)):
+                if value < 1 << (8 * struct.calcsize(fmt)):
+                    return bytes([code]) + struct.pack(fmt, value)
+        for fmt, code in (('>b', 0xd0), ('>h', 0xd1), ('>i', 0xd2), ('>q', 0xd3)):
+            if value >= -(1 << (8 * struct.calcsize(fmt) - 1)):
+                return bytes([code]) + struct.pack(fmt, value)
+        raise ValueError(f"Integer out of range: {value}")
+    if isinstance(value, float):
+        return b'\xcb' + struct.pack('>d', value)
+    if isinstance(value, str):
+        raw = value.encode('utf-8')
+        if len(raw) < 32:
+            return bytes([0xa0 | len(raw)]) + raw
+        for fmt, code in (('>B', 0xd9), ('>H', 0xda), ('>I', 0xdb)):
+            if len(raw) < 1 << (8 * struct.calcsize(fmt)):
+                return bytes([code]) + struct.pack(fmt, len(raw)) + raw
+    if isinstance(value, (bytes, bytearray)):
+        for fmt, code in (('>B', 0xc4), ('>H', 0xc5), ('>I', 0xc6)):
+            if len(value) < 1 << (8 * struct.calcsize(fmt)):
+                return bytes([code]) + struct.pack(fmt, len(value)) + bytes(value)
+    if isinstance(value, (list, tuple)):
+        if len(value) < 16:
+            head = bytes([0x90 | len(value)])
+        elif len(value) < 1 << 16:
+            head = b'\xdc' + struct.pack('>H', len(value))
+        else:
+            head = b'\xdd' + struct.pack('>I', len(value))
+        return head + b''.join(msgpack_pack(v) for v in value)
+    if isinstance(value, dict):
+        if len(value) < 16:
+            head = bytes([0x80 | len(value)])
+        elif len(value) < 1 << 16:
+            head = b'\xde' + struct.pack('>H', len(value))
+        else:
+            head = b'\xdf' + struct.pack('>I', len(value))
+        return head + b''.join(msgpack_pack(k) + msgpack_pack(v) for k, v in value.items())
+    raise TypeError(f"Cannot encode {type(value).__name__} as MessagePack")
+
+def msgpack_unpack(data):
+    """Décodeur MessagePack minimal; retourne la première valeur de `data`"""
+
+    def read(pos):
+        code = data[pos]
+        pos += 1
+        if code < 0x80:
+            return code, pos
+        if code >= 0xe0:
+            return code - 0x100, pos
+        if 0x80 <= code <= 0x8f:
+            return read_map(pos, code & 0x0f)
+        if 0x90 <= code <= 0x9f:
+            return read_array(pos, code & 0x0f)
+        if 0xa0 <= code <= 0xbf:
+            size = code & 0x1f
+            return data[pos:pos + size].decode('utf-8'), pos + size
+        if code == 0xc0:
+            return None, pos
+        if code == 0xc2:
+            return False, pos
+        if code == 0xc3:
+            return True, pos
+        fixed = {
+            0xca: '>f', 0xcb: '>d',
+            0xcc: '>B', 0xcd: '>H', 0xce: '>I', 0xcf: '>Q',
+            0xd0: '>b', 0xd1: '>h', 0xd2: '>i', 0xd3: '>q'
+        }
+        if code in fixed:
+            fmt = fixed[code]
+            return struct.unpack_from(fmt, data, pos)[0], pos + struct.calcsize(fmt)
+        sized = {0xc4: '>B', 0xc5: '>H', 0xc6: '>I', 0xd9: '>B', 0xda: '>H', 0xdb: '>I'}
+        if code in sized:
+            fmt = sized[code]
+            size = struct.unpack_from(fmt, data, pos)[0]
+            pos += struct.calcsize(fmt)
+            raw = bytes(data[pos:pos + size])
+            return (raw if code <= 0xc6 else raw.decode('utf-8')), pos + size
+        if code in (0xdc, 0xdd):
+            fmt = '>H' if code == 0xdc else '>I'
+            return read_array(pos + struct.calcsize(fmt), struct.unpack_from(fmt, data, pos)[0])
+        if code in (0xde, 0xdf):
+            fmt = '>H' if code == 0xde else '>I'
+            return read_map(pos + struct.calcsize(fmt), struct.unpack_from(fmt, data, pos)[0])
+        # Types ext: non utilisés par Blazor, on les saute
+        ext_sizes = {0xd4: 1, 0xd5: 2, 0xd6: 4, 0xd7: 8, 0xd8: 16}
+        if code in ext_sizes:
+            return None, pos + 1 + ext_sizes[code]
+        if code in (0xc7, 0xc8, 0xc9):
+            fmt = {0xc7: '>B', 0xc8: '>H', 0xc9: '>I'}[code]
+            size = struct.unpack_from(fmt, data, pos)[0]
+            return None, pos + struct.calcsize(fmt) + 1 + size
+        raise BlazorProtocolError(f"Unknown MessagePack type 0x{code:02x}")
+
+    def read_array(pos, count):
+        items = []
+        for _ in range(count):
+            item, pos = read(pos)
+            items.append(item)
+        return items, pos
+
+    def read_map(pos, count):
+        items = {}
+        for _ in range(count):
+            key, pos = read(pos)
+            items[key], pos = read(pos)
+        return items, pos
+
+    return read(0)[0]
+
+def _read_varint(data, pos):
+    """Entier 7 bits (préfixe de longueur SignalR et longueur des chaînes .NET BinaryWriter)"""
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def _write_varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def signalr_frame(message):
+    """Message hub -> trame binaire SignalR (longueur varint + MessagePack)"""
+    payload = msgpack_pack(message)
+    return _write_varint(len(payload)) + payload
+
+def signalr_messages(data):
+    """Découpe une trame binaire en messages hub décodés"""
+    pos = 0
+    while pos < len(data):
+        size, pos = _read_varint(data, pos)
+        yield msgpack_unpack(data[pos:pos + size])
+        pos += size
+
+# Types de frames / d'éditions du RenderBatch (Microsoft.AspNetCore.Components.RenderTree)
+FRAME_ELEMENT, FRAME_TEXT, FRAME_ATTRIBUTE, FRAME_COMPONENT, FRAME_REGION = 1, 2, 3, 4, 5
+FRAME_ELEMENT_REF, FRAME_COMPONENT_REF, FRAME_MARKUP = 6, 7, 8
+EDIT_PREPEND, EDIT_REMOVE, EDIT_SET_ATTRIBUTE, EDIT_REMOVE_ATTRIBUTE, EDIT_UPDATE_TEXT = 1, 2, 3, 4, 5
+EDIT_STEP_IN, EDIT_STEP_OUT, EDIT_UPDATE_MARKUP, EDIT_PERMUTATION_ENTRY, EDIT_PERMUTATION_END = 6, 7, 8, 9, 10
+
+def decode_render_batch(batch):
+    """
+    Décode le format binaire RenderBatch (RenderBatchWriter): composants mis à jour avec leurs éditions,
+    frames de référence, composants et handlers supprimés.
+    """
+
+    def i32(pos):
+        return struct.unpack_from('<i', batch, pos)[0]
+
+    string_table = i32(len(batch) - 4)
+
+    def string(pos):
+        index = i32(pos)
+        if index < 0:
+            return None
+        location = i32(string_table + 4 * index)
+        size, location = _read_varint(batch, location)
+        return bytes(batch[location:location + size]).decode('utf-8')
+
+    # 5 offsets (jusqu'à .NET 7) ou 6 (.NET 8, avec les "named events") avant la table des chaînes
+    for offsets_count in (6, 5):
+        base = len(batch) - 4 * offsets_count
+        if base < 0:
+            continue
+        updated, frames_offset = i32(base), i32(base + 4)
+        if 0 <= updated < len(batch) and updated + 4 + 4 * i32(updated) == frames_offset:
+            disposed_components, disposed_handlers = i32(base + 8), i32(base + 12)
+            break
+    else:
+        raise BlazorProtocolError("Unrecognized RenderBatch layout")
+
+    frames = []
+    for n in range(i32(frames_offset)):
+        pos = frames_offset + 4 + 20 * n
+        kind = i32(pos)
+        frame = {'type': kind}
+        if kind == FRAME_ELEMENT:
+            frame.update(subtree_length=i32(pos + 4), name=string(pos + 8))
+        elif kind == FRAME_TEXT or kind == FRAME_MARKUP:
+            frame.update(text=string(pos + 4))
+        elif kind == FRAME_ATTRIBUTE:
+            frame.update(name=string(pos + 4), value=string(pos + 8),
+                         handler_id=struct.unpack_from('<Q', batch, pos + 12)[0])
+        elif kind == FRAME_COMPONENT:
+            frame.update(subtree_length=i32(pos + 4), component_id=i32(pos + 8))
+        elif kind == FRAME_REGION:
+            frame.update(subtree_length=i32(pos + 4))
+        elif kind == FRAME_ELEMENT_REF:
+            frame.update(capture_id=string(pos + 4))
+        frames.append(frame)
+
+    diffs = []
+    for n in range(i32(updated)):
+        pos = i32(updated + 4 + 4 * n)
+        component_id, edits_count = i32(pos), i32(pos + 4)
+        edits = []
+        for e in range(edits_count):
+            epos = pos + 8 + 16 * e
+            edits.append({
+                'type': i32(epos),
+                'sibling_index': i32(epos + 4),
+                'frame_index': i32(epos + 8),
+                'removed_attribute': string(epos + 12)
+            })
+        diffs.append({'component_id': component_id, 'edits': edits})
+
+    return {
+        'diffs': diffs,
+        'frames': frames,
+        'disposed_components': [i32(disposed_components + 4 + 4 * n) for n in range(i32(disposed_components))],
+        'disposed_handlers': [struct.unpack_from('<Q', batch, disposed_handlers + 4 + 8 * n)[0]
+                              for n in range(i32(disposed_handlers))]
+    }
+
+# Éléments HTML sans balise fermante
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+class BlazorNode:
+    """Noeud de l'arbre logique Blazor (élément, texte, markup ou conteneur de composant)"""
+
+    def __init__(self, kind, parent=None, name=None, text=None, component_id=None):
+        self.kind = kind
+        self.parent = parent
+        self.name = name
+        self.text = text
+        self.component_id = component_id
+        self.attrs = {}
+        self.handlers = {}
+        self.children = []
+
+    def iter(self):
+        yield self
+        for child in self.children:
+            yield from child.iter()
+
+    def text_content(self):
+        if self.kind == 'text':
+            return self.text or ''
+        if self.kind == 'markup':
+            return re.sub(r'<[^>]+>', ' ', self.text or '')
+        return " ".join(" ".join(c.text_content() for c in self.children).split())
+
+    def has_class(self, name):
+        return name in (self.attrs.get('class') or '').split()
+
+    def to_html(self):
+        if self.kind == 'text':
+            return html_lib.escape(self.text or '')
+        if self.kind == 'markup':
+            return self.text or ''
+        inner = ''.join(child.to_html() for child in self.children)
+        if self.kind != 'element':
+            return inner
+        attrs = ''.join(
+            f' {name}' if value == '' else f' {name}="{html_lib.escape(value)}"'
+            for name, value in self.attrs.items()
+        )
+        if self.name in VOID_TAGS:
+            return f'<{self.name}{attrs}>'
+        return f'<{self.name}{attrs}>{inner}</{self.name}>'
+
+class BlazorDom:
+    """Miroir du DOM maintenu en appliquant les RenderBatch comme le BrowserRenderer JS"""
+
+    def __init__(self):
+        self.root = BlazorNode('root')
+        self.components = {}
+
+    def attach_root(self, component_id):
+        container = BlazorNode('component', self.root, component_id=component_id)
+        self.root.children.append(container)
+        self.components[component_id] = container
+        return container
+
+    def apply_batch(self, batch):
+        frames = batch['frames']
+        for diff in batch['diffs']:
+            container = self.components.get(diff['component_id']) or self.attach_root(diff['component_id'])
+            self._apply_edits(diff['component_id'], container, diff['edits'], frames)
+        for component_id in batch['disposed_components']:
+            self.components.pop(component_id, None)
+        disposed = set(batch['disposed_handlers'])
+        if disposed:
+            for node in self.root.iter():
+                for event, handler_id in list(node.handlers.items()):
+                    if handler_id in disposed:
+                        del node.handlers[event]
+
+    def _apply_edits(self, component_id, parent, edits, frames):
+        permutations = []
+        for edit in edits:
+            kind, index = edit['type'], edit['sibling_index']
+            if kind == EDIT_PREPEND:
+                self._insert_frame(component_id, parent, index, frames, edit['frame_index'])
+            elif kind == EDIT_REMOVE:
+                del parent.children[index]
+            elif kind == EDIT_SET_ATTRIBUTE:
+                self._apply_attribute(parent.children[index], frames[edit['frame_index']])
+            elif kind == EDIT_REMOVE_ATTRIBUTE:
+                node = parent.children[index]
+                name = edit['removed_attribute']
+                node.attrs.pop(name, None)
+                node.handlers.pop(name[2:] if name.startswith('on') else name, None)
+            elif kind == EDIT_UPDATE_TEXT:
+                parent.children[index].text = frames[edit['frame_index']]['text']
+            elif kind == EDIT_UPDATE_MARKUP:
+                node = BlazorNode('markup', parent, text=frames[edit['frame_index']]['text'])
+                parent.children[index] = node
+            elif kind == EDIT_STEP_IN:
+                parent = parent.children[index]
+            elif kind == EDIT_STEP_OUT:
+                parent = parent.parent
+            elif kind == EDIT_PERMUTATION_ENTRY:
+                permutations.append((index, edit['frame_index']))
+            elif kind == EDIT_PERMUTATION_END:
+                moved = {to: parent.children[frm] for frm, to in permutations}
+                for to, node in moved.items():
+                    parent.children[to] = node
+                permutations = []
+
+    def _insert_frame(self, component_id, parent, index, frames, frame_index):
+        """Insère une frame (et son sous-arbre); retourne le nombre de noeuds logiques insérés"""
+        frame = frames[frame_index]
+        kind = frame['type']
+        if kind == FRAME_ELEMENT:
+            node = BlazorNode('element', parent, name=frame['name'], component_id=component_id)
+            parent.children.insert(index, node)
+            end = frame_index + frame['subtree_length']
+            child = frame_index + 1
+            while child < end and frames[child]['type'] == FRAME_ATTRIBUTE:
+                self._apply_attribute(node, frames[child])
+                child += 1
+            self._insert_range(component_id, node, 0, frames, child, end)
+            return 1
+        if kind in (FRAME_TEXT, FRAME_MARKUP):
+            parent.children.insert(index, BlazorNode('text' if kind == FRAME_TEXT else 'markup', parent, text=frame['text']))
+            return 1
+        if kind == FRAME_COMPONENT:
+            container = BlazorNode('component', parent, component_id=frame['component_id'])
+            parent.children.insert(index, container)
+            self.components[frame['component_id']] = container
+            return 1
+        if kind == FRAME_REGION:
+            return self._insert_range(component_id, parent, index, frames, frame_index + 1, frame_index + frame['subtree_length'])
+        # Captures de références et named events: aucun noeud
+        return 0
+
+    def _insert_range(self, component_id, parent, index, frames, start, end):
+        inserted = 0
+        position = start
+        while position < end:
+            frame = frames[position]
+            inserted += self._insert_frame(component_id, parent, index + inserted, frames, position)
+            position += frame.get('subtree_length', 1) if frame['type'] in (FRAME_ELEMENT, FRAME_COMPONENT, FRAME_REGION) else 1
+        return inserted
+
+    def _apply_attribute(self, node, frame):
+        name = frame['name']
+        if frame.get('handler_id'):
+            node.handlers[name[2:] if name.startswith('on') else name] = frame['handler_id']
+        elif frame['value'] is None:
+            node.attrs.pop(name, None)
+        else:
+            node.attrs[name] = frame['value']
+
+    def find_all(self, predicate):
+        return [n for n in self.root.iter() if n.kind == 'element' and predicate(n)]
+
+    def to_html(self):
+        return '<!DOCTYPE html><html><body>' + self.root.to_html() + '</body></html>'
+
+class HttpBlazorTransport:
+    """Transport réel: HTTP (page + negotiate) puis WebSocket minimal (RFC 6455, stdlib seulement)"""
+
+    def __init__(self):
+        self.cookies = http.cookiejar.CookieJar()
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self._sock = None
+        self._buffer = b''
+
+    def http(self, url, method='GET', body=None):
+        req = urllib.request.Request(url, data=body, method=method, headers={'User-Agent': 'Mozilla/5.0'})
+        with self._opener.open(req, timeout=30) as resp:
+            return resp.read().decode('utf-8')
+
+    def connect(self, url):
+        parts = urlsplit(url)
+        secure = parts.scheme == 'wss'
+        port = parts.port or (443 if secure else 80)
+        sock = socket.create_connection((parts.hostname, port), timeout=30)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        key = base64.b64encode(os.urandom(16)).decode()
+        cookie = '; '.join(f'{c.name}={c.value}' for c in self.cookies if parts.hostname.endswith(c.domain.lstrip('.')))
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        request_lines = [
+            f'GET {path} HTTP/1.1',
+            f'Host: {parts.netloc}',
+            'Upgrade: websocket',
+            'Connection: Upgrade',
+            f'Sec-WebSocket-Key: {key}',
+            'Sec-WebSocket-Version: 13',
+            'User-Agent: Mozilla/5.0'
+        ]
+        if cookie:
+            request_lines.append(f'Cookie: {cookie}')
+        sock.sendall(('\r\n'.join(request_lines) + '\r\n\r\n').encode())
+        response = b''
+        while b'\r\n\r\n' not in response:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise BlazorProtocolError("WebSocket handshake: connection closed")
+            response += chunk
+        head, self._buffer = response.split(b'\r\n\r\n', 1)
+        status_line = head.split(b'\r\n')[0].decode('latin-1')
+        if ' 101 ' not in status_line:
+            raise BlazorProtocolError(f"WebSocket handshake refused: {status_line}")
+        self._sock = sock
+
+    def send(self, payload, text=False):
+        header = bytearray([0x80 | (0x1 if text else 0x2)])
+        size = len(payload)
+        if size < 126:
+            header.append(0x80 | size)
+        elif size < 1 << 16:
+            header += bytes([0x80 | 126]) + struct.pack('>H', size)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack('>Q', size)
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self._sock.sendall(bytes(header) + mask + masked)
+
+    def _read_exact(self, size):
+        while len(self._buffer) < size:
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise BlazorProtocolError("WebSocket closed by server")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def recv(self, timeout):
+        """Prochain message (bytes) ou None si rien n'arrive avant `timeout`"""
+        self._sock.settimeout(timeout)
+        message = b''
+        try:
+            while True:
+                first, second = self._read_exact(2)
+                self._sock.settimeout(30)
+                opcode, size = first & 0x0f, second & 0x7f
+                if size == 126:
+                    size = struct.unpack('>H', self._read_exact(2))[0]
+                elif size == 127:
+                    size = struct.unpack('>Q', self._read_exact(8))[0]
+                payload = self._read_exact(size)
+                if opcode == 0x8:
+                    raise BlazorProtocolError("WebSocket closed by server")
+                if opcode == 0x9:
+                    self._send_control(0xA, payload)
+                    continue
+                if opcode == 0xA:
+                    continue
+                message += payload
+                if first & 0x80:
+                    return message
+        except socket.timeout:
+            if message:
+                raise BlazorProtocolError("Timed out in the middle of a WebSocket message")
+            return None
+
+    def _send_control(self, opcode, payload=b''):
+        mask = os.urandom(4)
+        self._sock.sendall(bytes([0x80 | opcode, 0x80 | len(payload)]) + mask
+                           + bytes(b ^ mask[i % 4] for i, b in enumerate(payload)))
+
+    def close(self):
+        if self._sock:
+            try:
+                self._send_control(0x8)
+                self._sock.close()
+            except Exception:
+                pass
+            self._sock = None
+
+class RecordingBlazorTransport:
+    """Enveloppe un transport et écrit chaque échange dans un fichier JSONL rejouable"""
+
+    def __init__(self, inner, path):
+        self._inner = inner
+        self._file = open(path, 'w', encoding='utf-8')
+        self.path = path
+
+    def _log(self, **entry):
+        for key in ('data', 'body'):
+            if isinstance(entry.get(key), bytes):
+                entry[key] = base64.b64encode(entry[key]).decode()
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def http(self, url, method='GET', body=None):
+        text = self._inner.http(url, method, body)
+        self._log(kind='http', url=url, method=method, body=text)
+        return text
+
+    def connect(self, url):
+        self._inner.connect(url)
+        self._log(kind='connect', url=url)
+
+    def send(self, payload, text=False):
+        self._inner.send(payload, text)
+        self._log(kind='send', data=payload, text=text)
+
+    def recv(self, timeout):
+        data = self._inner.recv(timeout)
+        if data is not None:
+            self._log(kind='recv', data=data)
+        return data
+
+    def close(self):
+        self._inner.close()
+        self._file.close()
+
+class ReplayBlazorTransport:
+    """
+    Rejoue un enregistrement sans réseau, comme le ferait le hub: une trame serveur n'est livrée qu'une fois
+    reçus les envois du client qui la précédaient (même type de message et même cible); sinon recv attend.
+    """
+
+    def __init__(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            self._entries = deque(json.loads(line) for line in f if line.strip())
+        self.sent = []
+        self._unmatched = deque()
+
+    @staticmethod
+    def _signature(payload, text=False):
+        """Ce qui identifie un envoi: le handshake, ou le type et la cible des messages hub (pings exclus)"""
+        if text:
+            return ('handshake',)
+        return tuple((m[0], m[3] if m[0] == 1 else None) for m in signalr_messages(payload) if m[0] != 6)
+
+    def _next(self, kind):
+        while self._entries:
+            entry = self._entries.popleft()
+            if entry['kind'] == kind:
+                return entry
+            if entry['kind'] == 'recv':
+                # Une trame serveur attendue avant cet appel: on la remet pour le prochain recv
+                self._entries.appendleft(entry)
+                return None
+        return None
+
+    def http(self, url, method='GET', body=None):
+        entry = self._next('http')
+        if entry is None:
+            raise BlazorProtocolError(f"Replay has no HTTP response for {method} {url}")
+        return entry['body']
+
+    def connect(self, url):
+        self._next('connect')
+
+    def send(self, payload, text=False):
+        self.sent.append(payload)
+        signature = self._signature(payload, text)
+        if signature:
+            self._unmatched.append(signature)
+
+    def recv(self, timeout):
+        while self._entries and self._entries[0]['kind'] == 'send':
+            entry = self._entries[0]
+            expected = self._signature(base64.b64decode(entry['data']), entry.get('text'))
+            if expected:
+                if not self._unmatched:
+                    # Le hub attend encore ce message du client: rien n'arrive pendant `timeout`
+                    break
+                actual = self._unmatched.popleft()
+                if actual != expected:
+                    raise BlazorProtocolError(f"Replay diverged: client sent {actual}, recording has {expected}")
+            self._entries.popleft()
+        if self._entries and self._entries[0]['kind'] == 'recv':
+            return base64.b64decode(self._entries.popleft()['data'])
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+# Arguments d'événements sérialisés comme le fait blazor.server.js
+MOUSE_EVENT_ARGS = {
+    'detail': 1, 'screenX': 0, 'screenY': 0, 'clientX': 0, 'clientY': 0, 'offsetX': 0, 'offsetY': 0,
+    'pageX': 0, 'pageY': 0, 'movementX': 0, 'movementY': 0, 'button': 0, 'buttons': 0,
+    'ctrlKey': False, 'shiftKey': False, 'altKey': False, 'metaKey': False
+}
+
+class BlazorCircuit:
+    """Circuit Blazor Server piloté sans navigateur: rendu reçu en RenderBatch, événements envoyés au hub"""
+
+    def __init__(self, transport, timeout=60, deadline=None, quiet_ms=150):
+        self.transport = transport
+        self.timeout = timeout
+        # Silence (ms) après le dernier RenderBatch au-delà duquel le rendu est considéré stable
+        self.quiet = quiet_ms / 1000
+        # Échéance de la requête (Deadline): chaque attente est plafonnée par le temps restant
+        self.deadline = deadline
+        self.dom = BlazorDom()
+        self._invocation_id = 0
+        self._completions = {}
+        self._last_batch_at = time.monotonic()
+        self._last_sent_at = time.monotonic()
+
+    def start(self, url):
+        """GET de la page, negotiate, handshake blazorpack puis StartCircuit"""
+        page = self.transport.http(url)
+        base = re.search(r'<base\s+href="([^"]*)"', page)
+        base_uri = urljoin(url, base.group(1) if base else '/')
+
+        markers = []
+        for raw in re.findall(r'<!--Blazor:(\{.*?\})-->', page, re.S):
+            marker = json.loads(raw)
+            if marker.get('type') == 'server':
+                markers.append(marker)
+        state = re.search(r'<!--Blazor-Server-Component-State:(.*?)-->', page, re.S)
+        app_state = state.group(1) if state else ''
+
+        negotiate = json.loads(self.transport.http(urljoin(base_uri, '_blazor/negotiate?negotiateVersion=1'), 'POST', b''))
+        token = negotiate.get('connectionToken') or negotiate.get('connectionId')
+        ws_url = urljoin(base_uri, f'_blazor?id={token}').replace('https://', 'wss://').replace('http://', 'ws://')
+        self.transport.connect(ws_url)
+        self.transport.send(b'{"protocol":"blazorpack","version":1}\x1e', text=True)
+        self._read_handshake()
+
+        if markers and 'prerenderId' in markers[0]:
+            # .NET 8: circuit vide puis ajout des composants racines
+            circuit_id = self.invoke('StartCircuit', base_uri, url, '[]', app_state)
+            operations = [
+                {'type': 'add', 'ssrComponentId': i + 1, 'marker': marker}
+                for i, marker in enumerate(markers)
+            ]
+            self.send('UpdateRootComponents', json.dumps(operations), app_state)
+        else:
+            records = [{'type': 'server', 'sequence': m.get('sequence', i), 'descriptor': m['descriptor']}
+                       for i, m in enumerate(markers)]
+            circuit_id = self.invoke('StartCircuit', base_uri, url, json.dumps(records), app_state)
+        if not circuit_id:
+            raise BlazorProtocolError("Server refused to start the circuit")
+        print(f"🔌 Blazor circuit started: {circuit_id}")
+        self.settle()
+
+    def _wait_until(self, step, timeout=None):
+        """Fin d'une attente: `timeout` (self.timeout par défaut) réduit au temps restant avant l'échéance"""
+        if self.deadline is not None:
+            self.deadline.check(step)
+            return time.monotonic() + max(0, min(timeout or self.timeout, self.deadline.remaining()))
+        return time.monotonic() + (timeout or self.timeout)
+
+    def _timed_out(self, step, message):
+        """DeadlineExceeded si c'est l'échéance de la requête qui a coupé l'attente, sinon erreur de protocole"""
+        if self.deadline is not None:
+            self.deadline.check(step)
+        return BlazorProtocolError(message)
+
+    def _read_handshake(self):
+        deadline = self._wait_until("handshake")
+        buffer = b''
+        while b'\x1e' not in buffer:
+            data = self.transport.recv(max(0.1, deadline - time.monotonic()))
+            if data is None:
+                raise self._timed_out("handshake", "No handshake response from hub")
+            buffer += data
+        handshake, rest = buffer.split(b'\x1e', 1)
+        if json.loads(handshake.decode() or '{}').get('error'):
+            raise BlazorProtocolError(f"Hub handshake failed: {handshake.decode()}")
+        if rest:
+            self._handle_frame(rest)
+
+    def send(self, target, *args):
+        """Invocation sans réponse attendue"""
+        self.transport.send(signalr_frame([1, {}, None, target, list(args)]))
+        self._last_sent_at = time.monotonic()
+
+    def invoke(self, target, *args):
+        """Invocation avec réponse (Completion); retourne le résultat"""
+        self._invocation_id += 1
+        invocation_id = str(self._invocation_id)
+        self.transport.send(signalr_frame([1, {}, invocation_id, target, list(args)]))
+        self._last_sent_at = time.monotonic()
+        deadline = self._wait_until(target)
+        while invocation_id not in self._completions:
+            if time.monotonic() > deadline:
+                raise self._timed_out(target, f"No completion for {target}")
+            self._pump(min(0.5, max(0.01, deadline - time.monotonic())))
+        kind, value = self._completions.pop(invocation_id)
+        if kind == 'error':
+            raise BlazorProtocolError(f"{target} failed: {value}")
+        return value
+
+    def _pump(self, timeout):
+        # Ping SignalR pour garder la connexion ouverte (le serveur coupe après 30 s de silence)
+        if time.monotonic() - self._last_sent_at > 10:
+            self.transport.send(signalr_frame([6]))
+            self._last_sent_at = time.monotonic()
+        data = self.transport.recv(timeout)
+        if data is None:
+            return False
+        self._handle_frame(data)
+        return True
+
+    def _handle_frame(self, data):
+        for message in signalr_messages(data):
+            kind = message[0]
+            if kind == 1:
+                self._handle_invocation(message[3], message[4])
+            elif kind == 3:
+                result_kind = message[3]
+                value = message[4] if len(message) > 4 else None
+                self._completions[message[2]] = ('error' if result_kind == 1 else 'ok', value)
+            elif kind == 7:
+                raise BlazorProtocolError(f"Hub closed the connection: {message[1] if len(message) > 1 else ''}")
+
+    def _handle_invocation(self, target, args):
+        if target == 'JS.RenderBatch':
+            batch_id, batch = args[0], args[1]
+            try:
+                self.dom.apply_batch(decode_render_batch(batch))
+                error = None
+            except Exception as e:
+                error = f"Render batch decoding failed: {e}"
+            self.send('OnRenderCompleted', batch_id, error)
+            self._last_batch_at = time.monotonic()
+            if error:
+                raise BlazorProtocolError(error)
+        elif target == 'JS.AttachComponent':
+            self.dom.attach_root(args[0])
+        elif target == 'JS.BeginInvokeJS':
+            # Pas de JS ici: on répond null aux appels qui attendent un résultat
+            async_handle = args[0]
+            if async_handle:
+                self.send('EndInvokeJSFromDotNet', async_handle, True, json.dumps([async_handle, True, None]))
+        elif target == 'JS.Error':
+            raise BlazorProtocolError(f"Circuit error: {args[0] if args else ''}")
+
+    def settle(self, predicate=None, timeout=None):
+        """Traite les messages jusqu'à ce que le rendu soit stable (et `predicate(dom)` vrai si fourni)"""
+        deadline = self._wait_until("render", timeout)
+        quiet = self.quiet
+        while time.monotonic() < deadline:
+            received = self._pump(min(quiet, max(0.01, deadline - time.monotonic())))
+            if not received and time.monotonic() - self._last_batch_at >= quiet:
+                if predicate is None or predicate(self.dom):
+                    return True
+        if predicate is not None:
+            raise self._timed_out("render", "Timed out waiting for the page to render")
+        if self.deadline is not None:
+            self.deadline.check("render")
+        return False
+
+    def dispatch(self, node, event, event_args):
+        """Envoie un événement navigateur vers le handler .NET attaché au noeud"""
+        handler_id = node.handlers.get(event)
+        if not handler_id:
+            raise BlazorProtocolError(f"<{node.name}> has no '{event}' handler")
+        descriptor = {'eventHandlerId': handler_id, 'eventName': event}
+        if 'value' in event_args:
+            descriptor['eventFieldInfo'] = {'componentId': node.component_id, 'fieldValue': event_args['value']}
+        self._last_batch_at = time.monotonic()
+        self.send('DispatchBrowserEvent', json.dumps(descriptor), json.dumps(event_args))
+
+    def click(self, node):
+        target = node
+        # Le handler peut être porté par un ancêtre (ex: span dans un bouton)
+        while target is not None and not any(e in target.handlers for e in ('click', 'mousedown', 'mouseup')):
+            target = target.parent
+        if target is None:
+            raise BlazorProtocolError(f"Nothing clickable around <{node.name}>")
+        for event in ('mousedown', 'mouseup', 'click'):
+            if event in target.handlers:
+                self.dispatch(target, event, dict(MOUSE_EVENT_ARGS, type=event))
+        self.settle()
+
+    def set_value(self, node, value):
+        for event in ('input', 'change'):
+            if event in node.handlers:
+                self.dispatch(node, event, {'value': value, 'type': event})
+        node.attrs['value'] = value if isinstance(value, str) else node.attrs.get('value', '')
+        self.settle()
+
+    def close(self):
+        self.transport.close()
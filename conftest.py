@@ -0,0 +1,13 @@
+"""Importer app crée le dossier des screenshots (index, catalogue): les tests l'écrivent dans un dossier temporaire"""
+import atexit
+import os
+import shutil
+import tempfile
+
+SCREENSHOTS_DIR = tempfile.mkdtemp(prefix="iol-test-screenshots-")
+os.environ["SCREENSHOTS_DIR"] = SCREENSHOTS_DIR
+os.environ.pop("CATALOG_FILE", None)
+os.environ.pop("BLAZOR_RECORD_DIR", None)
+os.environ.pop("BLAZOR_REPLAY_FILE", None)
+# Enregistré avant l'import de app: atexit s'exécute à l'envers, après le flush de l'index des screenshots
+atexit.register(shutil.rmtree, SCREENSHOTS_DIR, ignore_errors=True)
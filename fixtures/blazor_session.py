@@ -0,0 +1,326 @@
+"""
+Génère fixtures/blazor_session.jsonl, la session Blazor rejouée par test_blazor_protocol.py.
+
+Un hub scripté (mêmes sections mud-paper, selects mud-select / popovers, switches et boutons que le
+calculateur) répond au vrai client calculate_iol_blazor au travers de RecordingBlazorTransport: le fichier
+a le même format qu'un enregistrement BLAZOR_RECORD_DIR du site réel.
+
+    python fixtures/blazor_session.py
+
+À relancer si le parcours de calculate_iol_blazor (ou PAYLOAD) change: le rejeu suit les envois du client.
+"""
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from collections import deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Importer app crée le dossier des screenshots et son index: hors de l'arbre de travail
+os.environ.setdefault("SCREENSHOTS_DIR", tempfile.mkdtemp(prefix="iol-screenshots-"))
+
+import app  # noqa: E402
+from blazor_protocol import (  # noqa: E402
+    EDIT_PREPEND, EDIT_REMOVE, EDIT_SET_ATTRIBUTE, EDIT_STEP_IN, FRAME_ATTRIBUTE, FRAME_ELEMENT, FRAME_MARKUP,
+    FRAME_TEXT, RecordingBlazorTransport, _write_varint, signalr_frame, signalr_messages
+)
+
+OUTPUT = os.path.join(ROOT, "fixtures", "blazor_session.jsonl")
+
+# Même payload que test_blazor_protocol.py
+PAYLOAD = {
+    "gender": "Male",
+    "top_fields": {"surgeon": "Dr Test", "age": 70},
+    "right_eye": {"AL": 23.5, "K1": 43.25, "Manufacturer": "Alcon", "Select IOL": "SN6AT3",
+                  "switches": {"Toric": True}},
+    "left_eye": {"AL": 23.8, "Manufacturer": "Zeiss", "Select IOL": "CT Asphina 409M"}
+}
+
+OPTIONS = {
+    "gender": ["Female", "Male"],
+    "od-manufacturer": ["Alcon", "Zeiss"],
+    "od-iol": ["SN60WF", "SN6AT3"],
+    "os-manufacturer": ["Alcon", "Zeiss"],
+    "os-iol": ["CT Asphina 409M", "CT Lucia 611P"]
+}
+
+RESULTS = {
+    "OD": (
+        '<table class="mud-table-root"><thead><tr><th>Formula</th><th>IOL Power</th><th>Predicted Refraction</th>'
+        '<th>Toric Model</th><th>Cyl</th><th>Axis</th></tr></thead><tbody>'
+        '<tr><td>Barrett</td><td>+21.50 D</td><td>-0.12</td><td>T3</td><td>1.50 D</td><td>95°</td></tr>'
+        '<tr><td>Kane</td><td>+21.00 D</td><td>-0.08</td><td>T3</td><td>1.50 D</td><td>93°</td></tr>'
+        '</tbody></table>'
+    ),
+    "OS": (
+        '<table class="mud-table-root"><thead><tr><th>IOL Power</th><th>Barrett</th><th>Kane</th></tr></thead><tbody>'
+        '<tr><td>+20.50 D</td><td>+0.21</td><td>+0.18</td></tr>'
+        '<tr><td>+21.00 D</td><td>-0.15</td><td>-0.19</td></tr>'
+        '</tbody></table>'
+    )
+}
+
+SHARE_LINK = "https://iolcalculator.escrs.org/share/abc123"
+
+
+def encode_render_batch(diffs, frames):
+    """Inverse de decode_render_batch (layout .NET 8: six offsets en fin de batch)"""
+    strings = []
+    out = bytearray()
+
+    def string(value):
+        if value is None:
+            return -1
+        if value not in strings:
+            strings.append(value)
+        return strings.index(value)
+
+    def i32(*values):
+        out.extend(struct.pack('<' + 'i' * len(values), *values))
+
+    diff_offsets = []
+    for component_id, edits in diffs:
+        diff_offsets.append(len(out))
+        i32(component_id, len(edits))
+        for kind, sibling_index, frame_index, removed in edits:
+            i32(kind, sibling_index, frame_index, string(removed))
+    updated = len(out)
+    i32(len(diff_offsets), *diff_offsets)
+
+    frames_offset = len(out)
+    i32(len(frames))
+    for frame in frames:
+        kind = frame['type']
+        if kind == FRAME_ELEMENT:
+            i32(kind, frame['subtree_length'], string(frame['name']), 0, 0)
+        elif kind in (FRAME_TEXT, FRAME_MARKUP):
+            i32(kind, string(frame['text']), 0, 0, 0)
+        else:
+            i32(kind, string(frame['name']), string(frame.get('value')))
+            out.extend(struct.pack('<Q', frame.get('handler_id', 0)))
+
+    disposed_components = len(out)
+    i32(0)
+    disposed_handlers = len(out)
+    i32(0)
+    named_events = len(out)
+    i32(0)
+
+    locations = []
+    for value in strings:
+        locations.append(len(out))
+        raw = value.encode('utf-8')
+        out.extend(_write_varint(len(raw)) + raw)
+    string_table = len(out)
+    i32(*locations)
+    i32(updated, frames_offset, disposed_components, disposed_handlers, named_events, string_table)
+    return bytes(out)
+
+
+def el(name, attrs=None, *children):
+    return ('element', name, attrs or {}, list(children))
+
+
+def text(value):
+    return ('text', value)
+
+
+def markup(value):
+    return ('markup', value)
+
+
+class ScriptedHub:
+    """Transport côté serveur: rend la page, applique les événements et renvoie des RenderBatch"""
+
+    def __init__(self):
+        self._outbox = deque()
+        self._handlers = {}
+        self._actions = {}
+        self._batch_id = 1
+        self.agreed = False
+        self.calculated = False
+        self.popover = None
+        self.values = {"gender": ""}
+        self.switches = {"od-toric": False}
+
+    # --- rendu ---
+
+    def handler(self, *action):
+        if action not in self._handlers:
+            self._handlers[action] = len(self._handlers) + 1
+            self._actions[self._handlers[action]] = action
+        return ('handler', self._handlers[action])
+
+    def field(self, key, label):
+        return el('div', {'class': 'mud-input-control'},
+                  el('label', {'class': 'mud-input-label', 'for': key}, text(label)),
+                  el('input', {'id': key, 'type': 'text', 'value': self.values.get(key, ''),
+                               'onchange': self.handler('change', key)}))
+
+    def select(self, key, label):
+        control = el('div', {'class': 'mud-input-control', 'onclick': self.handler('open', key)},
+                     el('label', {'class': 'mud-input-label', 'for': key}, text(label)),
+                     el('input', {'id': key, 'type': 'text', 'readonly': '', 'value': self.values.get(key, '')}))
+        return el('div', {'class': 'mud-select'}, control)
+
+    def eye(self, eye_name, header):
+        prefix = eye_name.lower()
+        children = [el('h5', {'class': 'mud-typography mud-typography-h5'}, text(header))]
+        if eye_name == "OD":
+            switch = {'id': 'od-toric', 'type': 'checkbox', 'class': 'mud-switch-input',
+                      'onchange': self.handler('switch', 'od-toric')}
+            if self.switches['od-toric']:
+                switch['checked'] = ''
+            children.append(el('label', {'class': 'mud-switch'}, el('input', switch),
+                               el('p', {'class': 'mud-switch-label'}, text("Toric"))))
+        children += [self.field(f"{prefix}-al", "AL")]
+        if eye_name == "OD":
+            children.append(self.field("od-k1", "K1"))
+        children += [self.select(f"{prefix}-manufacturer", "Manufacturer"), self.select(f"{prefix}-iol", "Select IOL")]
+        if self.calculated:
+            children.append(el('div', {'class': 'mud-table'}, markup(RESULTS[eye_name])))
+        return el('div', {'class': 'mud-paper mud-elevation-1'}, *children)
+
+    def page(self):
+        children = []
+        if not self.agreed:
+            children.append(el('div', {'class': 'mud-dialog'}, el('p', None, text("Terms of use")),
+                               el('button', {'class': 'mud-button', 'onclick': self.handler('agree')},
+                                  el('span', None, text("I Agree")))))
+        children.append(el('div', {'class': 'mud-paper mud-elevation-1 patient'},
+                           el('h6', {'class': 'mud-typography mud-typography-h6'}, text("Patient")),
+                           self.select("gender", "Gender"),
+                           self.field("surgeon", "Surgeon"),
+                           self.field("age", "Age")))
+        children.append(self.eye("OD", "OD Right Eye"))
+        children.append(self.eye("OS", "OS Left Eye"))
+        children.append(el('button', {'class': 'mud-button', 'onclick': self.handler('calculate')},
+                           el('span', None, text("Calculate"))))
+        if self.calculated:
+            children.append(el('button', {'class': 'mud-button'}, el('span', None, text("Print"))))
+            children.append(el('button', {'class': 'mud-button', 'onclick': f"copyToClipboard('{SHARE_LINK}')"},
+                               el('span', None, text("Share"))))
+        if self.popover:
+            items = [el('div', {'class': 'mud-list-item', 'onclick': self.handler('pick', self.popover, option)},
+                        el('p', None, text(option)))
+                     for option in OPTIONS[self.popover]]
+            children.append(el('div', {'class': 'mud-popover mud-popover-open'}, *items))
+        return el('div', {'class': 'mud-layout'}, *children)
+
+    @staticmethod
+    def frames(node):
+        if node[0] == 'text':
+            return [{'type': FRAME_TEXT, 'text': node[1]}]
+        if node[0] == 'markup':
+            return [{'type': FRAME_MARKUP, 'text': node[1]}]
+        _, name, attrs, children = node
+        frames = [{'type': FRAME_ELEMENT, 'name': name}]
+        for attr, value in attrs.items():
+            if isinstance(value, tuple):
+                frames.append({'type': FRAME_ATTRIBUTE, 'name': attr, 'handler_id': value[1]})
+            else:
+                frames.append({'type': FRAME_ATTRIBUTE, 'name': attr, 'value': value})
+        for child in children:
+            frames += ScriptedHub.frames(child)
+        frames[0]['subtree_length'] = len(frames)
+        return frames
+
+    def find(self, node, element_id, path=()):
+        """Chemin (indices des enfants) de l'élément `element_id` dans l'arbre rendu"""
+        if node[0] != 'element':
+            return None
+        if node[2].get('id') == element_id:
+            return path
+        for index, child in enumerate(node[3]):
+            found = self.find(child, element_id, path + (index,))
+            if found is not None:
+                return found
+        return None
+
+    def render(self, edits, frames):
+        self._batch_id += 1
+        batch = encode_render_batch([(0, edits)], frames)
+        self.push([1, {}, None, 'JS.RenderBatch', [self._batch_id, batch]])
+
+    def render_page(self, first=False):
+        edits = [(EDIT_PREPEND, 0, 0, None)] if first else [(EDIT_REMOVE, 0, 0, None), (EDIT_PREPEND, 0, 0, None)]
+        self.render(edits, self.frames(self.page()))
+
+    def render_attribute(self, element_id, name, value):
+        path = (0,) + self.find(self.page(), element_id)
+        edits = [(EDIT_STEP_IN, index, 0, None) for index in path[:-1]]
+        edits.append((EDIT_SET_ATTRIBUTE, path[-1], 0, None))
+        self.render(edits, [{'type': FRAME_ATTRIBUTE, 'name': name, 'value': value}])
+
+    def push(self, message):
+        self._outbox.append(signalr_frame(message))
+
+    # --- événements ---
+
+    def on_event(self, descriptor, event_args):
+        action = self._actions[descriptor['eventHandlerId']]
+        if action[0] == 'agree':
+            self.agreed = True
+        elif action[0] == 'open':
+            self.popover = action[1]
+        elif action[0] == 'pick':
+            self.values[action[1]] = action[2]
+            self.popover = None
+        elif action[0] == 'change':
+            self.values[action[1]] = event_args['value']
+            return self.render_attribute(action[1], 'value', event_args['value'])
+        elif action[0] == 'switch':
+            self.switches[action[1]] = bool(event_args['value'])
+            return self.render_attribute(action[1], 'checked', '' if event_args['value'] else None)
+        elif action[0] == 'calculate':
+            self.calculated = True
+        self.render_page()
+
+    # --- interface transport ---
+
+    def http(self, url, method='GET', body=None):
+        if 'negotiate' in url:
+            transports = [{'transport': 'WebSockets', 'transferFormats': ['Text', 'Binary']}]
+            return json.dumps({'negotiateVersion': 1, 'connectionId': 'c1', 'connectionToken': 't1',
+                               'availableTransports': transports})
+        marker = json.dumps({'type': 'server', 'sequence': 0, 'descriptor': 'CfDJ8-fixture'})
+        return (f'<!DOCTYPE html><html><head><base href="/"></head><body><!--Blazor:{marker}-->'
+                '<script src="_framework/blazor.server.js"></script></body></html>')
+
+    def connect(self, url):
+        pass
+
+    def send(self, payload, text=False):
+        if text:
+            self._outbox.append(b'{}\x1e')
+            return
+        for message in signalr_messages(payload):
+            if message[0] != 1:
+                continue
+            invocation_id, target, args = message[2], message[3], message[4]
+            if target == 'StartCircuit':
+                self.push([1, {}, None, 'JS.AttachComponent', [0, 'app']])
+                self.render_page(first=True)
+                self.push([3, {}, invocation_id, 3, 'CfDJ8-circuit'])
+            elif target == 'DispatchBrowserEvent':
+                self.on_event(json.loads(args[0]), json.loads(args[1]))
+
+    def recv(self, timeout):
+        if self._outbox:
+            return self._outbox.popleft()
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    app.blazor_transport = lambda: RecordingBlazorTransport(ScriptedHub(), OUTPUT)
+    result = app.calculate_iol_blazor(PAYLOAD)
+    if not result['success']:
+        sys.exit(f"Scripted session failed: {result['message']}")
+    print(f"Recorded {OUTPUT}")
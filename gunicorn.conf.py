@@ -0,0 +1,31 @@
+# Configuration gunicorn pour le conteneur (remplace le serveur de développement Flask)
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Un seul worker: le pool Chrome, les caches et les jobs vivent dans le processus.
+# La concurrence vient des threads; le nombre de calculs simultanés est borné par MAX_CONCURRENT_CALCULATIONS.
+workers = 1
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+
+# Un calcul peut durer plusieurs minutes (attente d'admission + Chrome)
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_worker_init(worker):
+    from app import start_background_services
+    start_background_services()
+
+
+def worker_exit(server, worker):
+    from app import driver_pool, screenshot_store, shared_browser
+    driver_pool.close()
+    shared_browser.close()
+    screenshot_store.close()
@@ -0,0 +1,119 @@
+"""Protocole Blazor (blazorpack, RenderBatch) et calcul complet rejoué depuis fixtures/blazor_session.jsonl"""
+import base64
+import json
+import os
+import time
+
+import pytest
+
+import app
+from blazor_protocol import (
+    EDIT_PREPEND, FRAME_ATTRIBUTE, FRAME_ELEMENT, BlazorDom, BlazorProtocolError, ReplayBlazorTransport,
+    decode_render_batch, msgpack_pack, msgpack_unpack, signalr_frame, signalr_messages
+)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "blazor_session.jsonl")
+
+# Payload de l'enregistrement (fixtures/blazor_session.py)
+PAYLOAD = {
+    "gender": "Male",
+    "top_fields": {"surgeon": "Dr Test", "age": 70},
+    "right_eye": {"AL": 23.5, "K1": 43.25, "Manufacturer": "Alcon", "Select IOL": "SN6AT3",
+                  "switches": {"Toric": True}},
+    "left_eye": {"AL": 23.8, "Manufacturer": "Zeiss", "Select IOL": "CT Asphina 409M"}
+}
+
+
+def connected_replay():
+    transport = ReplayBlazorTransport(FIXTURE)
+    transport.http("https://iolcalculator.escrs.org/")
+    transport.http("https://iolcalculator.escrs.org/_blazor/negotiate?negotiateVersion=1", "POST", b"")
+    transport.connect("wss://iolcalculator.escrs.org/_blazor?id=t1")
+    return transport
+
+
+def recorded_batches():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    for entry in entries:
+        data = base64.b64decode(entry.get("data", ""))
+        if entry["kind"] != "recv" or data.endswith(b"\x1e"):
+            # Réponse texte du handshake: pas une trame blazorpack
+            continue
+        for message in signalr_messages(data):
+            if message[0] == 1 and message[3] == "JS.RenderBatch":
+                yield message[4][1]
+
+
+@pytest.mark.parametrize("value", [
+    None, True, False, 0, 127, 128, 65535, 1 << 40, -1, -32, -33, -40000, 1.5,
+    "", "OD", "é" * 40, "x" * 70000, b"\x00\x01", [], [1, [2, "three"]], list(range(20)),
+    {"a": 1}, {str(n): n for n in range(20)},
+])
+def test_msgpack_roundtrip(value):
+    assert msgpack_unpack(msgpack_pack(value)) == value
+
+
+def test_signalr_frames_split_into_messages():
+    data = signalr_frame([1, {}, "1", "StartCircuit", ["/", "/"]]) + signalr_frame([6])
+    assert list(signalr_messages(data)) == [[1, {}, "1", "StartCircuit", ["/", "/"]], [6]]
+
+
+def test_unknown_msgpack_type_is_a_protocol_error():
+    with pytest.raises(BlazorProtocolError):
+        msgpack_unpack(b"\xc1")
+
+
+def test_decode_recorded_render_batch():
+    batch = decode_render_batch(next(recorded_batches()))
+    assert batch["diffs"] == [{"component_id": 0, "edits": [
+        {"type": EDIT_PREPEND, "sibling_index": 0, "frame_index": 0, "removed_attribute": None}
+    ]}]
+    root = batch["frames"][0]
+    assert root["type"] == FRAME_ELEMENT and root["name"] == "div"
+    assert root["subtree_length"] == len(batch["frames"])
+    assert batch["frames"][1] == {"type": FRAME_ATTRIBUTE, "name": "class", "value": "mud-layout", "handler_id": 0}
+    assert batch["disposed_components"] == [] and batch["disposed_handlers"] == []
+
+    dom = BlazorDom()
+    dom.apply_batch(batch)
+    agree = dom.find_all(lambda n: n.name == "button" and n.text_content() == "I Agree")
+    assert len(agree) == 1 and agree[0].handlers["click"]
+
+
+def test_replay_waits_for_the_client_instead_of_spinning():
+    transport = connected_replay()
+    started = time.monotonic()
+    assert transport.recv(0.05) is None
+    assert time.monotonic() - started >= 0.05
+    transport.send(b'{"protocol":"blazorpack","version":1}\x1e', text=True)
+    assert transport.recv(0.05) == b"{}\x1e"
+
+
+def test_replay_rejects_a_diverging_client():
+    transport = connected_replay()
+    transport.send(b'{"protocol":"blazorpack","version":1}\x1e', text=True)
+    assert transport.recv(0.01) == b"{}\x1e"
+    transport.send(signalr_frame([1, {}, None, "DispatchBrowserEvent", ["{}", "{}"]]))
+    with pytest.raises(BlazorProtocolError, match="Replay diverged"):
+        transport.recv(0.01)
+
+
+def test_replayed_calculation(monkeypatch):
+    monkeypatch.setattr(app, "BLAZOR_QUIET_MS", 20)
+    monkeypatch.setattr(app, "blazor_transport", lambda: ReplayBlazorTransport(FIXTURE))
+    result = app.calculate_iol_blazor(PAYLOAD)
+
+    assert result["success"], result["message"]
+    assert result["engine"] == "blazor"
+    assert result["share_link"] == "https://iolcalculator.escrs.org/share/abc123"
+    od, os_ = result["results"]["OD"], result["results"]["OS"]
+    assert od["lens"] == {"manufacturer": "Alcon", "model": "SN6AT3"}
+    assert od["toric"] is True
+    assert od["formulas"]["Barrett"]["iol_power"] == 21.5
+    assert od["formulas"]["Kane"]["predicted_refraction"] == -0.08
+    assert os_["lens"] == {"manufacturer": "Zeiss", "model": "CT Asphina 409M"}
+    assert os_["formulas"]["Barrett"]["options"] == [
+        {"iol_power": 20.5, "predicted_refraction": 0.21},
+        {"iol_power": 21.0, "predicted_refraction": -0.15},
+    ]
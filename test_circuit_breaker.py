@@ -0,0 +1,46 @@
+"""Disjoncteur: seules les pannes du site comptent, pas les payloads erronés"""
+import copy
+import errno
+import socket
+from urllib.error import URLError
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+import app
+from blazor_protocol import BlazorPayloadError, BlazorProtocolError, ReplayBlazorTransport
+from test_blazor_protocol import FIXTURE, PAYLOAD
+
+
+@pytest.mark.parametrize("error, upstream", [
+    (TimeoutException(), True),
+    (ConnectionRefusedError(), True),
+    (socket.timeout(), True),
+    (URLError("unreachable"), True),
+    (BlazorProtocolError("Hub closed the connection"), True),
+    (NoSuchElementException(), False),
+    (BlazorPayloadError("Option 'Acme' not found in 'Manufacturer'"), False),
+    (OSError(errno.ENOSPC, "No space left on device"), False),
+    (ValueError("bad payload"), False),
+])
+def test_upstream_classification(error, upstream):
+    assert app.is_upstream_error(error) is upstream
+
+
+def test_bad_payload_does_not_move_the_breaker(monkeypatch):
+    breaker = app.CircuitBreaker(1, 30, 1)
+    monkeypatch.setattr(app, "circuit_breaker", breaker)
+    monkeypatch.setattr(app, "BLAZOR_QUIET_MS", 20)
+    monkeypatch.setattr(app, "BLAZOR_FALLBACK", False)
+    monkeypatch.setattr(app, "blazor_transport", lambda: ReplayBlazorTransport(FIXTURE))
+    payload = copy.deepcopy(PAYLOAD)
+    payload["right_eye"]["Manufacturer"] = "Acme"
+    options = {'format': 'png', 'persist': False, 'capture': False, 'engine': 'blazor'}
+
+    _, _, result = app.execute_calculation(payload, app.payload_key(payload), 'bypass', options, True)
+
+    assert not result["success"]
+    assert result["error_type"] == "BlazorPayloadError"
+    assert result["upstream_error"] is False
+    assert breaker.stats()["state"] == "closed"
+    assert breaker.stats()["consecutive_failures"] == 0
@@ -0,0 +1,29 @@
+"""Échéance de la requête: chaque source est validée, même à 0"""
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("data, options", [
+    ({"deadline": 0}, {}),
+    ({}, {"deadline": 0}),
+    ({}, {"deadline": "0"}),
+    ({"deadline": -5}, {}),
+    ({"deadline": "soon"}, {}),
+])
+def test_invalid_deadline_is_rejected(data, options):
+    with pytest.raises(ValueError):
+        app.resolve_deadline(data, options)
+
+
+def test_deadline_sources_and_default():
+    assert app.resolve_deadline({}, {}) == min(app.CALCULATION_DEADLINE, app.CALCULATION_DEADLINE_MAX)
+    assert app.resolve_deadline({"deadline": 30}, {}) == 30
+    assert app.resolve_deadline({"deadline": 30}, {"deadline": "20"}) == 20
+
+
+@pytest.mark.parametrize("headers, query", [({"X-Request-Deadline": "0"}, ""), ({}, "?deadline=0")])
+def test_zero_deadline_is_a_bad_request(headers, query):
+    response = app.app.test_client().post("/calculate-json" + query, json={"right_eye": {"AL": 23.5}}, headers=headers)
+    assert response.status_code == 400
+    assert "deadline" in response.get_json()["error"]
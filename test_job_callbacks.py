@@ -0,0 +1,44 @@
+"""Webhooks de /jobs: liste d'hôtes autorisés et adresses internes refusées (SSRF)"""
+import socket
+
+import pytest
+
+import app
+
+
+def resolving_to(address):
+    return lambda host, port, *args, **kwargs: [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port))]
+
+
+def test_callbacks_disabled_without_allowed_hosts(monkeypatch):
+    monkeypatch.setattr(app, "JOB_CALLBACK_ALLOWED_HOSTS", [])
+    with pytest.raises(ValueError, match="disabled"):
+        app.check_callback_url("https://hooks.example.com/iol")
+
+
+@pytest.mark.parametrize("url, address, allowed", [
+    ("https://hooks.example.com/iol", "93.184.216.34", True),
+    ("https://api.hooks.example.com/iol", "93.184.216.34", True),
+    ("https://evil.test/iol", "93.184.216.34", False),
+    ("ftp://hooks.example.com/iol", "93.184.216.34", False),
+    ("http://hooks.example.com/iol", "127.0.0.1", False),
+    ("http://hooks.example.com/iol", "169.254.169.254", False),
+    ("http://hooks.example.com/iol", "::1", False),
+])
+def test_callback_url_checks(monkeypatch, url, address, allowed):
+    monkeypatch.setattr(app, "JOB_CALLBACK_ALLOWED_HOSTS", ["hooks.example.com", ".hooks.example.com"])
+    monkeypatch.setattr(app.socket, "getaddrinfo", resolving_to(address))
+    if allowed:
+        app.check_callback_url(url)
+    else:
+        with pytest.raises(ValueError):
+            app.check_callback_url(url)
+
+
+def test_jobs_rejects_metadata_callback(monkeypatch):
+    monkeypatch.setattr(app, "JOB_CALLBACK_ALLOWED_HOSTS", ["169.254.169.254"])
+    response = app.app.test_client().post("/jobs", json={
+        "right_eye": {"AL": 23.5}, "callback_url": "http://169.254.169.254/latest/meta-data/"
+    })
+    assert response.status_code == 400
+    assert "forbidden address" in response.get_json()["error"]
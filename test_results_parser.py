@@ -0,0 +1,51 @@
+"""Extraction des résultats sur une copie sauvegardée de la page (fixtures/results_page.html)"""
+import os
+
+import pytest
+
+from app import _parse_number, parse_results_html
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "results_page.html")
+
+
+@pytest.fixture(scope="module")
+def results():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        html = f.read()
+    payload = {"right_eye": {"switches": {"Toric": True}}, "left_eye": {}}
+    return parse_results_html(html, payload)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("+21.5 D", 21.5),
+    ("-0,12", -0.12),
+    ("−0.08", -0.08),
+    ("95°", 95.0),
+    ("T3", "T3"),
+    ("x1", "x1"),
+    ("~21.5", "~21.5"),
+    ("", None),
+])
+def test_parse_number(text, expected):
+    assert _parse_number(text) == expected
+
+
+def test_formula_rows_with_toric_values(results):
+    barrett = results["OD"]["formulas"]["Barrett"]
+    assert barrett["iol_power"] == 21.5
+    assert barrett["predicted_refraction"] == -0.12
+    assert barrett["toric"] == {"toric_model": "T3", "cylinder": 1.5, "axis": 95.0}
+    assert results["OD"]["formulas"]["Kane"]["predicted_refraction"] == -0.08
+
+
+def test_formula_columns_become_options(results):
+    options = results["OS"]["formulas"]["Barrett"]["options"]
+    assert options == [
+        {"iol_power": 20.5, "predicted_refraction": 0.21},
+        {"iol_power": 21.0, "predicted_refraction": -0.15},
+    ]
+
+
+def test_lens_read_from_selects(results):
+    assert results["OD"]["lens"] == {"manufacturer": "Alcon", "model": "SN6AT3"}
+    assert results["OS"]["lens"] == {"manufacturer": "Zeiss", "model": "CT Asphina 409M"}
@@ -0,0 +1,39 @@
+"""Registre de sélecteurs: une recherche = un find / wait_for, quel que soit le nombre de polls"""
+import app
+
+
+class Scope:
+    """Faux driver: l'élément n'apparaît qu'au `appears_after`-ième appel de find_elements"""
+
+    def __init__(self, appears_after):
+        self.calls = 0
+        self.appears_after = appears_after
+
+    def find_elements(self, by, value):
+        self.calls += 1
+        return ['element'] if self.calls >= self.appears_after else []
+
+
+class Wait:
+    def until(self, condition):
+        for _ in range(50):
+            value = condition(None)
+            if value:
+                return value
+        raise app.TimeoutException()
+
+
+def test_wait_for_counts_one_lookup_per_call():
+    registry = app.SelectorRegistry()
+    registry.register("target", ("css selector", ".only"))
+    for _ in range(3):
+        assert registry.wait_for(Wait(), "target", scope=Scope(appears_after=5)) == 'element'
+    assert registry._targets["target"].lookups == 3
+
+
+def test_find_counts_one_lookup_per_call():
+    registry = app.SelectorRegistry()
+    registry.register("target", ("css selector", ".a"), ("css selector", ".b"))
+    registry.find(Scope(appears_after=1), "target")
+    registry.find(Scope(appears_after=1), "target")
+    assert registry._targets["target"].lookups == 2
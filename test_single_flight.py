@@ -0,0 +1,50 @@
+"""Single-flight: seules les réussites sont partagées avec les requêtes en attente"""
+import threading
+
+import app
+
+
+def run_with_follower(single_flight, leader_fn, follower_fn, shareable=None):
+    """Lance un premier appel bloqué jusqu'à l'arrivée d'un second appel de même clé"""
+    started, release = threading.Event(), threading.Event()
+    outcome = {}
+
+    def leader():
+        def fn():
+            started.set()
+            release.wait(5)
+            return leader_fn()
+        try:
+            outcome['leader'] = single_flight.do('key', fn, shareable=shareable)
+        except Exception as e:
+            outcome['leader'] = e
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait(5)
+    threading.Timer(0.1, release.set).start()
+    outcome['follower'] = single_flight.do('key', follower_fn, shareable=shareable)
+    thread.join(5)
+    return outcome
+
+
+def test_success_is_shared():
+    outcome = run_with_follower(app.SingleFlight(5), lambda: 'leader', lambda: 'follower')
+    assert outcome == {'leader': ('leader', False), 'follower': ('leader', True)}
+
+
+def test_follower_retries_when_the_leader_was_rejected():
+    def rejected():
+        raise app.AdmissionRejected("No calculation slot after 0s", 1)
+
+    single_flight = app.SingleFlight(5)
+    outcome = run_with_follower(single_flight, rejected, lambda: 'follower')
+    assert isinstance(outcome['leader'], app.AdmissionRejected)
+    assert outcome['follower'] == ('follower', False)
+    assert single_flight.stats()['follower_retries'] == 1
+
+
+def test_unsuccessful_value_is_not_shared():
+    outcome = run_with_follower(app.SingleFlight(5), lambda: {'success': False}, lambda: {'success': True},
+                                shareable=lambda value: value['success'])
+    assert outcome['follower'] == ({'success': True}, False)